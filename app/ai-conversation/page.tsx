@@ -12,6 +12,7 @@ interface AIResponse {
   audio_base64?: string
   is_complete?: boolean
   collected_data?: any
+  persistence?: { handle: string; status_url: string } | null
   error?: string
   details?: string
 }
@@ -22,7 +23,7 @@ interface TranscriptionResponse {
 }
 
 export default function AIConversationPage() {
-  const { user } = useSupabase()
+  const { user, session } = useSupabase()
   const router = useRouter()
   
   // Core state
@@ -212,8 +213,10 @@ export default function AIConversationPage() {
     setIsProcessing(true)
     
     try {
+      // The access token lets the server store the finished history itself
       const res = await fetch(`${apiBase}/api/start-interview-with-voice`, { 
-        method: 'POST' 
+        method: 'POST',
+        headers: session?.access_token ? { Authorization: `Bearer ${session.access_token}` } : undefined
       })
       const data: AIResponse = await res.json()
       
@@ -322,7 +325,12 @@ export default function AIConversationPage() {
       if (resp.is_complete) {
         setStatus('🎉 History Taking complete!')
         setInterviewComplete(true)
-        await saveHistory(resp.collected_data)
+        if (resp.persistence) {
+          // Already queued server-side; no need to upload collected_data again
+          setStatus('History Taking complete! Medical history is being saved to database.')
+        } else {
+          await saveHistory(resp.collected_data)
+        }
       } else {
         console.log('AI Response:', resp.message)
         
@@ -365,7 +373,8 @@ export default function AIConversationPage() {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({
           user_email: user.email,
-          medical_data: collectedData
+          medical_data: collectedData,
+          session_id: sessionId
         })
       })
       
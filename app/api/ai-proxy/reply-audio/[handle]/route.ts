@@ -0,0 +1,20 @@
+import { NextResponse } from 'next/server'
+
+const PYTHON_BASE = process.env.NEXT_PUBLIC_PYTHON_API_BASE ?? 'https://sehatnamafastapi.onrender.com'
+
+export async function GET(
+  request: Request,
+  { params }: { params: { handle: string } }
+) {
+  try {
+    const res = await fetch(`${PYTHON_BASE}/api/reply-audio/${encodeURIComponent(params.handle)}`, {
+      cache: 'no-store'
+    })
+    const contentType = res.headers.get('content-type') || 'audio/mpeg'
+    const arrayBuf = await res.arrayBuffer()
+    return new NextResponse(arrayBuf, { status: res.status, headers: { 'Content-Type': contentType } })
+  } catch (err) {
+    console.error('ai-proxy reply-audio error', err)
+    return NextResponse.json({ error: 'reply-audio proxy failed' }, { status: 500 })
+  }
+}
@@ -0,0 +1,34 @@
+import { NextResponse } from 'next/server'
+
+const PYTHON_BASE = process.env.NEXT_PUBLIC_PYTHON_API_BASE ?? 'https://sehatnamafastapi.onrender.com'
+
+// Stream the response through instead of buffering it
+export const dynamic = 'force-dynamic'
+
+export async function POST(request: Request) {
+  try {
+    const body = await request.json()
+    const res = await fetch(`${PYTHON_BASE}/api/send-message-stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+      body: JSON.stringify(body)
+    })
+    const contentType = res.headers.get('content-type') || ''
+    if (!contentType.includes('text/event-stream') || !res.body) {
+      // e.g. { error: 'session not found' }
+      const json = await res.json()
+      return NextResponse.json(json, { status: res.status })
+    }
+    return new Response(res.body, {
+      status: res.status,
+      headers: {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache, no-transform',
+        'X-Accel-Buffering': 'no'
+      }
+    })
+  } catch (err) {
+    console.error('ai-proxy send-stream error', err)
+    return NextResponse.json({ error: 'proxy failed' }, { status: 500 })
+  }
+}
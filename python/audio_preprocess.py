@@ -0,0 +1,315 @@
+"""
+AUDIO PRE-PROCESSING FOR WHISPER
+Decode -> mono 16 kHz PCM -> energy VAD silence trim -> compact re-encode
+
+Browsers upload 48 kHz stereo webm/wav with long silences on both ends.
+Whisper only needs 16 kHz mono, so shrinking the payload before upload
+cuts both the upload size and Groq's processing time.
+
+Decoding/encoding is done by the ffmpeg binary (no extra Python packages).
+If ffmpeg is not installed the stage reports itself as unavailable and the
+caller should forward the original audio unchanged.
+"""
+
+import io
+import os
+import math
+import shutil
+import subprocess
+import time
+import wave
+from array import array
+from dataclasses import dataclass, field
+from operator import mul
+from typing import List, Optional, Tuple
+
+
+# ========== CONFIGURATION ==========
+
+SAMPLE_RATE = 16000          # Whisper's native sample rate
+FRAME_MS = 30                # VAD frame size
+SILENCE_THRESHOLD_DB = float(os.getenv("AUDIO_SILENCE_THRESHOLD_DB", "-40"))
+SPEECH_PADDING_MS = 200      # Keep a little silence around speech so words aren't clipped
+
+# Output codecs Whisper accepts: (file extension, ffmpeg encoder args)
+OUTPUT_CODECS = {
+    "ogg": ("ogg", ["-c:a", "libopus", "-b:a", "24k", "-application", "voip", "-f", "ogg"]),
+    "flac": ("flac", ["-c:a", "flac", "-f", "flac"]),
+    "wav": ("wav", ["-c:a", "pcm_s16le", "-f", "wav"]),
+}
+DEFAULT_CODEC = os.getenv("AUDIO_PREPROCESS_CODEC", "ogg")
+
+# An ffmpeg run may take this long, plus a per-MB allowance for the input
+FFMPEG_TIMEOUT_SECONDS = float(os.getenv("FFMPEG_TIMEOUT_SECONDS", "10"))
+FFMPEG_TIMEOUT_PER_MB_SECONDS = float(os.getenv("FFMPEG_TIMEOUT_PER_MB_SECONDS", "5"))
+
+
+def ffmpeg_available() -> bool:
+    """True if the ffmpeg binary can be found on PATH"""
+    return shutil.which("ffmpeg") is not None
+
+
+def _run_ffmpeg(args: List[str], data: bytes) -> bytes:
+    """Run ffmpeg reading stdin and writing stdout, raising on failure.
+    A run that outlasts its size-scaled timeout (e.g. a malformed upload) is killed."""
+    timeout = FFMPEG_TIMEOUT_SECONDS + FFMPEG_TIMEOUT_PER_MB_SECONDS * len(data) / 1e6
+    try:
+        proc = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", *args],
+            input=data,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"ffmpeg timed out after {timeout:.0f}s")
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {proc.stderr.decode('utf-8', 'ignore').strip()}")
+    return proc.stdout
+
+
+# ========== DECODE / ENCODE ==========
+
+def decode_to_pcm(data: bytes) -> bytes:
+    """Decode any container/codec to raw 16-bit mono PCM at SAMPLE_RATE"""
+    return _run_ffmpeg(
+        ["-i", "pipe:0", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1"],
+        data,
+    )
+
+
+def encode_pcm(pcm: bytes, codec: str = DEFAULT_CODEC) -> Tuple[bytes, str]:
+    """Encode raw PCM into a compact container. Returns (audio_bytes, extension)"""
+    ext, codec_args = OUTPUT_CODECS.get(codec, OUTPUT_CODECS["flac"])
+    audio = _run_ffmpeg(
+        ["-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "pipe:0", *codec_args, "pipe:1"],
+        pcm,
+    )
+    return audio, ext
+
+
+# ========== ENERGY VAD ==========
+
+def _samples(pcm: bytes) -> array:
+    samples = array("h")
+    samples.frombytes(pcm[: len(pcm) - (len(pcm) % 2)])
+    return samples
+
+
+def frame_energies_db(pcm: bytes, frame_ms: int = FRAME_MS) -> List[float]:
+    """RMS level (dBFS) of each frame of 16-bit mono PCM"""
+    samples = _samples(pcm)
+    frame_len = SAMPLE_RATE * frame_ms // 1000
+    energies = []
+
+    for start in range(0, len(samples), frame_len):
+        frame = samples[start:start + frame_len]
+        if not frame:
+            break
+        mean_square = sum(map(mul, frame, frame)) / len(frame)
+        rms = math.sqrt(mean_square) / 32768.0
+        energies.append(20 * math.log10(rms) if rms > 0 else -120.0)
+
+    return energies
+
+
+def speech_bounds(
+    pcm: bytes,
+    threshold_db: float = SILENCE_THRESHOLD_DB,
+    padding_ms: int = SPEECH_PADDING_MS,
+    frame_ms: int = FRAME_MS,
+) -> Optional[Tuple[int, int]]:
+    """Byte offsets (start, end) of the speech region, or None if all silence"""
+    energies = frame_energies_db(pcm, frame_ms)
+    voiced = [i for i, db in enumerate(energies) if db > threshold_db]
+    if not voiced:
+        return None
+
+    frame_bytes = SAMPLE_RATE * frame_ms // 1000 * 2
+    pad_bytes = SAMPLE_RATE * padding_ms // 1000 * 2
+    start = max(0, voiced[0] * frame_bytes - pad_bytes)
+    end = min(len(pcm), (voiced[-1] + 1) * frame_bytes + pad_bytes)
+    return start, end
+
+
+def silence_gaps(
+    pcm: bytes,
+    min_silence_ms: int = 400,
+    threshold_db: float = SILENCE_THRESHOLD_DB,
+    frame_ms: int = FRAME_MS,
+) -> List[Tuple[float, float]]:
+    """Silent stretches (start_sec, end_sec) at least min_silence_ms long"""
+    energies = frame_energies_db(pcm, frame_ms)
+    min_frames = max(1, min_silence_ms // frame_ms)
+    gaps = []
+    run_start = None
+
+    for i, db in enumerate(energies + [0.0]):  # sentinel closes a trailing run
+        if db <= threshold_db:
+            if run_start is None:
+                run_start = i
+        elif run_start is not None:
+            if i - run_start >= min_frames:
+                gaps.append((run_start * frame_ms / 1000, i * frame_ms / 1000))
+            run_start = None
+
+    return gaps
+
+
+def pcm_to_wav(pcm: bytes) -> bytes:
+    """Wrap 16-bit mono PCM at SAMPLE_RATE in a WAV header (no ffmpeg needed)"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def pcm_duration(pcm: bytes) -> float:
+    """Duration in seconds of 16-bit mono PCM at SAMPLE_RATE"""
+    return len(pcm) / 2 / SAMPLE_RATE
+
+
+# ========== PIPELINE ==========
+
+@dataclass
+class PreprocessedAudio:
+    """Result of the pre-processing stage"""
+    audio: bytes
+    filename: str
+    original_bytes: int
+    processed_bytes: int
+    original_duration: float
+    processed_duration: float
+    leading_trim: float        # seconds removed from the start (add back to timestamps)
+    elapsed_ms: float
+    pcm: bytes = field(default=b"", repr=False)
+
+    def report(self) -> dict:
+        """Per-request savings summary for API responses"""
+        return {
+            "original_bytes": self.original_bytes,
+            "processed_bytes": self.processed_bytes,
+            "saved_bytes": self.original_bytes - self.processed_bytes,
+            "original_duration": round(self.original_duration, 3),
+            "processed_duration": round(self.processed_duration, 3),
+            "trimmed_seconds": round(self.original_duration - self.processed_duration, 3),
+            "leading_trim": round(self.leading_trim, 3),
+            "preprocess_ms": round(self.elapsed_ms, 1),
+        }
+
+
+def preprocess_audio(data: bytes, filename: str, codec: str = DEFAULT_CODEC) -> PreprocessedAudio:
+    """
+    Full pre-processing stage: decode, downmix/resample, trim, re-encode.
+    Raises RuntimeError if ffmpeg is missing or fails.
+    """
+    if not ffmpeg_available():
+        raise RuntimeError("ffmpeg not installed")
+
+    started = time.perf_counter()
+
+    pcm = decode_to_pcm(data)
+    original_duration = pcm_duration(pcm)
+
+    bounds = speech_bounds(pcm)
+    leading_trim = 0.0
+    if bounds:
+        start, end = bounds
+        leading_trim = start / 2 / SAMPLE_RATE
+        pcm = pcm[start:end]
+
+    audio, ext = encode_pcm(pcm, codec)
+    stem = os.path.splitext(os.path.basename(filename or "audio"))[0] or "audio"
+
+    return PreprocessedAudio(
+        audio=audio,
+        filename=f"{stem}.{ext}",
+        original_bytes=len(data),
+        processed_bytes=len(audio),
+        original_duration=original_duration,
+        processed_duration=pcm_duration(pcm),
+        leading_trim=leading_trim,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+        pcm=pcm,
+    )
+
+
+def shift_segments(segments, offset: float) -> list:
+    """Shift Whisper segment timestamps by offset seconds"""
+    shifted = []
+    for seg in segments or []:
+        seg = dict(seg) if isinstance(seg, dict) else dict(getattr(seg, "__dict__", {}))
+        for key in ("start", "end"):
+            if isinstance(seg.get(key), (int, float)):
+                seg[key] = seg[key] + offset
+        shifted.append(seg)
+    return shifted
+
+
+# ========== LONG-AUDIO CHUNKING ==========
+
+def split_at_silences(
+    pcm: bytes,
+    max_chunk_seconds: float = 30.0,
+    min_chunk_seconds: float = 5.0,
+) -> List[Tuple[float, float]]:
+    """
+    Split PCM into (start_sec, end_sec) chunks no longer than max_chunk_seconds.
+    Cuts are placed in the middle of the latest silence gap that fits, so words
+    are not split; a hard cut is used only if a stretch has no silence at all.
+    """
+    total = pcm_duration(pcm)
+    if total <= max_chunk_seconds:
+        return [(0.0, total)]
+
+    cut_points = [(gap_start + gap_end) / 2 for gap_start, gap_end in silence_gaps(pcm)]
+    chunks = []
+    start = 0.0
+
+    while total - start > max_chunk_seconds:
+        limit = start + max_chunk_seconds
+        candidates = [c for c in cut_points if start + min_chunk_seconds <= c <= limit]
+        cut = candidates[-1] if candidates else limit
+        chunks.append((start, cut))
+        start = cut
+
+    chunks.append((start, total))
+    return chunks
+
+
+def pcm_slice(pcm: bytes, start_sec: float, end_sec: float) -> bytes:
+    """Slice 16-bit mono PCM by seconds (sample aligned)"""
+    start = int(start_sec * SAMPLE_RATE) * 2
+    end = int(end_sec * SAMPLE_RATE) * 2
+    return pcm[start:end]
+
+
+def stitch_transcriptions(results: List[Tuple[float, object]]) -> dict:
+    """
+    Merge per-chunk Whisper results [(offset_sec, transcription), ...] into one
+    verbose_json-shaped dict with timestamps relative to the full recording.
+    """
+    texts = []
+    segments = []
+    language = None
+    duration = 0.0
+
+    for offset, transcription in sorted(results, key=lambda r: r[0]):
+        text = (getattr(transcription, "text", "") or "").strip()
+        if text:
+            texts.append(text)
+        language = language or getattr(transcription, "language", None)
+        for seg in shift_segments(getattr(transcription, "segments", None), offset):
+            seg["id"] = len(segments)
+            segments.append(seg)
+        duration = max(duration, offset + (getattr(transcription, "duration", 0) or 0))
+
+    return {
+        "text": " ".join(texts),
+        "language": language,
+        "duration": duration,
+        "segments": segments,
+    }
@@ -0,0 +1,206 @@
+"""
+GRAPH PERFORMANCE REGRESSION BENCHMARK (record / replay)
+
+The interview graph is nondeterministic with a live LLM, so it is measured
+against recorded LLM exchanges instead (benchmarks/llm_replay.py):
+
+  record   run a scripted interview against real Groq and save every
+           llm_with_tools.invoke request/response to a fixture
+  run      replay the fixture (no network) and measure, per turn:
+             - graph overhead   wall time minus time spent in the (replayed) LLM
+             - LLM calls/turn   and graph node runs/turn
+             - prompt size      estimated prompt tokens per section
+           then compare with a saved baseline and exit 1 on regression
+           (or when no baseline exists)
+
+Fixtures are recorded against live Groq, so they and their baselines are
+committed from a machine with a GROQ_API_KEY: record, then run once with
+--save-baseline, and commit benchmarks/fixtures/ and benchmarks/baselines/.
+
+Usage (from the python/ directory):
+    GROQ_API_KEY=... python benchmarks/bench_graph.py record --script urdu_abdominal_pain
+    python benchmarks/bench_graph.py run --fixture benchmarks/fixtures/urdu_abdominal_pain.json
+    python benchmarks/bench_graph.py run --fixture ... --save-baseline
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PYTHON_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(PYTHON_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+from interview_scripts import SCRIPTS, DEFAULT_SCRIPT  # noqa: E402
+
+FIXTURE_DIR = BENCH_DIR / "fixtures"
+BASELINE_DIR = BENCH_DIR / "baselines"
+
+# Allowed growth before a metric counts as a regression
+OVERHEAD_TOLERANCE = 0.25      # graph overhead p50, relative
+OVERHEAD_SLACK_MS = 0.5        # absolute slack so sub-millisecond noise never fails
+PROMPT_TOLERANCE = 0.10        # prompt tokens per section, relative
+COUNT_SLACK = 0.01             # LLM calls / node runs per turn, absolute
+
+
+def _load_system(replay: bool):
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if replay:
+        # No network: dummy key
+        os.environ.setdefault("GROQ_API_KEY", "replay-dummy-key")
+    from llm import UrduMedicalHistorySystem
+    system = UrduMedicalHistorySystem()
+    if replay:
+        # The shared scheduler already exists (built on import), so lift its
+        # limits directly: replayed calls must not be throttled
+        from groq_scheduler import groq_scheduler, DEFAULT_LIMITS
+        models = set(DEFAULT_LIMITS) | {tier["model"] for tier in system.MODEL_TIERS.values()}
+        groq_scheduler.set_limits({model: {"rpm": None, "tpm": None} for model in models})
+    return system
+
+
+def run_interview(system, script: list, on_turn=None) -> dict:
+    """Drive one scripted interview through process_user_message"""
+    from turn_trace import TraceStore, trace_turn
+
+    store = TraceStore(turns_per_session=len(script) + 1, max_sessions=1)
+    state = system.start_interview()["state"]
+    for answer in script:
+        started = time.perf_counter()
+        with trace_turn("bench", "bench", store=store) as trace:
+            result = system.process_user_message(state, answer)
+        if on_turn:
+            on_turn(trace, time.perf_counter() - started)
+        state = result["state"]
+        if result["is_complete"]:
+            break
+    return state
+
+
+# ========== RECORD ==========
+
+def record(args):
+    from llm_replay import install_recorder
+
+    if not os.getenv("GROQ_API_KEY"):
+        sys.exit("GROQ_API_KEY is required to record")
+    system = _load_system(replay=False)
+    recorder = install_recorder(system)
+    state = run_interview(system, SCRIPTS[args.script])
+    out = Path(args.out or FIXTURE_DIR / f"{args.script}.json")
+    recorder.save(out, script=args.script, sections_reached=state["current_section"],
+                  prompt_version=system.prompt_builder.prompt_version())
+    print(f"Recorded {len(recorder.calls)} LLM calls -> {out}")
+
+
+# ========== REPLAY BENCHMARK ==========
+
+def measure(fixture_path: Path, repeat: int) -> dict:
+    from llm_replay import install_replayer, load_fixture
+
+    fixture = load_fixture(fixture_path)
+    script = SCRIPTS[fixture["metadata"].get("script", DEFAULT_SCRIPT)]
+    system = _load_system(replay=True)
+    replayer = install_replayer(system, fixture)
+    system.graph  # compile outside the timed region
+
+    overheads, llm_calls, node_runs, prompt_tokens = [], [], [], {}
+
+    def on_turn(trace, wall):
+        llm_spans = [s for s in trace.spans if s.name == "llm.call"]
+        replay_time = sum(((s.end_ns or s.start_ns) - s.start_ns) / 1e9 for s in llm_spans)
+        overheads.append(max(0.0, wall - replay_time))
+        llm_calls.append(len(llm_spans))
+        node_runs.append(sum(1 for s in trace.spans if s.name.startswith("node.")))
+        for s in llm_spans:
+            section = s.attributes.get("section", "unknown")
+            prompt_tokens[section] = max(prompt_tokens.get(section, 0), s.attributes.get("est_prompt_tokens", 0))
+
+    divergences = 0
+    for _ in range(repeat):
+        replayer.reset()
+        run_interview(system, script, on_turn)
+        divergences = max(divergences, replayer.divergences)
+
+    ordered = sorted(overheads)
+    return {
+        "fixture": fixture_path.name,
+        "turns_per_interview": len(overheads) // repeat,
+        "repeat": repeat,
+        "overhead_p50_ms": round(statistics.median(ordered) * 1000, 3),
+        "overhead_p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 3),
+        "llm_calls_per_turn": round(statistics.fmean(llm_calls), 3),
+        "node_runs_per_turn": round(statistics.fmean(node_runs), 3),
+        "prompt_tokens_by_section": dict(sorted(prompt_tokens.items())),
+        "divergences": divergences,
+    }
+
+
+def regressions(current: dict, baseline: dict) -> list:
+    found = []
+    limit = baseline["overhead_p50_ms"] * (1 + OVERHEAD_TOLERANCE) + OVERHEAD_SLACK_MS
+    if current["overhead_p50_ms"] > limit:
+        found.append(f"graph overhead p50 {current['overhead_p50_ms']} ms > {limit:.3f} ms")
+    for metric in ("llm_calls_per_turn", "node_runs_per_turn"):
+        if current[metric] > baseline[metric] + COUNT_SLACK:
+            found.append(f"{metric} {current[metric]} > baseline {baseline[metric]}")
+    for section, tokens in current["prompt_tokens_by_section"].items():
+        base = baseline["prompt_tokens_by_section"].get(section)
+        if base and tokens > base * (1 + PROMPT_TOLERANCE):
+            found.append(f"prompt tokens for '{section}' {tokens} > baseline {base} (+{PROMPT_TOLERANCE:.0%})")
+    return found
+
+
+def run(args):
+    fixture_path = Path(args.fixture)
+    baseline_path = Path(args.baseline or BASELINE_DIR / f"graph_{fixture_path.stem}.json")
+    current = measure(fixture_path, args.repeat)
+    print(json.dumps(current, indent=2, ensure_ascii=False))
+
+    if current["divergences"]:
+        print(f"⚠️ {current['divergences']} LLM requests differ from the recording (prompt changed?)")
+
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(current, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"Baseline saved -> {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        sys.exit(f"No baseline at {baseline_path}; run with --save-baseline first")
+    found = regressions(current, json.loads(baseline_path.read_text(encoding="utf-8")))
+    if found:
+        print("REGRESSIONS:")
+        for item in found:
+            print(f"  - {item}")
+        sys.exit(1)
+    print("No regressions against baseline")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_cmd = commands.add_parser("record", help="capture a live interview to a fixture")
+    record_cmd.add_argument("--script", choices=sorted(SCRIPTS), default=DEFAULT_SCRIPT)
+    record_cmd.add_argument("--out", help="fixture path (default benchmarks/fixtures/<script>.json)")
+    record_cmd.set_defaults(func=record)
+
+    run_cmd = commands.add_parser("run", help="replay a fixture and check against the baseline")
+    run_cmd.add_argument("--fixture", required=True)
+    run_cmd.add_argument("--repeat", type=int, default=20)
+    run_cmd.add_argument("--baseline", help="baseline path (default benchmarks/baselines/graph_<fixture>.json)")
+    run_cmd.add_argument("--save-baseline", action="store_true")
+    run_cmd.set_defaults(func=run)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
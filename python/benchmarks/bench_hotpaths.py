@@ -0,0 +1,262 @@
+"""
+MICROBENCHMARKS FOR PER-TURN PURE-PYTHON HOT PATHS
+
+Times the functions whose cost grows with the interview or the patient's
+record count, across realistic sizes:
+
+    build_prompt            collected data of a 10..500 message interview
+    detect_language         10..500 word messages (English = full scan, worst case)
+    tool_node               RecordInfo + MarkSectionComplete on a 10..500 message state
+    get_history_view        doctor view (Urdu script scan per message), translation stubbed out
+    summarize_history_record  /api/get-all-histories per-record loop, 1..500 records
+    langid.*                language_id (cached and uncached) next to the
+    legacy.*                per-character scans it replaced, same inputs
+
+Each case reports the best per-call time over several repeats. Results can be
+saved as a baseline and later runs compared against it. The committed
+baseline (baselines/hotpaths.json) was taken with --repeat 10; re-save it
+on the machine that runs the gate, since timings are host-specific.
+
+Usage (from the python/ directory):
+    python benchmarks/bench_hotpaths.py --save-baseline --repeat 10
+    python benchmarks/bench_hotpaths.py                 # compare, exit 1 on regression or missing baseline
+    python benchmarks/bench_hotpaths.py --only build_prompt --repeat 7
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PYTHON_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(PYTHON_DIR))
+
+os.environ.setdefault("GROQ_API_KEY", "bench-dummy-key")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+BASELINE_PATH = BENCH_DIR / "baselines" / "hotpaths.json"
+MESSAGE_SIZES = (10, 50, 100, 500)
+RECORD_SIZES = (1, 10, 100, 500)
+# A case regresses when slower than baseline by more than this factor
+TOLERANCE = 1.5
+
+URDU_ANSWER = "مجھے تین دن سے پیٹ میں درد ہے اور کھانے کے بعد بڑھ جاتا ہے"
+URDU_QUESTION = "براہ کرم بتائیں کہ درد کب شروع ہوا؟"
+ENGLISH_WORDS = "the patient reports intermittent abdominal pain after meals since".split()
+SECTIONS = ["demographics", "presentation", "history", "review", "medications", "social"]
+
+
+# ========== SYNTHETIC DATA ==========
+
+def make_collected_data(n_messages: int) -> dict:
+    """One recorded field per patient answer, spread over the data sections"""
+    data = {}
+    for i in range(n_messages // 2):
+        data.setdefault(SECTIONS[i % len(SECTIONS)], {})[f"field_{i}"] = URDU_ANSWER
+    return data
+
+
+def make_state(n_messages: int) -> dict:
+    messages = []
+    for i in range(n_messages):
+        if i % 2:
+            messages.append({"role": "user", "content": URDU_ANSWER})
+        else:
+            messages.append({"role": "assistant", "content": URDU_QUESTION, "tool_calls": []})
+    messages.append({
+        "role": "assistant", "content": "",
+        "tool_calls": [
+            {"name": "RecordInfo", "args": {"section": "history", "field": "hpc", "value": URDU_ANSWER}, "id": "1"},
+            {"name": "MarkSectionComplete", "args": {"section": "hpc_pain", "reasoning": "answered"}, "id": "2"},
+        ],
+    })
+    return {
+        "messages": messages,
+        "current_section": "hpc_pain",
+        "collected_data": make_collected_data(n_messages),
+        "section_complete": False,
+        "all_sections_done": False,
+        "language_preference": "urdu_script",
+    }
+
+
+def make_records(n_records: int) -> list:
+    urdu_version = {
+        "demographics": {"name": "احمد علی", "age": "45", "gender": "مرد", "occupation": "استاد"},
+        "presentation": {"chief_complaint": URDU_ANSWER * 3},
+        "history": {"hpc": URDU_ANSWER, "past_medical": "شوگر"},
+        "medications": {"current": "میٹفارمن"},
+        "social": {"history": "سگریٹ نہیں"},
+    }
+    english_version = {section: {k: "translated" for k in fields} for section, fields in urdu_version.items()}
+    return [
+        {"id": i, "created_at": "2025-01-01T00:00:00", "email": "patient@example.com",
+         "urdu_version": copy.deepcopy(urdu_version), "english_version": english_version}
+        for i in range(n_records)
+    ]
+
+
+# ========== LEGACY LANGUAGE SCANS (before language_id) ==========
+
+def legacy_detect_language(text: str) -> str:
+    if any('\u0600' <= c <= '\u06FF' for c in text):
+        return 'urdu_script'
+    if any(word in text.lower() for word in ['hai', 'mein', 'ka', 'dard', 'bukhar']):
+        return 'roman_urdu'
+    return 'english'
+
+
+def legacy_has_urdu_script(text: str) -> bool:
+    return any('\u0600' <= c <= '\u06FF' for c in text)
+
+
+def legacy_primary_language(text: str) -> str:
+    english_chars = sum(1 for c in text if c.isalpha() and ord(c) < 128)
+    total_chars = len([c for c in text if c.isalpha()])
+    return "english" if total_chars > 0 and english_chars / total_chars > 0.7 else "urdu"
+
+
+def language_cases():
+    """(name, size, fn, make_args) pairs: new and legacy on identical text"""
+    import language_id
+
+    for n in MESSAGE_SIZES:
+        english = " ".join(ENGLISH_WORDS[i % len(ENGLISH_WORDS)] for i in range(n))
+        urdu = " ".join([URDU_ANSWER] * max(1, n // 12))
+        yield "langid.detect_language", n, language_id.detect_language, lambda t=english: (t,)
+        yield "langid.detect_language_uncached", n, language_id.detect_language.__wrapped__, lambda t=english: (t,)
+        yield "legacy.detect_language", n, legacy_detect_language, lambda t=english: (t,)
+        # English with one non-ASCII character (a pasted ellipsis) is the worst
+        # case for the Urdu-script scan: no ASCII fast path, no early exit
+        mixed = english + " \u2026"
+        yield "langid.has_urdu_script", n, language_id.has_urdu_script, lambda t=mixed: (t,)
+        yield "legacy.has_urdu_script", n, legacy_has_urdu_script, lambda t=mixed: (t,)
+        yield "langid.primary_language_uncached", n, language_id.primary_language.__wrapped__, lambda t=urdu: (t,)
+        yield "legacy.primary_language", n, legacy_primary_language, lambda t=urdu: (t,)
+
+
+# ========== RUNNER ==========
+
+def time_call(fn, args_list: list, repeat: int) -> float:
+    """Best mean seconds per call; args_list holds one fresh argument tuple per call"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for args in args_list:
+            fn(*args)
+        best = min(best, (time.perf_counter() - started) / len(args_list))
+    return best
+
+
+def calls_for(seconds_per_call: float, budget: float = 0.1) -> int:
+    return max(1, min(10000, int(budget / max(seconds_per_call, 1e-7))))
+
+
+def bench(fn, make_args, repeat: int, fresh: bool = False) -> float:
+    """Calibrate the call count to ~0.1 s per repeat, then time"""
+    probe = time_call(fn, [make_args()], 1)
+    count = calls_for(probe)
+    if fresh:
+        # Mutating calls need their own copy each; cap to bound memory
+        args_list = [make_args() for _ in range(min(count, 500))]
+    else:
+        args_list = [make_args()] * count
+    return time_call(fn, args_list, repeat)
+
+
+def cases():
+    from llm import UrduPromptBuilder, UrduMedicalHistorySystem
+
+    system = UrduMedicalHistorySystem()
+    system.translate_to_english = lambda text: text   # measure the scan, not the LLM
+
+    for n in MESSAGE_SIZES:
+        data = make_collected_data(n)
+        yield "build_prompt", n, UrduPromptBuilder.build_prompt, lambda d=data: ("hpc_pain", d, URDU_ANSWER), False
+
+    for n in MESSAGE_SIZES:
+        text = " ".join(ENGLISH_WORDS[i % len(ENGLISH_WORDS)] for i in range(n))
+        yield "detect_language", n, UrduPromptBuilder.detect_language, lambda t=text: (t,), False
+
+    for name, n, fn, make_args in language_cases():
+        yield name, n, fn, make_args, False
+
+    for n in MESSAGE_SIZES:
+        template = make_state(n)
+        yield "tool_node", n, system.tool_node, lambda s=template: (copy.deepcopy(s),), True
+
+    for n in MESSAGE_SIZES:
+        state = make_state(n)
+        yield "get_history_view", n, system.get_history_view, lambda s=state: (s, "doctor"), False
+
+    from main import summarize_history_record
+
+    def summarize_all(records):
+        return [summarize_history_record(record) for record in records]
+
+    for n in RECORD_SIZES:
+        records = make_records(n)
+        yield "summarize_history_record", n, summarize_all, lambda r=records: (r,), False
+
+
+def run(only: set, repeat: int) -> dict:
+    results = {}
+    for name, size, fn, make_args, fresh in cases():
+        if only and name not in only:
+            continue
+        seconds = bench(fn, make_args, repeat, fresh)
+        results[f"{name}[{size}]"] = round(seconds * 1e6, 2)
+        print(f"  {name + '[' + str(size) + ']':<34} {seconds * 1e6:>12.2f} µs/call")
+    return results
+
+
+def compare(results: dict, baseline: dict) -> list:
+    regressions = []
+    for case, micros in results.items():
+        base = baseline.get(case)
+        if base and micros > base * TOLERANCE:
+            regressions.append(f"{case}: {micros} µs vs baseline {base} µs ({micros / base:.2f}x)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", action="append", help="run only this benchmark (repeatable)")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    print("Hot-path microbenchmarks (best of %d)" % args.repeat)
+    results = run(set(args.only or ()), args.repeat)
+    baseline_path = Path(args.baseline)
+
+    if args.save_baseline:
+        merged = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        merged.update(results)
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps(merged, indent=2, sort_keys=True))
+        print(f"Baseline saved -> {baseline_path}")
+        return
+
+    if not baseline_path.exists():
+        sys.exit(f"No baseline at {baseline_path}; run with --save-baseline first")
+    baseline = json.loads(baseline_path.read_text())
+    regressions = compare(results, baseline)
+    for case, micros in results.items():
+        if case in baseline:
+            print(f"  {case:<34} {baseline[case] / micros if micros else 0:>6.2f}x vs baseline")
+    if regressions:
+        print("REGRESSIONS:")
+        for item in regressions:
+            print(f"  - {item}")
+        sys.exit(1)
+    print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+IMPORT-TIME / COLD-START BENCHMARK
+
+Measures what an autoscaled host pays before it can answer requests:
+  1. `import main` (process up, port can open)
+  2. warm_up()     (ChatGroq client, compiled graph, Supabase client)
+
+Each run is a fresh interpreter. No network calls are made: a dummy
+GROQ_API_KEY is used unless one is already set, and UpliftAI is disabled.
+
+Usage (from the python/ directory):
+    python benchmarks/bench_import.py [--runs 5] [--top 15]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PYTHON_DIR = Path(__file__).resolve().parent.parent
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+main.UPLIFTAI_API_KEY = None
+main.warm_up(max_attempts=1)
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "warm_ms": (t2 - t1) * 1000,
+                  "ready": main._warm_state["ready"], "error": main._warm_state["error"]}))
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "bench-dummy-key")
+    env.pop("UPLIFTAI_API_KEY", None)
+    return env
+
+
+def run_once() -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=PYTHON_DIR, env=_env(), capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip())
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def top_imports(limit: int) -> list:
+    """Slowest modules by cumulative import time (python -X importtime)"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=PYTHON_DIR, env=_env(), capture_output=True, text=True
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self_us | cumulative_us | module"
+        _self_us, cumulative_us, name = [p.strip() for p in line.replace("import time:", "").split("|")]
+        rows.append((int(cumulative_us), name))
+    rows.sort(reverse=True)
+    return rows[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    imports = [r["import_ms"] for r in results]
+    warms = [r["warm_ms"] for r in results]
+
+    print(f"Cold start over {args.runs} fresh interpreters")
+    print(f"  import main : median {statistics.median(imports):8.1f} ms  (min {min(imports):.1f}, max {max(imports):.1f})")
+    print(f"  warm_up()   : median {statistics.median(warms):8.1f} ms  (min {min(warms):.1f}, max {max(warms):.1f})")
+    if results[-1]["error"]:
+        print(f"  warm-up error: {results[-1]['error']}")
+
+    print("\nSlowest imports (cumulative):")
+    for cumulative_us, name in top_imports(args.top):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+SCRIPTED PATIENT ANSWERS
+
+One answer per interview section, in section order. Shared by the load
+test and the record/replay graph benchmark so both exercise the same flow.
+"""
+
+SCRIPTS = {
+    "urdu_abdominal_pain": [
+        "میرا نام احمد علی ہے",
+        "میری عمر پینتالیس سال ہے",
+        "مرد",
+        "میں استاد ہوں",
+        "میں لاہور میں رہتا ہوں",
+        "میرا نمبر صفر تین سو ہے",
+        "مجھے تین دن سے پیٹ میں درد ہے",
+        "درد ناف کے پاس ہے اور کھانے کے بعد بڑھ جاتا ہے",
+        "بخار نہیں ہے، متلی ہوتی ہے",
+        "مجھے شوگر ہے",
+        "میٹفارمن لیتا ہوں",
+        "سگریٹ نہیں پیتا",
+    ],
+    "roman_urdu_headache": [
+        "mera naam sana hai",
+        "meri umar tees saal hai",
+        "aurat",
+        "main nurse hoon",
+        "karachi",
+        "0300 1234567",
+        "do hafte se sar mein dard hai",
+        "dard subah zyada hota hai, aankhon ke peeche",
+        "nazar dhundli ho jati hai kabhi kabhi",
+        "blood pressure ki shikayat hai",
+        "panadol leti hoon",
+        "chai bohat peeti hoon",
+    ],
+}
+
+DEFAULT_SCRIPT = "urdu_abdominal_pain"
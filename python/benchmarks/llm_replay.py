@@ -0,0 +1,172 @@
+"""
+RECORD / REPLAY FOR THE INTERVIEW LLM
+
+Wraps the tool-bound ChatGroq client of each model tier so that every
+`llm_with_tools.invoke(messages)` request and response can be written to a
+fixture file (record) and fed back later without network access (replay).
+
+    recorder = install_recorder(system)          # real Groq calls, captured
+    ... run interview ...
+    recorder.save("fixtures/urdu_abdominal_pain.json")
+
+    replayer = install_replayer(system, load_fixture(path))   # no network
+    ... run the same interview: identical responses, deterministic graph ...
+
+Replay looks responses up by a hash of (tier, messages). If the prompt has
+changed since recording, the next response of that tier is used instead and
+the call is counted as a divergence, so prompt edits are visible.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+
+
+FIXTURE_VERSION = 1
+
+
+def serialize_messages(messages: list) -> list:
+    return [{"type": getattr(m, "type", "unknown"), "content": getattr(m, "content", str(m))} for m in messages]
+
+
+def request_key(tier: str, messages: list) -> str:
+    payload = json.dumps([tier, serialize_messages(messages)], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+def serialize_response(response) -> dict:
+    return {
+        "content": response.content,
+        "tool_calls": [
+            {"name": call["name"], "args": call["args"], "id": call.get("id")}
+            for call in (getattr(response, "tool_calls", None) or [])
+        ],
+        "usage_metadata": dict(getattr(response, "usage_metadata", None) or {}),
+    }
+
+
+def deserialize_response(data: dict):
+    from langchain_core.messages import AIMessage
+    kwargs = {"content": data.get("content", ""), "tool_calls": data.get("tool_calls", [])}
+    if data.get("usage_metadata"):
+        kwargs["usage_metadata"] = data["usage_metadata"]
+    return AIMessage(**kwargs)
+
+
+# ========== RECORD ==========
+
+class RecordingClient:
+    """Delegates to the real tool-bound client and keeps every exchange"""
+
+    def __init__(self, tier: str, inner, sink: list, lock: threading.Lock):
+        self.tier = tier
+        self.inner = inner
+        self._sink = sink
+        self._lock = lock
+
+    def invoke(self, messages, **kwargs):
+        started = time.perf_counter()
+        response = self.inner.invoke(messages, **kwargs)
+        with self._lock:
+            self._sink.append({
+                "tier": self.tier,
+                "key": request_key(self.tier, messages),
+                "request": serialize_messages(messages),
+                "response": serialize_response(response),
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            })
+        return response
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def save(self, path, **metadata):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fixture = {"version": FIXTURE_VERSION, "metadata": metadata, "calls": self.calls}
+        path.write_text(json.dumps(fixture, ensure_ascii=False, indent=1), encoding="utf-8")
+        return path
+
+
+def install_recorder(system) -> Recorder:
+    """Wrap every tier client of an UrduMedicalHistorySystem with a recorder"""
+    recorder = Recorder()
+    for tier in system.MODEL_TIERS:
+        llm, llm_with_tools = system._tier_client(tier)
+        system._tier_clients[tier] = (llm, RecordingClient(tier, llm_with_tools, recorder.calls, recorder._lock))
+    return recorder
+
+
+# ========== REPLAY ==========
+
+def load_fixture(path) -> dict:
+    fixture = json.loads(Path(path).read_text(encoding="utf-8"))
+    if fixture.get("version") != FIXTURE_VERSION:
+        raise ValueError(f"{path}: unsupported fixture version {fixture.get('version')}")
+    return fixture
+
+
+class Replayer:
+    """Serves recorded responses; counts calls, replay time and divergences"""
+
+    def __init__(self, fixture: dict):
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self._by_tier = {}
+        for call in fixture["calls"]:
+            self._by_key.setdefault(call["key"], []).append(call["response"])
+            self._by_tier.setdefault(call["tier"], []).append(call["response"])
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._key_cursor = {key: 0 for key in self._by_key}
+            self._tier_cursor = {tier: 0 for tier in self._by_tier}
+            self.calls = 0
+            self.divergences = 0
+            self.replay_seconds = 0.0
+
+    def respond(self, tier: str, messages: list):
+        started = time.perf_counter()
+        key = request_key(tier, messages)
+        with self._lock:
+            self.calls += 1
+            responses = self._by_key.get(key)
+            if responses:
+                index = min(self._key_cursor[key], len(responses) - 1)
+                self._key_cursor[key] += 1
+                data = responses[index]
+            else:
+                self.divergences += 1
+                responses = self._by_tier.get(tier) or [r for rs in self._by_tier.values() for r in rs]
+                if not responses:
+                    raise LookupError(f"fixture has no responses for tier '{tier}'")
+                index = self._tier_cursor.get(tier, 0) % len(responses)
+                self._tier_cursor[tier] = index + 1
+                data = responses[index]
+        response = deserialize_response(data)
+        with self._lock:
+            self.replay_seconds += time.perf_counter() - started
+        return response
+
+
+class ReplayClient:
+    def __init__(self, tier: str, replayer: Replayer):
+        self.tier = tier
+        self.replayer = replayer
+
+    def invoke(self, messages, **kwargs):
+        return self.replayer.respond(self.tier, messages)
+
+
+def install_replayer(system, fixture: dict) -> Replayer:
+    """Replace every tier client of an UrduMedicalHistorySystem with fixture playback"""
+    replayer = Replayer(fixture)
+    for tier in system.MODEL_TIERS:
+        system._tier_clients[tier] = (None, ReplayClient(tier, replayer))
+    return replayer
@@ -0,0 +1,291 @@
+"""
+OFFLINE LOAD TEST
+
+Starts the local upstream fakes (benchmarks/fake_upstreams.py), runs main.py
+under uvicorn pointed at them, and drives N concurrent scripted Urdu
+interviews through the real HTTP/WebSocket API. No paid API is called.
+
+Reports throughput, p50/p95/p99 turn latency per endpoint, error counts,
+upstream call counts and server memory per held session.
+
+Modes:
+    text    /api/start-interview + /api/send-message
+    voice   /api/start-interview + /api/send-message-with-voice (TTS fake)
+    ws      /ws/interview/{session_id}
+
+Usage (from the python/ directory, after pip install -r benchmarks/requirements.txt):
+    python benchmarks/run_load.py --sessions 50 --mode text \
+        --latency groq_chat=800,200 --latency upliftai_tts=600,150 --errors groq_chat=0.01
+
+By default Groq rate limits are lifted so the server, not the scheduler, is
+measured; pass --keep-rate-limits to load-test with the production limits.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fake_upstreams import FakeUpstreams, parse_profiles  # noqa: E402
+from interview_scripts import SCRIPTS, DEFAULT_SCRIPT  # noqa: E402
+
+PYTHON_DIR = Path(__file__).resolve().parent.parent
+
+SCRIPT = SCRIPTS[DEFAULT_SCRIPT]
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(values: list) -> dict:
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "mean_ms": round(statistics.fmean(values) * 1000, 1) if values else 0.0,
+    }
+
+
+def rss_kb(pid: int) -> int:
+    """Resident set size of a process (Linux /proc)"""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def unlimited_rate_limits() -> str:
+    sys.path.insert(0, str(PYTHON_DIR))
+    from groq_scheduler import DEFAULT_LIMITS
+    return json.dumps({model: {"rpm": None, "tpm": None} for model in DEFAULT_LIMITS})
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.turns = 0
+        self.completed_interviews = 0
+
+    def ok(self, endpoint: str, seconds: float):
+        self.latencies.setdefault(endpoint, []).append(seconds)
+
+    def error(self, endpoint: str, reason: str):
+        key = f"{endpoint}: {reason}"
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+
+# ========== SCRIPTED CLIENTS ==========
+
+async def timed_post(client: httpx.AsyncClient, recorder: Recorder, endpoint: str, payload=None):
+    started = time.perf_counter()
+    try:
+        response = await client.post(endpoint, json=payload)
+    except httpx.HTTPError as e:
+        recorder.error(endpoint, type(e).__name__)
+        return None
+    elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        recorder.error(endpoint, str(response.status_code))
+        return None
+    body = response.json()
+    if isinstance(body, dict) and body.get("error"):
+        recorder.error(endpoint, body["error"])
+        return None
+    recorder.ok(endpoint, elapsed)
+    return body
+
+
+async def http_interview(client: httpx.AsyncClient, recorder: Recorder, with_voice: bool):
+    started = await timed_post(client, recorder, "/api/start-interview")
+    if not started:
+        return
+    session_id = started["session_id"]
+    endpoint = "/api/send-message-with-voice" if with_voice else "/api/send-message"
+    for answer in SCRIPT:
+        reply = await timed_post(client, recorder, endpoint, {"session_id": session_id, "message": answer})
+        recorder.turns += 1
+        if reply is None:
+            return
+        if reply.get("is_complete"):
+            break
+    recorder.completed_interviews += 1
+
+
+async def ws_interview(base_url: str, recorder: Recorder):
+    import websockets
+
+    endpoint = "/ws/interview"
+    url = base_url.replace("http://", "ws://") + f"{endpoint}/{uuid.uuid4()}"
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            await ws.recv()  # opening question
+            for answer in SCRIPT:
+                started = time.perf_counter()
+                await ws.send(json.dumps({"message": answer}))
+                while True:
+                    frame = json.loads(await ws.recv())
+                    if frame.get("type") == "error":
+                        recorder.error(endpoint, frame.get("message", "error")[:60])
+                    if frame.get("type") == "complete":
+                        break
+                recorder.ok(endpoint, time.perf_counter() - started)
+                recorder.turns += 1
+                if frame.get("is_complete"):
+                    break
+        recorder.completed_interviews += 1
+    except Exception as e:
+        recorder.error(endpoint, type(e).__name__)
+
+
+async def drive(base_url: str, sessions: int, concurrency: int, mode: str) -> Recorder:
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def one():
+            async with semaphore:
+                if mode == "ws":
+                    await ws_interview(base_url, recorder)
+                else:
+                    await http_interview(client, recorder, with_voice=(mode == "voice"))
+
+        await asyncio.gather(*(one() for _ in range(sessions)))
+    return recorder
+
+
+# ========== SERVER UNDER TEST ==========
+
+def start_server(env: dict, port: int) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        # stderr goes to a file: a full pipe would stall the server mid-run
+        cwd=PYTHON_DIR, env=env, stdout=subprocess.DEVNULL, stderr=tempfile.TemporaryFile()
+    )
+
+
+def wait_ready(base_url: str, proc: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode} (run main.py directly to see why)")
+        try:
+            if httpx.get(f"{base_url}/health/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError("server did not become ready")
+
+
+def run(args) -> dict:
+    fakes = FakeUpstreams(profiles=parse_profiles(args.latency, args.errors)).start()
+    env = dict(os.environ)
+    env.update(fakes.env())
+    env.setdefault("LOG_LEVEL", "WARNING")
+    if not args.keep_rate_limits:
+        env["GROQ_RATE_LIMITS"] = unlimited_rate_limits()
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    proc = start_server(env, port)
+    try:
+        wait_ready(base_url, proc)
+        rss_before = rss_kb(proc.pid)
+
+        started = time.perf_counter()
+        recorder = asyncio.run(drive(base_url, args.sessions, args.concurrency or args.sessions, args.mode))
+        wall = time.perf_counter() - started
+
+        rss_after = rss_kb(proc.pid)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        fakes.stop()
+
+    all_turns = [t for values in recorder.latencies.values() for t in values]
+    return {
+        "mode": args.mode,
+        "sessions": args.sessions,
+        "concurrency": args.concurrency or args.sessions,
+        "wall_s": round(wall, 2),
+        "turns": recorder.turns,
+        "completed_interviews": recorder.completed_interviews,
+        "throughput_turns_per_s": round(recorder.turns / wall, 2) if wall else 0.0,
+        "latency": {endpoint: latency_summary(values) for endpoint, values in recorder.latencies.items()},
+        "latency_all": latency_summary(all_turns),
+        "errors": recorder.errors,
+        "memory": {
+            "rss_before_kb": rss_before,
+            "rss_after_kb": rss_after,
+            "per_session_kb": round((rss_after - rss_before) / args.sessions, 1) if args.sessions else 0.0,
+        },
+        "upstream_calls": fakes.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="interviews to run")
+    parser.add_argument("--concurrency", type=int, default=0, help="interviews in flight (default: all)")
+    parser.add_argument("--mode", choices=("text", "voice", "ws"), default="text")
+    parser.add_argument("--latency", action="append", help="upstream=mean_ms[,jitter_ms] (repeatable)")
+    parser.add_argument("--errors", action="append", help="upstream=rate[,status] (repeatable)")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="use production Groq rate limits")
+    parser.add_argument("--json", action="store_true", help="print the raw report")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    print(f"\n{report['mode']}: {report['sessions']} interviews, concurrency {report['concurrency']}, "
+          f"{report['wall_s']} s wall")
+    print(f"  turns: {report['turns']}  completed: {report['completed_interviews']}  "
+          f"throughput: {report['throughput_turns_per_s']} turns/s")
+    print(f"  {'endpoint':<32} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for endpoint, summary in report["latency"].items():
+        print(f"  {endpoint:<32} {summary['count']:>6} {summary['p50_ms']:>7.1f}ms "
+              f"{summary['p95_ms']:>7.1f}ms {summary['p99_ms']:>7.1f}ms")
+    print(f"  memory: {report['memory']['per_session_kb']} KB/session "
+          f"(RSS {report['memory']['rss_before_kb']} -> {report['memory']['rss_after_kb']} KB)")
+    print(f"  upstream calls: {report['upstream_calls']['calls']}")
+    if report["errors"]:
+        print(f"  errors: {report['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+GRAPH CHECKPOINT STORAGE AND RETENTION
+
+Interview sessions are LangGraph threads (thread_id = session_id) whose
+state is checkpointed after every graph step, so a crash or redeploy
+doesn't lose in-progress interviews. The file holds whole conversations,
+so it lives in SEHAT_DATA_DIR (never a served directory).
+
+SqliteSaver keeps one checkpoint per step, each with the full message list,
+so an interview's storage grew O(n^2) and nothing was ever deleted. Here:
+
+- after every turn a thread keeps only its latest checkpoint (touch)
+- finished interviews are deleted CHECKPOINT_FINISHED_RETENTION_SECONDS
+  after their last turn (the history view and store calls come first)
+- abandoned interviews are deleted after CHECKPOINT_IDLE_RETENTION_SECONDS
+- prune() runs from the turn path at most every CHECKPOINT_PRUNE_INTERVAL_SECONDS
+
+Without langgraph-checkpoint-sqlite an in-memory saver is used; its threads
+are deleted by the same retention rules but not trimmed.
+"""
+
+import os
+import threading
+import time
+from typing import List
+
+from structured_log import get_logger
+
+log = get_logger("checkpoints")
+
+
+DATA_DIR = os.getenv("SEHAT_DATA_DIR", "data")
+GRAPH_CHECKPOINT_PATH = os.getenv("GRAPH_CHECKPOINT_PATH", os.path.join(DATA_DIR, "graph_checkpoints.sqlite3"))
+CHECKPOINT_FINISHED_RETENTION_SECONDS = float(os.getenv("CHECKPOINT_FINISHED_RETENTION_SECONDS", "86400"))
+CHECKPOINT_IDLE_RETENTION_SECONDS = float(os.getenv("CHECKPOINT_IDLE_RETENTION_SECONDS", str(7 * 86400)))
+CHECKPOINT_PRUNE_INTERVAL_SECONDS = float(os.getenv("CHECKPOINT_PRUNE_INTERVAL_SECONDS", "600"))
+
+_ACTIVITY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_activity (
+    thread_id  TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL,
+    finished   INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+class SessionCheckpoints:
+    """The session graph's checkpointer plus per-thread trimming and retention"""
+
+    def __init__(
+        self,
+        path: str = GRAPH_CHECKPOINT_PATH,
+        finished_retention: float = CHECKPOINT_FINISHED_RETENTION_SECONDS,
+        idle_retention: float = CHECKPOINT_IDLE_RETENTION_SECONDS,
+        prune_interval: float = CHECKPOINT_PRUNE_INTERVAL_SECONDS,
+    ):
+        self.finished_retention = finished_retention
+        self.idle_retention = idle_retention
+        self.prune_interval = prune_interval
+
+        self._lock = threading.Lock()
+        self._activity = {}   # memory saver only: thread_id -> (updated_at, finished)
+        self._next_prune = 0.0
+        self.saver = self._open_sqlite(path)
+        self.persistent = self.saver is not None
+        if not self.persistent:
+            from langgraph.checkpoint.memory import InMemorySaver
+            log.warning("checkpoint.sqlite_unavailable", fallback="memory")
+            self.saver = InMemorySaver()
+
+    def _open_sqlite(self, path: str):
+        """SqliteSaver if langgraph-checkpoint-sqlite is installed, else None"""
+        try:
+            import sqlite3
+            from langgraph.checkpoint.sqlite import SqliteSaver
+        except ImportError:
+            return None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        # Deleted conversations are overwritten; freed pages go back to the OS (new files)
+        conn.execute("PRAGMA secure_delete=ON")
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        saver = SqliteSaver(conn)
+        with saver.cursor() as cur:
+            cur.execute(_ACTIVITY_SCHEMA)
+            # Threads checkpointed before retention existed start their clock now
+            cur.execute(
+                "INSERT OR IGNORE INTO session_activity (thread_id, updated_at)"
+                " SELECT DISTINCT thread_id, ? FROM checkpoints", (time.time(),)
+            )
+        return saver
+
+    def touch(self, thread_id: str, finished: bool = False):
+        """Record a turn: trim the thread to its latest checkpoint and note its activity"""
+        now = time.time()
+        if not self.persistent:
+            with self._lock:
+                self._activity[thread_id] = (now, finished)
+        else:
+            with self.saver.cursor() as cur:
+                cur.execute(
+                    "INSERT INTO session_activity (thread_id, updated_at, finished) VALUES (?, ?, ?)"
+                    " ON CONFLICT (thread_id) DO UPDATE SET updated_at = excluded.updated_at,"
+                    " finished = MAX(finished, excluded.finished)",
+                    (thread_id, now, int(finished))
+                )
+                latest = cur.execute(
+                    "SELECT MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ''",
+                    (thread_id,)
+                ).fetchone()[0]
+                if latest is not None:
+                    # checkpoint ids are time-ordered (uuid6); earlier ones are superseded
+                    for table in ("writes", "checkpoints"):
+                        cur.execute(
+                            f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = '' AND checkpoint_id < ?",
+                            (thread_id, latest)
+                        )
+        if time.monotonic() >= self._next_prune:
+            self.prune()
+
+    def _stale_threads(self, now: float) -> List[str]:
+        finished_before = now - self.finished_retention
+        idle_before = now - self.idle_retention
+        if not self.persistent:
+            with self._lock:
+                return [
+                    thread_id for thread_id, (updated_at, finished) in self._activity.items()
+                    if updated_at < idle_before or (finished and updated_at < finished_before)
+                ]
+        with self.saver.cursor(transaction=False) as cur:
+            rows = cur.execute(
+                "SELECT thread_id FROM session_activity WHERE updated_at < ? OR (finished = 1 AND updated_at < ?)",
+                (idle_before, finished_before)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def prune(self) -> int:
+        """Delete finished and abandoned threads past their retention; returns how many"""
+        self._next_prune = time.monotonic() + self.prune_interval
+        stale = self._stale_threads(time.time())
+        for thread_id in stale:
+            self.saver.delete_thread(thread_id)
+            if not self.persistent:
+                with self._lock:
+                    self._activity.pop(thread_id, None)
+        if stale and self.persistent:
+            with self.saver.cursor() as cur:
+                cur.executemany("DELETE FROM session_activity WHERE thread_id = ?", [(t,) for t in stale])
+                # executescript steps the pragma to completion (execute frees one page)
+                cur.executescript("PRAGMA incremental_vacuum;")
+        if stale:
+            log.info("checkpoint.pruned", threads=len(stale))
+        return len(stale)
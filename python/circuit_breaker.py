@@ -0,0 +1,193 @@
+"""
+PER-UPSTREAM CIRCUIT BREAKERS
+
+When an upstream (Groq chat, Groq STT, UpliftAI TTS, Supabase) is degraded,
+waiting for each request to fail ties up workers. A breaker watches the
+recent failure rate and, once it is too high, fails calls instantly for a
+cool-down period. After that it lets a few probe calls through (half-open):
+if they succeed it closes again, otherwise it re-opens.
+
+Only upstream failures count: a call refused by the Groq scheduler, a turn
+deadline that ran out, or a timeout the deadline cut short says nothing
+about the upstream, so it is not recorded.
+
+    breakers["upliftai_tts"].call(fn, *args)   # raises CircuitOpenError when open
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from deadline import DeadlineExceeded, current_deadline
+from groq_scheduler import GroqRateLimited
+from metrics import record_upstream_error
+from structured_log import get_logger
+
+log = get_logger("circuit")
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} temporarily unavailable (circuit open, retry in {retry_after:.0f}s)")
+
+
+def counts_as_failure(error: Exception) -> bool:
+    """Client errors (4xx other than 408/429) say nothing about upstream health"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500 and status not in (408, 429):
+        return False
+    return True
+
+
+def caused_by_caller(error: Exception) -> bool:
+    """Failures of this caller's own limits, not the upstream's: the scheduler
+    refusing or giving up on a call (rate limit / deadline), the turn budget
+    running out, or a timeout cut short by that budget"""
+    if isinstance(error, (GroqRateLimited, DeadlineExceeded)):
+        return True
+    if any("Timeout" in cls.__name__ for cls in type(error).__mro__):
+        deadline = current_deadline()
+        return deadline is not None and deadline.remaining() <= 0.5
+    return False
+
+
+class CircuitBreaker:
+    """Failure-rate breaker over a sliding window of recent calls"""
+
+    def __init__(self, name: str, failure_rate: float = 0.5, window: int = 20,
+                 min_calls: int = 5, open_seconds: float = 30.0, half_open_probes: int = 2):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window)   # True = success
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+        self.rejected = 0
+        self.times_opened = 0
+
+    # ----- state machine -----
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        return self._state
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self.times_opened += 1
+        log.warning("circuit.opened", upstream=self.name)
+
+    def _before_call(self):
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if state == OPEN:
+                self.rejected += 1
+                raise CircuitOpenError(self.name, self.open_seconds - (now - self._opened_at))
+            if state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    self.rejected += 1
+                    raise CircuitOpenError(self.name, 1.0)
+                self._probes_in_flight += 1
+            return state
+
+    def _release(self, state: str):
+        """A call that ended without telling us anything about the upstream"""
+        if state == HALF_OPEN:
+            with self._lock:
+                self._probes_in_flight -= 1
+
+    def _after_call(self, state: str, success: bool):
+        now = time.monotonic()
+        with self._lock:
+            if state == HALF_OPEN:
+                self._probes_in_flight -= 1
+                if not success:
+                    self._outcomes.clear()
+                    self._open(now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    log.info("circuit.closed", upstream=self.name)
+                return
+
+            self._outcomes.append(success)
+            if self._state == CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = self._outcomes.count(False)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._open(now)
+
+    # ----- public API -----
+
+    def call(self, fn: Callable, /, *args, **kwargs):
+        """Run fn through the breaker; fails fast with CircuitOpenError while open"""
+        try:
+            state = self._before_call()
+        except CircuitOpenError as e:
+            record_upstream_error(self.name, e)
+            raise
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            # One client's tight budget must not open the circuit for everyone
+            if caused_by_caller(e):
+                self._release(state)
+                raise
+            record_upstream_error(self.name, e)
+            self._after_call(state, success=not counts_as_failure(e))
+            raise
+        self._after_call(state, success=True)
+        return result
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            calls = len(self._outcomes)
+            return {
+                "state": state,
+                "recent_calls": calls,
+                "recent_failure_rate": round(self._outcomes.count(False) / calls, 3) if calls else 0.0,
+                "open_for_s": round(max(0.0, self.open_seconds - (now - self._opened_at)), 1) if state == OPEN else 0.0,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+
+# One breaker per upstream dependency
+breakers = {
+    name: CircuitBreaker(name, failure_rate=FAILURE_RATE, open_seconds=OPEN_SECONDS)
+    for name in ("groq_chat", "groq_stt", "upliftai_tts", "supabase")
+}
+
+
+def breaker_states() -> dict:
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
@@ -0,0 +1,82 @@
+"""
+PER-TURN DEADLINE BUDGET
+
+A voice turn is STT -> graph turn (LLM) -> TTS. Each request gets one
+Deadline; every upstream call derives its timeout from what is left, and
+when the budget runs low the turn degrades instead of hanging:
+
+- graph turn falls back to the small model   ("small_model")
+- TTS is skipped and text is returned only   ("skipped_tts")
+
+The active deadline travels in a ContextVar. Worker threads get it through
+call_with_deadline(), since asyncio.to_thread copies the caller's context
+but StreamingResponse generators may run in another task.
+"""
+
+import os
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+
+TURN_DEADLINE_SECONDS = float(os.getenv("TURN_DEADLINE_SECONDS", "25"))
+
+# Minimum budget a stage needs to be worth starting
+LLM_LARGE_MIN_SECONDS = float(os.getenv("LLM_LARGE_MIN_SECONDS", "8"))
+TTS_MIN_SECONDS = float(os.getenv("TTS_MIN_SECONDS", "2"))
+
+_current: ContextVar = ContextVar("turn_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The turn's budget ran out before a required stage could run"""
+
+
+class Deadline:
+    """Wall-clock budget for one request, plus the degradations it caused"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.budget = seconds if seconds is not None else TURN_DEADLINE_SECONDS
+        self.started = time.monotonic()
+        self.expires = self.started + self.budget
+        self.degradations = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def timeout(self, cap: Optional[float] = None, floor: float = 0.5) -> float:
+        """Timeout for the next upstream call: what is left, optionally capped"""
+        remaining = self.remaining()
+        if cap is not None:
+            remaining = min(remaining, cap)
+        return max(remaining, floor)
+
+    def check(self, stage: str):
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Turn deadline exceeded before {stage}")
+
+    def degrade(self, name: str):
+        if name not in self.degradations:
+            self.degradations.append(name)
+
+    def report(self) -> dict:
+        return {
+            "budget_ms": round(self.budget * 1000),
+            "elapsed_ms": round((time.monotonic() - self.started) * 1000, 1),
+            "remaining_ms": round(self.remaining() * 1000, 1),
+            "degradations": list(self.degradations),
+        }
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline of the turn running in this context, if any"""
+    return _current.get()
+
+
+def call_with_deadline(deadline: Optional[Deadline], fn: Callable, /, *args, **kwargs):
+    """Run fn with `deadline` active (use as asyncio.to_thread(call_with_deadline, d, fn, ...))"""
+    token = _current.set(deadline)
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _current.reset(token)
@@ -0,0 +1,260 @@
+"""
+COALESCED, BACKPRESSURED WEBSOCKET FRAMES
+
+websocket_interview used to call send_json once per token, so every token
+paid JSON encoding and a frame header, and a client that read slowly let
+the server buffer without limit. FrameSender sits between the turn and the
+socket:
+
+- tokens are coalesced into one frame every WS_FLUSH_MS milliseconds or
+  WS_FLUSH_CHARS characters, whichever comes first
+- frames pass through a bounded queue (WS_SEND_QUEUE_FRAMES) drained by a
+  single writer task. A producer that outruns the client waits
+  (backpressure), and tokens queued behind a slow send are merged into one
+  frame
+- slow consumers: once the producer has been blocked for
+  WS_SLOW_CONSUMER_SECONDS, the rest of the turn's tokens are not streamed
+  (the final frame carries the whole reply). A single send that takes
+  longer than WS_SEND_TIMEOUT_SECONDS closes the connection
+- frames, bytes and tokens are counted per turn (finish_turn)
+
+    sender = FrameSender(websocket).start()
+    sender.begin_turn()
+    await sender.token("...")               # many times
+    await sender.send({"type": "complete", ...})
+    stats = await sender.finish_turn()
+    await sender.close()
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Optional
+
+from metrics import WS_TURN_FRAMES, WS_TURN_BYTES, WS_SLOW_CONSUMERS
+from structured_log import get_logger
+
+log = get_logger("frames")
+
+
+WS_FLUSH_MS = float(os.getenv("WS_FLUSH_MS", "50"))
+WS_FLUSH_CHARS = int(os.getenv("WS_FLUSH_CHARS", "64"))
+WS_SEND_QUEUE_FRAMES = int(os.getenv("WS_SEND_QUEUE_FRAMES", "32"))
+WS_SLOW_CONSUMER_SECONDS = float(os.getenv("WS_SLOW_CONSUMER_SECONDS", "2"))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+
+_TOKEN = "token"
+_FRAME = "frame"
+
+
+class SlowConsumer(Exception):
+    """The client stopped reading; the connection has been closed"""
+
+
+def encode_frame(frame: dict) -> str:
+    """Same encoding as Starlette's send_json"""
+    return json.dumps(frame, ensure_ascii=False, separators=(",", ":"))
+
+
+class FrameSender:
+    """Token coalescing + bounded send queue for one websocket (single producer)"""
+
+    def __init__(
+        self,
+        websocket,
+        flush_ms: float = WS_FLUSH_MS,
+        flush_chars: int = WS_FLUSH_CHARS,
+        max_queue: int = WS_SEND_QUEUE_FRAMES,
+        slow_after: float = WS_SLOW_CONSUMER_SECONDS,
+        send_timeout: float = WS_SEND_TIMEOUT_SECONDS,
+    ):
+        self.websocket = websocket
+        self.flush_seconds = flush_ms / 1000
+        self.flush_chars = flush_chars
+        self.slow_after = slow_after
+        self.send_timeout = send_timeout
+
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._buffer = []
+        self._buffered_chars = 0
+        self._buffer_started = 0.0
+        self._timer = None
+        self._writer = None
+        self._error: Optional[Exception] = None
+        self.begin_turn()
+
+    def start(self) -> "FrameSender":
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+        return self
+
+    # ----- producer side -----
+
+    def begin_turn(self):
+        """Reset per-turn counters; token streaming resumes after a degraded turn"""
+        self.streaming_tokens = True
+        self._turn = {
+            "frames": 0, "bytes": 0, "tokens": 0, "token_frames": 0,
+            "max_queue_depth": 0, "blocked_ms": 0.0, "dropped_chars": 0, "degraded": False,
+        }
+
+    async def token(self, text: str):
+        """Buffer one token; flushed by size, age, or the flush timer"""
+        if not text:
+            return
+        self._turn["tokens"] += 1
+        if not self.streaming_tokens:
+            self._turn["dropped_chars"] += len(text)
+            return
+        if not self._buffer:
+            self._buffer_started = time.monotonic()
+        self._buffer.append(text)
+        self._buffered_chars += len(text)
+        if (self._buffered_chars >= self.flush_chars
+                or time.monotonic() - self._buffer_started >= self.flush_seconds):
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_seconds, self._flush_on_timer)
+
+    async def flush(self):
+        """Queue buffered tokens as one frame"""
+        text = self._take_buffer()
+        if text and not await self._put((_TOKEN, text), self.slow_after):
+            self._degrade(len(text))
+
+    async def send(self, frame: dict):
+        """Queue a control frame (after any buffered tokens); waits for room"""
+        await self.flush()
+        await self._put((_FRAME, frame), None)
+
+    async def finish_turn(self) -> dict:
+        """Wait until everything queued is on the wire; returns the turn's counts"""
+        await self.flush()
+        await self._queue.join()
+        self._raise_if_failed()
+        stats = dict(self._turn, blocked_ms=round(self._turn["blocked_ms"], 1))
+        WS_TURN_FRAMES.observe(stats["frames"])
+        WS_TURN_BYTES.observe(stats["bytes"])
+        return stats
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._writer = None
+
+    def _take_buffer(self) -> str:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered_chars = 0
+        return text
+
+    def _flush_on_timer(self):
+        self._timer = None
+        if not self._buffer or self._error is not None:
+            return
+        if self._queue.full():
+            # Writer is behind; the buffer keeps merging until there is room
+            self._timer = asyncio.get_running_loop().call_later(self.flush_seconds, self._flush_on_timer)
+            return
+        self._queue.put_nowait((_TOKEN, self._take_buffer()))
+        self._note_depth()
+
+    async def _put(self, item: tuple, timeout: Optional[float]) -> bool:
+        """Enqueue, waiting up to `timeout` (None = until the writer makes room)"""
+        self._raise_if_failed()
+        if not self._queue.full():
+            self._queue.put_nowait(item)
+            self._note_depth()
+            return True
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._queue.put(item), timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._turn["blocked_ms"] += (time.perf_counter() - started) * 1000
+        self._raise_if_failed()
+        self._note_depth()
+        return True
+
+    def _note_depth(self):
+        self._turn["max_queue_depth"] = max(self._turn["max_queue_depth"], self._queue.qsize())
+
+    def _degrade(self, dropped: int):
+        self.streaming_tokens = False
+        self._turn["degraded"] = True
+        self._turn["dropped_chars"] += dropped
+        WS_SLOW_CONSUMERS.labels(action="degraded").inc()
+        log.warning("ws.slow_consumer", action="degraded", queue_depth=self._queue.qsize(),
+                    blocked_ms=round(self._turn["blocked_ms"], 1))
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
+
+    # ----- writer side -----
+
+    async def _write_loop(self):
+        pending = None
+        try:
+            while True:
+                item = pending or await self._queue.get()
+                pending = None
+                kind, payload = item
+                taken = 1
+                if kind == _TOKEN:
+                    # Tokens that piled up behind a slow send leave as one frame
+                    parts = [payload]
+                    while not self._queue.empty():
+                        following = self._queue.get_nowait()
+                        if following[0] != _TOKEN:
+                            pending = following
+                            break
+                        parts.append(following[1])
+                        taken += 1
+                    frame = {"type": "token", "content": "".join(parts)}
+                    self._turn["token_frames"] += 1
+                else:
+                    frame = payload
+                try:
+                    await self._send(frame)
+                finally:
+                    # A `pending` frame stays unfinished until its own send
+                    for _ in range(taken):
+                        self._queue.task_done()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._error = e if isinstance(e, SlowConsumer) else SlowConsumer(str(e))
+            # Unblock the producer and finish_turn(); they re-raise the error
+            if pending is not None:
+                self._queue.task_done()
+            while not self._queue.empty():
+                self._queue.get_nowait()
+                self._queue.task_done()
+
+    async def _send(self, frame: dict):
+        text = encode_frame(frame)
+        try:
+            await asyncio.wait_for(self.websocket.send_text(text), self.send_timeout)
+        except asyncio.TimeoutError:
+            WS_SLOW_CONSUMERS.labels(action="disconnected").inc()
+            log.warning("ws.slow_consumer", action="disconnected", send_timeout_s=self.send_timeout)
+            try:
+                await asyncio.wait_for(self.websocket.close(code=1013), 1.0)
+            except Exception:
+                pass
+            raise SlowConsumer(f"client did not read a frame within {self.send_timeout:g}s")
+        self._turn["frames"] += 1
+        self._turn["bytes"] += len(text.encode("utf-8"))
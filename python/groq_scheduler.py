@@ -0,0 +1,290 @@
+"""
+RATE-LIMIT-AWARE SCHEDULER FOR GROQ TRAFFIC
+
+One Groq account is shared by Whisper STT, the interview agent and the
+translation calls. Every call goes through `groq_scheduler.call(...)`, which:
+
+- holds per-model token buckets for requests/minute and tokens/minute
+- admits live interview traffic (INTERACTIVE) ahead of BACKGROUND work
+- retries 429s with jittered exponential backoff (honouring Retry-After)
+- records queueing delay so it can be exposed on a stats endpoint
+- respects a turn Deadline: admission waits and 429 backoffs that would
+  outlast it fail fast with GroqRateLimited, and the call's timeout is
+  computed from what is left once the call is admitted
+
+Limits can be overridden with GROQ_RATE_LIMITS, a JSON object like
+{"openai/gpt-oss-120b": {"rpm": 30, "tpm": 8000}}.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Optional
+
+from structured_log import get_logger
+
+log = get_logger("groq_scheduler")
+
+
+class Priority:
+    INTERACTIVE = 0   # live interview turns, STT, TTS-blocking work
+    BACKGROUND = 1    # translation, history views, batch jobs
+
+    NAMES = {0: "interactive", 1: "background"}
+
+
+# Conservative defaults (Groq free tier); None = not limited
+DEFAULT_LIMITS = {
+    "openai/gpt-oss-120b": {"rpm": 30, "tpm": 8000},
+    "llama-3.1-8b-instant": {"rpm": 30, "tpm": 6000},
+    "whisper-large-v3-turbo": {"rpm": 20, "tpm": None},
+    "whisper-large-v3": {"rpm": 20, "tpm": None},
+}
+FALLBACK_LIMITS = {"rpm": 30, "tpm": None}
+
+
+class GroqRateLimited(Exception):
+    """Raised when a call is still rate limited after all retries"""
+
+    def __init__(self, model: str, retry_after: Optional[float] = None):
+        self.model = model
+        self.retry_after = retry_after
+        super().__init__(f"Groq rate limit exceeded for {model}")
+
+
+def estimate_tokens(text: str, max_completion: int = 0) -> int:
+    """Rough token estimate (~3 chars/token for mixed Urdu/English) plus completion budget"""
+    return len(text or "") // 3 + max_completion
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    """HTTP 429 from the Groq SDK (groq.RateLimitError) or anything carrying its response"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    return any(cls.__name__ == "RateLimitError" for cls in type(error).__mro__)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        value = headers.get("retry-after")
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _actual_tokens(result) -> Optional[int]:
+    """Total tokens reported by a Groq SDK or langchain response, if any"""
+    usage = getattr(result, "usage", None)
+    if usage is not None and getattr(usage, "total_tokens", None) is not None:
+        return usage.total_tokens
+    metadata = getattr(result, "usage_metadata", None)
+    if isinstance(metadata, dict) and metadata.get("total_tokens") is not None:
+        return metadata["total_tokens"]
+    return None
+
+
+class TokenBucket:
+    """Continuous-refill bucket: `per_minute` units, burst up to `per_minute`"""
+
+    def __init__(self, per_minute: Optional[float]):
+        self.capacity = float(per_minute) if per_minute else None
+        self.level = self.capacity or 0.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.capacity is None:
+            return
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if available now)"""
+        if self.capacity is None:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)  # a single huge request must still pass eventually
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60.0 / self.capacity
+
+    def take(self, amount: float):
+        if self.capacity is not None:
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, delta: float):
+        """Correct an estimate after the fact (negative delta refunds)"""
+        if self.capacity is not None:
+            self.level = min(self.capacity, self.level - delta)
+
+
+class _ModelLane:
+    def __init__(self, limits: dict):
+        self.configure(limits)
+        self.waiting = []   # [(priority, seq)] callers queued for this model
+
+    def configure(self, limits: dict):
+        self.requests = TokenBucket(limits.get("rpm"))
+        self.tokens = TokenBucket(limits.get("tpm"))
+
+
+class GroqScheduler:
+    """Admission control + retry for every Groq call in the process"""
+
+    def __init__(self, limits: Optional[dict] = None, max_retries: int = 4,
+                 base_backoff: float = 0.5, max_backoff: float = 20.0):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._cond = threading.Condition()
+        self._lanes = {}
+        self._seq = 0
+
+        # metrics
+        self._waits = defaultdict(lambda: deque(maxlen=500))   # (model, priority) -> recent waits (s)
+        self._counters = defaultdict(int)                     # (model, name) -> count
+
+    @classmethod
+    def from_env(cls) -> "GroqScheduler":
+        overrides = {}
+        raw = os.getenv("GROQ_RATE_LIMITS")
+        if raw:
+            try:
+                overrides = json.loads(raw)
+            except ValueError as e:
+                log.warning("groq_scheduler.invalid_rate_limits", error=str(e), using="defaults")
+        return cls(limits=overrides)
+
+    def set_limits(self, limits: dict):
+        """Replace per-model limits at runtime (buckets restart full), e.g. to lift
+        them for offline benchmarks after the module-level scheduler was built"""
+        with self._cond:
+            self.limits = {**DEFAULT_LIMITS, **limits}
+            for model, lane in self._lanes.items():
+                lane.configure(self.limits.get(model, FALLBACK_LIMITS))
+            self._cond.notify_all()
+
+    def _lane(self, model: str) -> _ModelLane:
+        if model not in self._lanes:
+            self._lanes[model] = _ModelLane(self.limits.get(model, FALLBACK_LIMITS))
+        return self._lanes[model]
+
+    # ----- admission -----
+
+    def _acquire(self, model: str, priority: int, tokens: int, deadline=None) -> float:
+        """Block until this caller may send; returns seconds spent queued.
+        With a deadline, raises GroqRateLimited as soon as the wait would outlast it."""
+        started = time.monotonic()
+        with self._cond:
+            lane = self._lane(model)
+            self._seq += 1
+            ticket = (priority, self._seq)
+            lane.waiting.append(ticket)
+
+            try:
+                while True:
+                    now = time.monotonic()
+                    remaining = deadline.remaining() if deadline is not None else None
+                    # Only the best-priority, oldest waiter may take capacity
+                    if min(lane.waiting) == ticket:
+                        delay = max(lane.requests.wait_time(1, now), lane.tokens.wait_time(tokens, now))
+                        if delay <= 0:
+                            lane.requests.take(1)
+                            lane.tokens.take(tokens)
+                            break
+                        if remaining is not None and delay >= remaining:
+                            self._counters[(model, "deadline_rejected")] += 1
+                            raise GroqRateLimited(model, delay)
+                        self._cond.wait(timeout=delay)
+                    else:
+                        if remaining is not None and remaining <= 0:
+                            self._counters[(model, "deadline_rejected")] += 1
+                            raise GroqRateLimited(model)
+                        self._cond.wait(timeout=1.0 if remaining is None else min(1.0, remaining))
+            finally:
+                lane.waiting.remove(ticket)
+                self._cond.notify_all()
+
+        return time.monotonic() - started
+
+    def _record(self, model: str, priority: int, waited: float):
+        with self._cond:
+            self._waits[(model, priority)].append(waited)
+            self._counters[(model, "requests")] += 1
+
+    def _count(self, model: str, name: str):
+        with self._cond:
+            self._counters[(model, name)] += 1
+
+    # ----- public API -----
+
+    def call(self, model: str, fn: Callable, /, *args, priority: int = Priority.INTERACTIVE,
+             est_tokens: int = 0, deadline=None, timeout_cap: Optional[float] = None, **kwargs):
+        """Run fn(*args, **kwargs) against `model` under rate limits, retrying 429s.
+        deadline: the turn's Deadline; queueing and backoff never outlast it, and fn
+        gets timeout= (what is left once admitted, at most timeout_cap)"""
+        attempt = 0
+        while True:
+            waited = self._acquire(model, priority, est_tokens, deadline)
+            self._record(model, priority, waited)
+            if deadline is not None:
+                kwargs["timeout"] = deadline.timeout(cap=timeout_cap)
+
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not _is_rate_limit(e):
+                    self._count(model, "errors")
+                    raise
+                self._count(model, "rate_limited")
+                if attempt >= self.max_retries:
+                    raise GroqRateLimited(model, _retry_after(e)) from e
+
+                # Jittered exponential backoff, never shorter than Retry-After
+                backoff = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+                backoff = max(backoff, _retry_after(e) or 0.0)
+                if deadline is not None and backoff >= deadline.remaining():
+                    self._count(model, "deadline_rejected")
+                    raise GroqRateLimited(model, backoff) from e
+                self._count(model, "retries")
+                attempt += 1
+                time.sleep(backoff)
+                continue
+
+            actual = _actual_tokens(result)
+            if actual is not None and est_tokens:
+                with self._cond:
+                    self._lane(model).tokens.adjust(actual - est_tokens)
+                    self._cond.notify_all()
+            return result
+
+    def stats(self) -> dict:
+        """Queueing delay and 429 counters per model/priority"""
+        with self._cond:
+            models = {}
+            for (model, priority), waits in self._waits.items():
+                ordered = sorted(waits)
+                entry = models.setdefault(model, {"queues": {}})
+                entry["queues"][Priority.NAMES.get(priority, str(priority))] = {
+                    "samples": len(ordered),
+                    "wait_p50_ms": round(ordered[len(ordered) // 2] * 1000, 1),
+                    "wait_p95_ms": round(ordered[int(len(ordered) * 0.95) - 1 if len(ordered) > 1 else 0] * 1000, 1),
+                    "wait_max_ms": round(ordered[-1] * 1000, 1),
+                }
+            for (model, name), count in self._counters.items():
+                models.setdefault(model, {"queues": {}})[name] = count
+            for model, lane in self._lanes.items():
+                models.setdefault(model, {"queues": {}})["queued_now"] = len(lane.waiting)
+            return models
+
+
+# Process-wide scheduler shared by main.py and llm.py
+groq_scheduler = GroqScheduler.from_env()
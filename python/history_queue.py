@@ -0,0 +1,316 @@
+"""
+DURABLE WRITE-BEHIND QUEUE FOR COMPLETED HISTORIES
+
+/api/store-medical-history used to hold the request open through per-field
+translation and a Supabase insert. Now it only writes the history to a local
+SQLite file and returns a handle. A background worker then:
+
+1. translates each queued record (the result is saved, so a retry never
+   translates twice)
+2. inserts up to `batch_size` translated records in one Supabase call
+3. on failure retries with exponential backoff; after `max_attempts` the
+   record is marked failed (translation falls back to error-noted text first)
+
+Records survive restarts: anything left mid-flight is picked up again when
+the worker starts. Poll progress with status(handle).
+
+Each record carries an idempotency key (unique here and in Supabase). A
+retried request with the same key gets the original handle back instead of
+a second record, and the insert is an upsert on that key, so a batch that is
+retried after a partial failure never creates duplicate rows either. A
+request whose key belongs to a failed record re-queues that record.
+
+Statuses: queued -> translated -> stored   (or failed)
+
+The file holds patient emails and histories, so it lives in SEHAT_DATA_DIR
+(never a served directory). Once a record is stored its email and history
+are wiped from the queue; only the handle/key/record_id bookkeeping stays
+for status polls and idempotent replays, and that is deleted after
+HISTORY_RETENTION_SECONDS. Failed records (history included) are deleted
+after the same period.
+"""
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, List, Optional
+
+from structured_log import get_logger
+
+log = get_logger("history_queue")
+
+
+DATA_DIR = os.getenv("SEHAT_DATA_DIR", "data")
+HISTORY_QUEUE_PATH = os.getenv("HISTORY_QUEUE_PATH", os.path.join(DATA_DIR, "history_queue.sqlite3"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "20"))
+HISTORY_MAX_ATTEMPTS = int(os.getenv("HISTORY_MAX_ATTEMPTS", "8"))
+HISTORY_RETENTION_SECONDS = float(os.getenv("HISTORY_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+QUEUED = "queued"
+TRANSLATED = "translated"
+STORED = "stored"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_histories (
+    handle          TEXT PRIMARY KEY,
+    idempotency_key TEXT,
+    email           TEXT NOT NULL,
+    urdu_version    TEXT NOT NULL,
+    english_version TEXT,
+    status          TEXT NOT NULL,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    record_id       INTEGER,
+    error           TEXT,
+    next_attempt_at REAL NOT NULL,
+    created_at      REAL NOT NULL,
+    updated_at      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pending_histories_due ON pending_histories (status, next_attempt_at);
+"""
+
+_INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS pending_histories_idempotency ON pending_histories (idempotency_key);
+"""
+
+
+def content_idempotency_key(email: str, medical_data: dict, session_id: Optional[str] = None) -> str:
+    """Key for requests without a client-provided one: session + content hash"""
+    canonical = json.dumps([email, session_id, medical_data], ensure_ascii=False, sort_keys=True)
+    return "auto-" + hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+
+class HistoryWriteQueue:
+    """SQLite-backed queue + one worker thread that translates and batch-inserts"""
+
+    def __init__(
+        self,
+        path: str,
+        translate: Callable[[dict, bool], dict],
+        insert_rows: Callable[[List[dict]], List[dict]],
+        batch_size: int = HISTORY_BATCH_SIZE,
+        max_attempts: int = HISTORY_MAX_ATTEMPTS,
+        max_backoff: float = 300.0,
+        retention_seconds: float = HISTORY_RETENTION_SECONDS,
+    ):
+        """
+        translate(urdu_version, strict) -> english_version; strict=False must not raise
+        insert_rows([{'email', 'urdu_version', 'english_version', 'idempotency_key'}, ...])
+            -> inserted rows (with 'id'), same order; must be idempotent on idempotency_key
+        """
+        self.translate = translate
+        self.insert_rows = insert_rows
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.retention_seconds = retention_seconds
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        # Purged PHI is overwritten, and freed pages are returned to the OS (new files)
+        self._db.execute("PRAGMA secure_delete=ON")
+        self._db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        # Queue files created before idempotency keys existed
+        columns = {row["name"] for row in self._db.execute("PRAGMA table_info(pending_histories)")}
+        if "idempotency_key" not in columns:
+            self._db.execute("ALTER TABLE pending_histories ADD COLUMN idempotency_key TEXT")
+        self._db.executescript(_INDEXES)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ----- producer side -----
+
+    def enqueue(self, email: str, urdu_version: dict, idempotency_key: Optional[str] = None) -> tuple:
+        """Persist a history for background storage.
+        Returns (handle, created); created is False when the key was seen before,
+        unless that record had failed, in which case it is queued again."""
+        handle = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO pending_histories"
+                " (handle, idempotency_key, email, urdu_version, status, next_attempt_at, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (idempotency_key) DO NOTHING",
+                (handle, idempotency_key, email, json.dumps(urdu_version, ensure_ascii=False), QUEUED, now, now, now)
+            )
+            if cursor.rowcount == 0:
+                row = self._db.execute(
+                    "SELECT handle, status FROM pending_histories WHERE idempotency_key = ?", (idempotency_key,)
+                ).fetchone()
+                if row["status"] != FAILED:
+                    return row["handle"], False
+                # Gave up on this key earlier: the retry gets a fresh set of attempts
+                self._db.execute(
+                    "UPDATE pending_histories SET email = ?, urdu_version = ?, english_version = NULL,"
+                    " status = ?, attempts = 0, error = NULL, next_attempt_at = ?, updated_at = ?"
+                    " WHERE handle = ?",
+                    (email, json.dumps(urdu_version, ensure_ascii=False), QUEUED, now, now, row["handle"])
+                )
+                handle = row["handle"]
+        self._wake.set()
+        return handle, True
+
+    def wait(self, handle: str, timeout: float, poll_interval: float = 0.25) -> Optional[dict]:
+        """Block until the record is stored or failed (or timeout); returns its status"""
+        deadline = time.monotonic() + timeout
+        while True:
+            status = self.status(handle)
+            if status is None or status["status"] in (STORED, FAILED) or time.monotonic() >= deadline:
+                return status
+            time.sleep(poll_interval)
+
+    def status(self, handle: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT handle, idempotency_key, status, attempts, record_id, error, created_at, updated_at"
+                " FROM pending_histories WHERE handle = ?", (handle,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM pending_histories GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def purge(self) -> int:
+        """Drop stored and failed records older than retention_seconds; returns how many"""
+        with self._lock:
+            # Queue files written before stored records were scrubbed
+            self._db.execute(
+                "UPDATE pending_histories SET email = '', urdu_version = '', english_version = NULL"
+                " WHERE status = ? AND email != ''", (STORED,)
+            )
+            # Failed records still hold the email and history, so they expire too
+            cursor = self._db.execute(
+                "DELETE FROM pending_histories WHERE status IN (?, ?) AND updated_at < ?",
+                (STORED, FAILED, time.time() - self.retention_seconds)
+            )
+            if cursor.rowcount:
+                # executescript steps the pragma to completion (execute frees one page)
+                self._db.executescript("PRAGMA incremental_vacuum;")
+        return cursor.rowcount
+
+    # ----- worker side -----
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _due(self) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT * FROM pending_histories WHERE status IN (?, ?) AND next_attempt_at <= ?"
+                " ORDER BY created_at LIMIT ?",
+                (QUEUED, TRANSLATED, time.time(), self.batch_size)
+            ).fetchall()
+
+    def _next_due_in(self) -> float:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(next_attempt_at) FROM pending_histories WHERE status IN (?, ?)", (QUEUED, TRANSLATED)
+            ).fetchone()
+        if row[0] is None:
+            return 60.0
+        return max(0.0, row[0] - time.time())
+
+    def _update(self, handle: str, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE pending_histories SET {columns} WHERE handle = ?", (*fields.values(), handle))
+
+    def _retry_later(self, row: sqlite3.Row, error: Exception):
+        attempts = row["attempts"] + 1
+        if attempts >= self.max_attempts:
+            self._update(row["handle"], status=FAILED, attempts=attempts, error=str(error))
+            log.error("history_queue.failed", handle=row["handle"], attempts=attempts, error=str(error))
+            return
+        backoff = min(self.max_backoff, 2 ** attempts) * random.uniform(0.8, 1.2)
+        self._update(row["handle"], attempts=attempts, error=str(error), next_attempt_at=time.time() + backoff)
+        log.warning("history_queue.retry", handle=row["handle"], attempts=attempts, backoff_s=round(backoff, 1),
+                    error=str(error))
+
+    def _translate_row(self, row: sqlite3.Row) -> Optional[dict]:
+        # Last attempt: accept error-noted translations rather than fail the record
+        strict = row["attempts"] + 1 < self.max_attempts
+        try:
+            english = self.translate(json.loads(row["urdu_version"]), strict)
+        except Exception as e:
+            self._retry_later(row, e)
+            return None
+        self._update(row["handle"], status=TRANSLATED, english_version=json.dumps(english, ensure_ascii=False))
+        return english
+
+    def process_once(self) -> int:
+        """Translate and store one batch of due records; returns how many were stored"""
+        rows = self._due()
+        if not rows:
+            return 0
+
+        ready = []
+        for row in rows:
+            if row["english_version"] is not None:
+                ready.append((row, json.loads(row["english_version"])))
+                continue
+            english = self._translate_row(row)
+            if english is not None:
+                ready.append((row, english))
+        if not ready:
+            return 0
+
+        payload = [
+            {"email": row["email"], "urdu_version": json.loads(row["urdu_version"]), "english_version": english,
+             "idempotency_key": row["idempotency_key"] or row["handle"]}
+            for row, english in ready
+        ]
+        try:
+            inserted = self.insert_rows(payload)
+            if len(inserted) != len(payload):
+                raise RuntimeError(f"inserted {len(inserted)} of {len(payload)} rows")
+        except Exception as e:
+            for row, _ in ready:
+                self._retry_later(row, e)
+            return 0
+
+        for (row, _), stored in zip(ready, inserted):
+            # Supabase has the history now: keep only what status() and replays need
+            self._update(row["handle"], status=STORED, record_id=stored.get("id"), error=None,
+                         email="", urdu_version="", english_version=None)
+        log.info("history_queue.stored", batch=len(ready))
+        return len(ready)
+
+    def _run(self):
+        next_purge = 0.0
+        while not self._stop.is_set():
+            # Cleared before looking for work, so an enqueue() during process_once() is not missed
+            self._wake.clear()
+            try:
+                if time.monotonic() >= next_purge:
+                    self.purge()
+                    next_purge = time.monotonic() + 3600
+                stored = self.process_once()
+            except Exception as e:
+                log.error("history_queue.worker_error", error=str(e))
+                stored = 0
+            if stored:
+                continue
+            self._wake.wait(timeout=min(self._next_due_in(), 60.0))
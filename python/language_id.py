@@ -0,0 +1,115 @@
+"""
+SCRIPT AND LANGUAGE IDENTIFICATION
+
+One place for "is this Urdu?" questions, which were answered with per-character
+Python generator scans in three places (detect_language, the doctor history
+view, the history list's ASCII-ratio heuristic). Everything here runs in C:
+
+- has_urdu_script(text)      O(1) for ASCII strings, else a precompiled regex
+                             search that stops at the first hit
+- script_counts(text)        (urdu, latin) histogram: bytes.translate over the
+                             UTF-8 encoding, where U+0600-U+06FF are exactly
+                             the characters with lead bytes 0xD8-0xDB
+- detect_language(text)      urdu_script / roman_urdu / english
+- primary_language(text)     urdu / english by script ratio (history list)
+
+Roman Urdu is recognised by whole-word lookups in a lexicon of common Roman
+Urdu words, weighed against common English words. The old check looked for
+substrings ('ka' in "take", 'hai' in "chair") and misfired.
+
+The same messages are classified again and again (every history view, every
+list request), so detect_language and primary_language cache their results
+per text (LANGUAGE_ID_CACHE_SIZE entries).
+"""
+
+import os
+import re
+import string
+from functools import lru_cache
+from typing import Tuple
+
+
+LANGUAGE_ID_CACHE_SIZE = int(os.getenv("LANGUAGE_ID_CACHE_SIZE", "4096"))
+
+URDU_SCRIPT = "urdu_script"
+ROMAN_URDU = "roman_urdu"
+ENGLISH = "english"
+
+# Arabic block (Urdu is written in it): any character counts as Urdu script
+_URDU_SCRIPT_RE = re.compile("[\u0600-\u06FF]")
+
+# bytes.translate delete tables for the UTF-8 histogram
+_NOT_URDU_LEAD = bytes(b for b in range(256) if not 0xD8 <= b <= 0xDB)
+_NOT_LATIN_LETTER = bytes(b for b in range(256) if not (0x41 <= b <= 0x5A or 0x61 <= b <= 0x7A))
+# Punctuation and digits become word breaks ("hai." -> "hai")
+_WORD_BREAKS = (string.punctuation + string.digits).encode("ascii")
+_TO_SPACES = bytes.maketrans(_WORD_BREAKS, b" " * len(_WORD_BREAKS))
+
+# Frequent Roman Urdu words. Words that are also common English ("me", "to",
+# "is", "he", "sir") are left out; "main" stays, the English count outweighs it.
+ROMAN_URDU_LEXICON = frozenset(b"""
+    hai hain hay ho hon hun hoon tha thi thay thee raha rahi rahe gaya gayi
+    mein main mai mujhe mujh mera meri mere hum humein hamara aap ap apka apki apke
+    tum tumhara wo woh yeh ye unhe inhe ka ki ke ko se par pe tak aur ya lekin
+    nahi nahin nai na kya kab kahan kyun kyon kaise kitna kitni kitne kaun koi kuch
+    bhi sirf bohat bohot bahut zyada ziada kam thoda thora abhi pehle baad phir jab
+    din raat subah shaam hafta hafte mahina mahine saal ghanta ghante
+    ji jee haan han acha accha theek thik shukriya
+    dard bukhar bukhaar khansi zukam nazla sar pet seena sina saans sans
+    ulti matli dast qabz chakkar kamzori thakan jalan sujan soojan khujli khoon
+    dawai dawa dawaiyan goli ilaj sahab
+    lagta lagti lagi hota hoti hotay karta karti karte kar
+""".split())
+
+ENGLISH_LEXICON = frozenset(b"""
+    i a an the is am are was were be been being have has had do does did my me
+    it its and or but in on at to of for with since from this that these those
+    not no yes very also pain feel feeling felt after before when
+    he she they we you your his her their day days week weeks
+""".split())
+
+
+def has_urdu_script(text: str) -> bool:
+    """True if any character is in the Arabic/Urdu block"""
+    # isascii() is a flag check on CPython strings: English text returns at once
+    return not text.isascii() and _URDU_SCRIPT_RE.search(text) is not None
+
+
+def script_counts(text: str) -> Tuple[int, int]:
+    """(Arabic-block characters, ASCII letters)"""
+    raw = text.encode("utf-8")
+    return len(raw.translate(None, _NOT_URDU_LEAD)), len(raw.translate(None, _NOT_LATIN_LETTER))
+
+
+def roman_urdu_score(text: str) -> Tuple[int, int]:
+    """(Roman Urdu word hits, English word hits) over the whole words of text"""
+    words = text.lower().encode("ascii", "ignore").translate(_TO_SPACES).split()
+    return sum(map(ROMAN_URDU_LEXICON.__contains__, words)), sum(map(ENGLISH_LEXICON.__contains__, words))
+
+
+@lru_cache(maxsize=LANGUAGE_ID_CACHE_SIZE)
+def detect_language(text: str) -> str:
+    """Patient's language preference from one message"""
+    if has_urdu_script(text):
+        return URDU_SCRIPT
+    urdu_hits, english_hits = roman_urdu_score(text)
+    if urdu_hits and urdu_hits >= english_hits:
+        return ROMAN_URDU
+    return ENGLISH
+
+
+@lru_cache(maxsize=LANGUAGE_ID_CACHE_SIZE)
+def primary_language(text: str, english_ratio: float = 0.7) -> str:
+    """'english' if more than english_ratio of the letters are Latin, else 'urdu'"""
+    urdu_chars, latin_letters = script_counts(text)
+    total = urdu_chars + latin_letters
+    if total and latin_letters / total > english_ratio:
+        return "english"
+    return "urdu"
+
+
+def cache_info() -> dict:
+    return {
+        "detect_language": detect_language.cache_info()._asdict(),
+        "primary_language": primary_language.cache_info()._asdict(),
+    }
@@ -3,13 +3,25 @@ COMPLETE MEDICAL HISTORY SYSTEM - INTEGRATION GUIDE
 Shows how LangGraph structure + Urdu configuration work together
 """
 
-from typing import TypedDict, List, Annotated
-from langgraph.graph import StateGraph, END
+from typing import TypedDict, List, Annotated, Callable, Optional
 import os
-from langchain_groq import ChatGroq
+import threading
+import time
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from pydantic import BaseModel, Field
 import json
+from groq_scheduler import groq_scheduler, Priority, estimate_tokens
+from single_flight import SingleFlight
+from circuit_breaker import breakers
+from deadline import current_deadline, LLM_LARGE_MIN_SECONDS
+from metrics import LLM_CALL_LATENCY, TOOL_NODE_LATENCY, GRAPH_TURN_LATENCY
+from turn_trace import span, add_event, set_turn_attributes
+from checkpoints import SessionCheckpoints
+import language_id
+from language_id import has_urdu_script
+from structured_log import get_logger
+
+log = get_logger("llm")
 
 # ========== FILE 1: STATE & STRUCTURE (LangGraph) ==========
 # This defines HOW the conversation flows
@@ -22,6 +34,7 @@ class HistoryState(TypedDict):
     section_complete: bool
     all_sections_done: bool
     language_preference: str  # Added for language handling
+    owner_email: Optional[str]  # Supabase user who started the session (auto-persistence)
 
 
 # ========== FILE 2: LANGUAGE & PROMPTS (Urdu Config) ==========
@@ -152,6 +165,34 @@ Relevant system review in Urdu based on complaint
 """
     }
     
+    # Canonical opening question per section (used for speculative TTS).
+    # Clinical sections depend on the complaint, so they have no fixed question.
+    SECTION_QUESTIONS = {
+        "patient_name": "آپ کا پورا نام کیا ہے؟",
+        "patient_age": "آپ کی عمر کتنی ہے؟",
+        "patient_gender": "آپ مرد ہیں یا خاتون؟",
+        "patient_occupation": "آپ کیا کام کرتے ہیں؟",
+        "patient_address": "آپ کہاں رہتے ہیں؟ شہر یا علاقہ بتائیں؟",
+        "patient_contact": "آپ کا فون نمبر کیا ہے؟",
+        "complaint": "آپ کو کیا تکلیف ہے؟ کیا مسئلہ ہے؟",
+    }
+    
+    # Fixed opening turn: the first question never depends on patient data,
+    # so it is served from this template instead of an LLM round trip
+    OPENING_MESSAGE = "السلام علیکم! میں آپ کی میڈیکل ہسٹری لینے میں مدد کروں گا۔ آپ کا پورا نام کیا ہے؟"
+    
+    @classmethod
+    def prompt_version(cls) -> str:
+        """Short hash of the prompt templates - changes whenever a prompt is edited"""
+        if not hasattr(cls, '_prompt_version'):
+            import hashlib
+            source = json.dumps(
+                [cls.URDU_BASE_PROMPT, cls.SECTION_PROMPTS, cls.OPENING_MESSAGE],
+                ensure_ascii=False, sort_keys=True
+            )
+            cls._prompt_version = hashlib.sha256(source.encode('utf-8')).hexdigest()[:12]
+        return cls._prompt_version
+    
     @staticmethod
     def build_prompt(section: str, collected_data: dict, last_user_response: str = None) -> str:
         """Build section-specific Urdu prompt with validation"""
@@ -233,17 +274,8 @@ Data already recorded for {section}: {data_already_recorded}
     
     @staticmethod
     def detect_language(text: str) -> str:
-        """Detect patient's language preference"""
-        # Urdu script check
-        if any('\u0600' <= c <= '\u06FF' for c in text):
-            return 'urdu_script'
-        
-        # Roman Urdu check
-        roman_urdu_words = ['hai', 'mein', 'ka', 'dard', 'bukhar']
-        if any(word in text.lower() for word in roman_urdu_words):
-            return 'roman_urdu'
-        
-        return 'english'
+        """Detect patient's language preference (see language_id)"""
+        return language_id.detect_language(text)
 
 
 # ========== TOOLS: Structure the data ==========
@@ -260,6 +292,35 @@ class MarkSectionComplete(BaseModel):
     reasoning: str
 
 
+class _ReplyTokens:
+    """
+    Agent reply tokens from a stream_mode="messages" stream that are safe to
+    forward. A small-tier reply that fails validation is replaced by the
+    large model's, so small-tier tokens are held until the agent node
+    finishes (reply accepted) or large-tier tokens arrive (reply rejected).
+    """
+    
+    def __init__(self):
+        self._held = []
+    
+    def message(self, chunk) -> List[str]:
+        """Tokens to forward for one messages-mode chunk"""
+        token = UrduMedicalHistorySystem._agent_token(chunk)
+        if not token:
+            return []
+        if chunk[1].get('model_tier') == 'small':
+            self._held.append(token)
+            return []
+        # Escalated within the same node: the small model's reply was discarded
+        self._held.clear()
+        return [token]
+    
+    def node_finished(self) -> List[str]:
+        """The agent node returned, so its small-tier reply (if any) stands"""
+        held, self._held = self._held, []
+        return held
+
+
 # ========== INTEGRATION: Bringing it all together ==========
 
 class UrduMedicalHistorySystem:
@@ -269,6 +330,33 @@ class UrduMedicalHistorySystem:
     - Uses Urdu prompts for communication (File 2)
     """
     
+    MODEL = "openai/gpt-oss-120b"  # Good for multilingual/Urdu
+    MAX_TOKENS = 1024
+    
+    # Latency tiers: short demographic answers go to a fast small model,
+    # clinical sections stay on the large model
+    MODEL_TIERS = {
+        'small': {'model': 'llama-3.1-8b-instant', 'max_tokens': 512},
+        'large': {'model': MODEL, 'max_tokens': MAX_TOKENS},
+    }
+    SECTION_TIERS = {
+        'patient_name': 'small',
+        'patient_age': 'small',
+        'patient_gender': 'small',
+        'patient_occupation': 'small',
+        'patient_address': 'small',
+        'patient_contact': 'small',
+        'complaint': 'large',
+        'hpc_pain': 'large',
+        'systems': 'large',
+        'pmh': 'large',
+        'drugs': 'large',
+        'social': 'large'
+    }
+    MODEL_ROUTING = os.getenv('MODEL_ROUTING', 'true').lower() in ('1', 'true', 'yes')
+    # Upper bound for one chat call, whatever budget the client asked for
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '20'))
+    
     def __init__(self):
         # Initialize LLM using official langchain-groq ChatGroq
         api_key = os.getenv('GROQ_API_KEY')
@@ -276,17 +364,22 @@ class UrduMedicalHistorySystem:
         if not api_key:
             raise ValueError("GROQ_API_KEY environment variable is required")
         
-        # Use official ChatGroq with Urdu-optimized settings
-        self.llm = ChatGroq(
-            model="openai/gpt-oss-120b",  # Good for multilingual/Urdu
-            temperature=0.3,
-            groq_api_key=api_key,
-            max_tokens=1024
-        )
+        self._api_key = api_key
+        
+        # ChatGroq client and compiled graph are created lazily, once,
+        # on first use (or by warm_up()) to keep construction cheap
+        self._tier_clients = {}
+        self._graph = None
+        self._session_graph = None
+        self.checkpoints = None
+        self._init_lock = threading.Lock()
         
-        # Create and bind tools
-        tools = [RecordInfo, MarkSectionComplete]
-        self.llm_with_tools = self.llm.bind_tools(tools)
+        # Per-tier latency / escalation counters for routing_report()
+        self._routing_lock = threading.Lock()
+        self._routing_stats = {}
+        
+        # Concurrent identical translations share one LLM call
+        self.translation_flight = SingleFlight("llm_translation")
         
         # Initialize prompt builder
         self.prompt_builder = UrduPromptBuilder()
@@ -307,8 +400,81 @@ class UrduMedicalHistorySystem:
             'social'
         ]
         
-        # Build the graph
-        self.graph = self._build_graph()
+        # Optional hook: called as on_section_complete(completed_section, next_section)
+        # when MarkSectionComplete fires (e.g. to pre-synthesize the next question)
+        self.on_section_complete = None
+        
+    
+    # ========== LAZY INITIALIZATION ==========
+    
+    def _tier_client(self, tier: str):
+        """(llm, llm_with_tools) for a model tier, created once on first use"""
+        client = self._tier_clients.get(tier)
+        if client is not None:
+            return client
+        with self._init_lock:
+            client = self._tier_clients.get(tier)
+            if client is not None:
+                return client
+            from langchain_groq import ChatGroq
+            
+            config = self.MODEL_TIERS[tier]
+            # Use official ChatGroq with Urdu-optimized settings
+            llm = ChatGroq(
+                model=config['model'],
+                temperature=0.3,
+                groq_api_key=self._api_key,
+                max_tokens=config['max_tokens'],
+                timeout=self.LLM_TIMEOUT
+            )
+            
+            # Create and bind tools
+            tools = [RecordInfo, MarkSectionComplete]
+            # The tier is tagged so streaming can hold back replies that may be escalated
+            client = (llm, llm.bind_tools(tools).with_config(metadata={'model_tier': tier}))
+            self._tier_clients[tier] = client
+            return client
+    
+    def _ensure_llm(self):
+        self._tier_client('large')
+    
+    @property
+    def llm(self):
+        return self._tier_client('large')[0]
+    
+    @property
+    def llm_with_tools(self):
+        return self._tier_client('large')[1]
+    
+    @property
+    def graph(self):
+        if self._graph is None:
+            with self._init_lock:
+                if self._graph is None:
+                    self._graph = self._build_graph()
+        return self._graph
+    
+    @property
+    def session_graph(self):
+        """Same graph, compiled with the persistent checkpointer (needs a thread_id)"""
+        if self._session_graph is None:
+            with self._init_lock:
+                if self._session_graph is None:
+                    # Sessions survive restarts; see checkpoints.py for retention
+                    self.checkpoints = SessionCheckpoints()
+                    self._session_graph = self._build_graph(checkpointer=self.checkpoints.saver)
+        return self._session_graph
+    
+    @property
+    def is_warm(self) -> bool:
+        return 'large' in self._tier_clients and self._graph is not None and self._session_graph is not None
+    
+    def warm_up(self):
+        """Create the LLM client and compile the graphs now instead of on first turn"""
+        for tier in set(self.SECTION_TIERS.values()) | {'large'}:
+            self._tier_client(tier)
+        self.session_graph
+        return self.graph
     
     
     # ========== GRAPH NODES ==========
@@ -322,7 +488,7 @@ class UrduMedicalHistorySystem:
         
         # Skip if section is already complete - let router handle transition
         if state['section_complete']:
-            print(f"⏭️ Section {state['current_section']} already complete, skipping agent")
+            log.debug("agent.skipped", section=state['current_section'], reason="section_complete")
             return state
         
         # Get last user response for validation
@@ -350,8 +516,38 @@ class UrduMedicalHistorySystem:
                 messages.append(AIMessage(content=msg['content']))
         
         # CALL LLM (with Urdu instructions and validation)
-        response = self.llm_with_tools.invoke(messages)
+        # Section decides the model tier; a small-model reply that fails
+        # validation is retried once on the large model
+        est_tokens = estimate_tokens(system_prompt + "".join(m.content for m in messages[1:]))
+        tier = self.SECTION_TIERS.get(state['current_section'], 'large') if self.MODEL_ROUTING else 'large'
+        
+        # Low turn budget: degrade to the cheaper, faster model
+        deadline = current_deadline()
+        budget_low = deadline is not None and deadline.remaining() < LLM_LARGE_MIN_SECONDS
+        if tier == 'large' and budget_low:
+            tier = 'small'
+            deadline.degrade('small_model')
+        
+        response = None
+        try:
+            response = self._invoke_tier(tier, messages, est_tokens, state['current_section'])
+        except Exception:
+            if tier == 'large':
+                raise
+        
+        if tier != 'large' and not self._valid_response(response):
+            if budget_low and response is not None:
+                # No time to escalate - keep the small model's reply
+                deadline.degrade('skipped_escalation')
+                return self._append_reply(state, response)
+            log.info("agent.escalated", section=state['current_section'], from_tier=tier, to_tier='large')
+            add_event("escalation", from_tier=tier, to_tier='large', section=state['current_section'])
+            self._record_routing(tier, escalated=True)
+            response = self._invoke_tier('large', messages, est_tokens, state['current_section'])
         
+        return self._append_reply(state, response)
+    
+    def _append_reply(self, state: HistoryState, response) -> HistoryState:
         # UPDATE STATE
         state['messages'].append({
             'role': 'assistant',
@@ -362,16 +558,102 @@ class UrduMedicalHistorySystem:
         return state
     
     
+    def _invoke_tier(self, tier: str, messages: list, est_tokens: int, section: str = 'unknown'):
+        """Call the tier's model through the Groq scheduler (interactive priority)"""
+        config = self.MODEL_TIERS[tier]
+        llm_with_tools = self._tier_client(tier)[1]
+        
+        # Bound the call (queueing, retries and the request itself) by the turn's budget
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check(f"{tier} model call")
+        
+        started = time.perf_counter()
+        with span("llm.call", model=config['model'], tier=tier, section=section,
+                  est_prompt_tokens=est_tokens) as trace_attrs:
+            try:
+                response = breakers['groq_chat'].call(
+                    groq_scheduler.call,
+                    config['model'], llm_with_tools.invoke, messages,
+                    priority=Priority.INTERACTIVE,
+                    est_tokens=est_tokens + config['max_tokens'],
+                    deadline=deadline,
+                    timeout_cap=self.LLM_TIMEOUT
+                )
+            finally:
+                latency = time.perf_counter() - started
+                self._record_routing(tier, latency=latency)
+                LLM_CALL_LATENCY.labels(section=section, model=config['model']).observe(latency)
+            
+            usage = getattr(response, 'usage_metadata', None) or {}
+            trace_attrs['prompt_tokens'] = usage.get('input_tokens', 0)
+            trace_attrs['completion_tokens'] = usage.get('output_tokens', 0)
+            trace_attrs['tool_calls'] = len(getattr(response, 'tool_calls', None) or [])
+            return response
+    
+    @staticmethod
+    def _valid_response(response) -> bool:
+        """Reject empty replies and malformed tool calls (small-model failure modes)"""
+        if response is None:
+            return False
+        tool_calls = getattr(response, 'tool_calls', None) or []
+        if not tool_calls:
+            return bool((response.content or '').strip())
+        for tool_call in tool_calls:
+            args = tool_call.get('args') or {}
+            if tool_call.get('name') == 'RecordInfo':
+                if not str(args.get('value', '')).strip():
+                    return False
+            elif tool_call.get('name') == 'MarkSectionComplete':
+                if not args.get('section'):
+                    return False
+            else:
+                return False
+        return True
+    
+    def _record_routing(self, tier: str, latency: float = None, escalated: bool = False):
+        with self._routing_lock:
+            stats = self._routing_stats.setdefault(
+                tier, {'calls': 0, 'total_latency': 0.0, 'max_latency': 0.0, 'escalations': 0}
+            )
+            if latency is not None:
+                stats['calls'] += 1
+                stats['total_latency'] += latency
+                stats['max_latency'] = max(stats['max_latency'], latency)
+            if escalated:
+                stats['escalations'] += 1
+    
+    def routing_report(self) -> dict:
+        """Per-tier model, call count, latency and escalation rate"""
+        with self._routing_lock:
+            report = {}
+            for tier, stats in self._routing_stats.items():
+                calls = stats['calls']
+                report[tier] = {
+                    'model': self.MODEL_TIERS[tier]['model'],
+                    'calls': calls,
+                    'avg_latency_ms': round(stats['total_latency'] / calls * 1000, 1) if calls else 0.0,
+                    'max_latency_ms': round(stats['max_latency'] * 1000, 1),
+                    'escalations': stats['escalations'],
+                    'escalation_rate': round(stats['escalations'] / calls, 3) if calls else 0.0,
+                }
+            return report
+    
+    
     def tool_node(self, state: HistoryState) -> HistoryState:
         """
         Execute tools with proper validation and data structuring
         """
+        started = time.perf_counter()
+        section_at_start = state['current_section']
         last_message = state['messages'][-1]
         tool_calls = last_message.get('tool_calls', [])
         
         for tool_call in tool_calls:
             tool_name = tool_call['name']
             tool_input = tool_call['args']
+            add_event("tool_call", tool=tool_name, section=state['current_section'],
+                      field=str(tool_input.get('field', '')))
             
             if tool_name == 'RecordInfo':
                 # Store structured data with section mapping
@@ -408,7 +690,7 @@ class UrduMedicalHistorySystem:
                 current_value = state['collected_data'][section].get(field, '')
                 if not current_value or current_value != value:
                     state['collected_data'][section][field] = value
-                    print(f"✅ Recorded: {section}.{field} = '{value}'")
+                    log.info("tool.recorded", section=section, field=field, value=value)
                     
                     # Add system message to prevent re-recording
                     state['messages'].append({
@@ -417,13 +699,14 @@ class UrduMedicalHistorySystem:
                         'tool_calls': []
                     })
                 else:
-                    print(f"⚠️ Skipped duplicate: {section}.{field} already contains '{current_value}'")
+                    log.info("tool.duplicate_skipped", section=section, field=field, current_value=current_value)
                     # Don't add system message for duplicates to avoid confusion
             
             elif tool_name == 'MarkSectionComplete':
                 if not state['section_complete']:  # Only if not already complete
                     state['section_complete'] = True
-                    print(f"✓ Section complete: {state['current_section']}")
+                    log.info("tool.section_complete", section=state['current_section'])
+                    self._notify_section_complete(state['current_section'])
                     # Add a message to prevent further tool calls
                     state['messages'].append({
                         'role': 'system',
@@ -431,11 +714,24 @@ class UrduMedicalHistorySystem:
                         'tool_calls': []
                     })
                 else:
-                    print(f"⚠️ Section {state['current_section']} already marked complete - ignoring duplicate call")
+                    log.info("tool.duplicate_complete_ignored", section=state['current_section'])
         
+        TOOL_NODE_LATENCY.labels(section=section_at_start).observe(time.perf_counter() - started)
         return state
     
     
+    def _notify_section_complete(self, section: str):
+        """Tell the listener which section comes next (never breaks the turn)"""
+        if not self.on_section_complete:
+            return
+        current_idx = self.sections_order.index(section)
+        if current_idx < len(self.sections_order) - 1:
+            try:
+                self.on_section_complete(section, self.sections_order[current_idx + 1])
+            except Exception as e:
+                log.warning("hook.section_complete_failed", section=section, error=str(e))
+    
+    
     def next_section_node(self, state: HistoryState) -> HistoryState:
         """Move to next section"""
         current_idx = self.sections_order.index(state['current_section'])
@@ -444,10 +740,12 @@ class UrduMedicalHistorySystem:
             old_section = state['current_section']
             state['current_section'] = self.sections_order[current_idx + 1]
             state['section_complete'] = False  # Reset for next section
-            print(f"📋 Moved from '{old_section}' to '{state['current_section']}'")
+            log.info("section.moved", from_section=old_section, to_section=state['current_section'])
+            add_event("section_transition", from_section=old_section, to_section=state['current_section'])
         else:
             state['all_sections_done'] = True
-            print("✅ All sections completed!")
+            add_event("section_transition", from_section=state['current_section'], to_section='done')
+            log.info("section.all_done")
         
         return state
     
@@ -462,7 +760,7 @@ class UrduMedicalHistorySystem:
         
         # If section is complete, move to next section
         if state['section_complete']:
-            print(f"🔄 Moving from {state['current_section']} to next section")
+            log.debug("router.next_section", section=state['current_section'])
             return "next_section"
         
         # If LLM called tools, execute them
@@ -475,14 +773,24 @@ class UrduMedicalHistorySystem:
     
     # ========== BUILD GRAPH ==========
     
-    def _build_graph(self):
+    @staticmethod
+    def _traced_node(name: str, node):
+        """Wrap a node so each run becomes a span in the session's turn trace"""
+        def run(state: HistoryState) -> HistoryState:
+            with span(f"node.{name}", section=state['current_section']):
+                return node(state)
+        return run
+    
+    def _build_graph(self, checkpointer=None):
         """Build the LangGraph workflow"""
+        from langgraph.graph import StateGraph, END
+        
         workflow = StateGraph(HistoryState)
         
         # Add nodes
-        workflow.add_node("agent", self.agent_node)
-        workflow.add_node("tools", self.tool_node)
-        workflow.add_node("next_section", self.next_section_node)
+        workflow.add_node("agent", self._traced_node("agent", self.agent_node))
+        workflow.add_node("tools", self._traced_node("tools", self.tool_node))
+        workflow.add_node("next_section", self._traced_node("next_section", self.next_section_node))
         
         # Entry point
         workflow.set_entry_point("agent")
@@ -503,13 +811,17 @@ class UrduMedicalHistorySystem:
         workflow.add_edge("next_section", "agent")
         
         # Compile without config parameter for compatibility
-        return workflow.compile()
+        return workflow.compile(checkpointer=checkpointer)
     
     
     # ========== PUBLIC API ==========
     
-    def start_interview(self) -> dict:
-        """Initialize a new interview"""
+    def start_interview(self, use_llm: bool = False) -> dict:
+        """Initialize a new interview
+        
+        The opening question is served from UrduPromptBuilder.OPENING_MESSAGE
+        (purely local). Pass use_llm=True to have the LLM generate it instead.
+        """
         state = {
             "messages": [],
             "current_section": "patient_name",  # Start with patient name
@@ -519,19 +831,37 @@ class UrduMedicalHistorySystem:
             "language_preference": "urdu_script"
         }
         
-        # Get first question
-        result = self.graph.invoke(state)
+        if use_llm:
+            # Get first question
+            result = self.graph.invoke(state)
+            return {
+                "ai_message": result['messages'][-1]['content'],
+                "state": result
+            }
+        
+        # Same shape the agent node would have produced
+        state['messages'].append({
+            'role': 'assistant',
+            'content': self.prompt_builder.OPENING_MESSAGE,
+            'tool_calls': []
+        })
         return {
-            "ai_message": result['messages'][-1]['content'],
-            "state": result
+            "ai_message": self.prompt_builder.OPENING_MESSAGE,
+            "state": state,
+            "prompt_version": self.prompt_builder.prompt_version()
         }
     
     
-    def process_user_message(self, state: dict, user_message: str) -> dict:
+    def process_user_message(self, state: dict, user_message: str, thread_id: str = None,
+                             on_token: Callable[[str], None] = None) -> dict:
         """
         Process a user message
         THIS IS YOUR MAIN INTERFACE
+        With a thread_id every graph step is checkpointed under that id.
+        on_token(text) is called with the agent's reply tokens as they arrive
+        (a small-tier reply's only once it passed validation).
         """
+        was_done = state['all_sections_done']
         
         # Detect language on first message
         if len(state['messages']) == 1:
@@ -545,15 +875,138 @@ class UrduMedicalHistorySystem:
         })
         
         # Run through graph
-        result = self.graph.invoke(state)
+        section_at_start = state['current_section']
+        started = time.perf_counter()
+        graph = self.session_graph if thread_id else self.graph
+        config = self._thread_config(thread_id) if thread_id else None
+        if on_token is None:
+            result = graph.invoke(state, config)
+        else:
+            result = state
+            reply = _ReplyTokens()
+            for mode, chunk in graph.stream(state, config, stream_mode=["messages", "values"]):
+                if mode == "values":
+                    result = chunk
+                    tokens = reply.node_finished()
+                else:
+                    tokens = reply.message(chunk)
+                for token in tokens:
+                    on_token(token)
+        GRAPH_TURN_LATENCY.labels(section=section_at_start).observe(time.perf_counter() - started)
+        set_turn_attributes(section_start=section_at_start, section_end=result['current_section'],
+                            is_complete=result['all_sections_done'])
         return {
             "ai_message": result['messages'][-1]['content'],
             "state": result,
             "collected_data": result['collected_data'],
-            "is_complete": result['all_sections_done']
+            "is_complete": result['all_sections_done'],
+            "just_completed": result['all_sections_done'] and not was_done
         }
     
     
+    # ========== CHECKPOINTED SESSIONS ==========
+    # Callers hold only a session id; the state lives in the checkpointer.
+    
+    @staticmethod
+    def _thread_config(session_id: str) -> dict:
+        return {"configurable": {"thread_id": session_id}}
+    
+    @staticmethod
+    def _agent_token(chunk) -> Optional[str]:
+        """Reply text of a stream_mode="messages" chunk from the agent node"""
+        message, metadata = chunk
+        content = getattr(message, 'content', None)
+        if metadata.get('langgraph_node') != 'agent' or not isinstance(content, str):
+            return None
+        return content or None
+    
+    def start_session(self, session_id: str, owner_email: Optional[str] = None) -> dict:
+        """start_interview() whose opening state is checkpointed under session_id.
+        owner_email is kept in the checkpoint so it survives restarts."""
+        result = self.start_interview()
+        if owner_email:
+            result['state']['owner_email'] = owner_email
+        self.session_graph.update_state(self._thread_config(session_id), result['state'], as_node='agent')
+        self.checkpoints.touch(session_id)
+        return result
+    
+    def get_session_state(self, session_id: str):
+        """Latest checkpointed state of a session, or None if unknown"""
+        snapshot = self.session_graph.get_state(self._thread_config(session_id))
+        return dict(snapshot.values) if snapshot.values else None
+    
+    def process_session_message(self, session_id: str, user_message: str,
+                                on_token: Callable[[str], None] = None) -> dict:
+        """Resume a session from its last checkpoint and process one message"""
+        state = self.get_session_state(session_id)
+        if state is None:
+            raise KeyError(f"Unknown session: {session_id}")
+        result = self.process_user_message(state, user_message, thread_id=session_id, on_token=on_token)
+        self.checkpoints.touch(session_id, finished=result['is_complete'])
+        return result
+    
+    async def process_session_message_streaming(self, session_id: str, user_message: str):
+        """
+        Streaming version of process_session_message: yields the agent's reply
+        tokens as {'content': token} while the model generates them, and the
+        agent node's state updates as they complete. Tokens of a small-tier
+        reply arrive only once it passed validation, never before an
+        escalation replaces it. The graph runs in a worker thread since the
+        SQLite checkpointer is synchronous.
+        """
+        import asyncio
+        
+        state = await asyncio.to_thread(self.get_session_state, session_id)
+        if state is None:
+            raise KeyError(f"Unknown session: {session_id}")
+        state['messages'].append({
+            'role': 'user',
+            'content': user_message
+        })
+        
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+        done = object()
+        section_at_start = state['current_section']
+        
+        def run():
+            started = time.perf_counter()
+            finished = state['all_sections_done']
+            reply = _ReplyTokens()
+            try:
+                for mode, chunk in self.session_graph.stream(
+                    state, self._thread_config(session_id), stream_mode=["messages", "updates"]
+                ):
+                    if mode == "messages":
+                        for token in reply.message(chunk):
+                            loop.call_soon_threadsafe(chunks.put_nowait, {'content': token})
+                        continue
+                    for update in chunk.values():
+                        if isinstance(update, dict) and 'all_sections_done' in update:
+                            finished = update['all_sections_done']
+                    if 'agent' not in chunk:
+                        continue
+                    for token in reply.node_finished():
+                        loop.call_soon_threadsafe(chunks.put_nowait, {'content': token})
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk['agent'])
+                self.checkpoints.touch(session_id, finished=finished)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finally:
+                GRAPH_TURN_LATENCY.labels(section=section_at_start).observe(time.perf_counter() - started)
+                loop.call_soon_threadsafe(chunks.put_nowait, done)
+        
+        worker = asyncio.ensure_future(asyncio.to_thread(run))
+        while True:
+            chunk = await chunks.get()
+            if chunk is done:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+        await worker
+    
+    
     async def process_user_message_streaming(self, state: dict, user_message: str):
         """
         Streaming version for better UX
@@ -575,7 +1028,11 @@ class UrduMedicalHistorySystem:
 
         This is used to present a doctor-facing view where all content
         must be in English. The translator preserves medical terms.
+        Concurrent requests for the same text share one LLM call.
         """
+        return self.translation_flight.do(text, self._translate_to_english, text)
+
+    def _translate_to_english(self, text: str) -> str:
         # Build a small translation system prompt
         system_prompt = (
             "You are a helpful translator. Translate the user's text to English. "
@@ -586,7 +1043,12 @@ class UrduMedicalHistorySystem:
         messages = [SystemMessage(content=system_prompt), HumanMessage(content=text)]
 
         # Use the same llm binding (tools are available but not required)
-        response = self.llm_with_tools.invoke(messages)
+        response = breakers['groq_chat'].call(
+            groq_scheduler.call,
+            self.MODEL, self.llm_with_tools.invoke, messages,
+            priority=Priority.BACKGROUND,
+            est_tokens=estimate_tokens(system_prompt + text, self.MAX_TOKENS)
+        )
 
         return getattr(response, 'content', str(response))
 
@@ -605,7 +1067,7 @@ class UrduMedicalHistorySystem:
 
             if view == 'doctor':
                 # If the message contains Arabic/Urdu script, translate it
-                if any('\u0600' <= c <= '\u06FF' for c in content):
+                if has_urdu_script(content):
                     try:
                         content_en = self.translate_to_english(content)
                         content = content_en
@@ -671,105 +1133,122 @@ def main():
     print(json.dumps(state['collected_data'], ensure_ascii=False, indent=2))
 
 
-# ========== FASTAPI INTEGRATION (For Production) ==========
+# ========== SHARED INSTANCE ==========
 
-from fastapi import FastAPI, WebSocket
-from fastapi.responses import JSONResponse
+_medical_system = None
+_medical_system_lock = threading.Lock()
 
-app = FastAPI()
 
-# Global system instance
-medical_system = UrduMedicalHistorySystem()
+def get_medical_system() -> UrduMedicalHistorySystem:
+    """Process-wide UrduMedicalHistorySystem, created once on first call"""
+    global _medical_system
+    if _medical_system is None:
+        with _medical_system_lock:
+            if _medical_system is None:
+                _medical_system = UrduMedicalHistorySystem()
+    return _medical_system
 
-# Store active sessions
-sessions = {}
 
+# ========== FASTAPI INTEGRATION (Standalone demo) ==========
+# The production API lives in main.py. This factory builds a minimal app
+# around the shared system; nothing here runs at import time.
 
-@app.post("/api/start-interview")
-async def start_interview():
-    """Start a new interview"""
-    result = medical_system.start_interview()
-    
-    # Generate session ID
+def create_app():
+    """Build a standalone FastAPI app exposing the interview endpoints"""
+    from fastapi import FastAPI, WebSocket
+    from fastapi.responses import JSONResponse
     import uuid
-    session_id = str(uuid.uuid4())
-    
-    # Store session
-    sessions[session_id] = result['state']
-    
-    return {
-        "session_id": session_id,
-        "message": result['ai_message']
-    }
 
+    app = FastAPI()
 
-@app.post("/api/send-message")
-async def send_message(session_id: str, message: str):
-    """Send a user message"""
-    
-    if session_id not in sessions:
-        return JSONResponse(
-            status_code=404,
-            content={"error": "Session not found"}
-        )
-    
-    # Get state
-    state = sessions[session_id]
-    
-    # Process message
-    result = medical_system.process_user_message(state, message)
-    
-    # Update session
-    sessions[session_id] = result['state']
-    
-    return {
-        "message": result['ai_message'],
-        "collected_data": result['collected_data'],
-        "is_complete": result['is_complete']
-    }
+    # Store active sessions
+    sessions = {}
 
-
-@app.websocket("/ws/interview/{session_id}")
-async def websocket_interview(websocket: WebSocket, session_id: str):
-    """WebSocket for streaming responses"""
-    await websocket.accept()
-    
-    # Initialize or get session
-    if session_id not in sessions:
-        result = medical_system.start_interview()
+    @app.post("/api/start-interview")
+    async def start_interview():
+        """Start a new interview"""
+        result = get_medical_system().start_interview()
+        
+        # Generate session ID
+        session_id = str(uuid.uuid4())
+        
+        # Store session
         sessions[session_id] = result['state']
-        await websocket.send_json({
-            "type": "message",
-            "content": result['ai_message']
-        })
-    
-    state = sessions[session_id]
-    
-    while True:
-        # Receive user message
-        data = await websocket.receive_json()
-        user_message = data['message']
-        
-        # Stream response
-        collected_text = ""
-        async for chunk in medical_system.process_user_message_streaming(state, user_message):
-            if 'content' in chunk:
-                token = chunk['content']
-                collected_text += token
-                await websocket.send_json({
-                    "type": "token",
-                    "content": token
-                })
-        
-        # Send completion
-        await websocket.send_json({
-            "type": "complete",
-            "collected_data": state['collected_data'],
-            "is_complete": state['all_sections_done']
-        })
+        
+        return {
+            "session_id": session_id,
+            "message": result['ai_message']
+        }
+
+    @app.post("/api/send-message")
+    async def send_message(session_id: str, message: str):
+        """Send a user message"""
+        
+        if session_id not in sessions:
+            return JSONResponse(
+                status_code=404,
+                content={"error": "Session not found"}
+            )
+        
+        # Get state
+        state = sessions[session_id]
+        
+        # Process message
+        result = get_medical_system().process_user_message(state, message)
         
         # Update session
-        sessions[session_id] = state
+        sessions[session_id] = result['state']
+        
+        return {
+            "message": result['ai_message'],
+            "collected_data": result['collected_data'],
+            "is_complete": result['is_complete']
+        }
+
+    @app.websocket("/ws/interview/{session_id}")
+    async def websocket_interview(websocket: WebSocket, session_id: str):
+        """WebSocket for streaming responses"""
+        await websocket.accept()
+        medical_system = get_medical_system()
+        
+        # Initialize or get session
+        if session_id not in sessions:
+            result = medical_system.start_interview()
+            sessions[session_id] = result['state']
+            await websocket.send_json({
+                "type": "message",
+                "content": result['ai_message']
+            })
+        
+        state = sessions[session_id]
+        
+        while True:
+            # Receive user message
+            data = await websocket.receive_json()
+            user_message = data['message']
+            
+            # Stream response
+            collected_text = ""
+            async for chunk in medical_system.process_user_message_streaming(state, user_message):
+                if 'content' in chunk:
+                    token = chunk['content']
+                    collected_text += token
+                    await websocket.send_json({
+                        "type": "token",
+                        "content": token
+                    })
+            
+            # Send completion
+            await websocket.send_json({
+                "type": "complete",
+                "collected_data": state['collected_data'],
+                "is_complete": state['all_sections_done']
+            })
+            
+            # Update session
+            sessions[session_id] = state
+
+    return app
 
 
 # ========== SUMMARY: How Files Work Together ==========
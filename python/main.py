@@ -1,11 +1,8 @@
-
-
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form, WebSocket
+from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException, Form, WebSocket, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, FileResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
-from groq import Groq
-from typing import Literal
+from typing import Literal, Optional
 import os
 import tempfile
 from pathlib import Path
@@ -13,69 +10,241 @@ from dotenv import load_dotenv
 import base64
 import requests
 import json
-from supabase import create_client, Client
+import time
+from tts_speculation import SpeculativeTTS
+from single_flight import SingleFlight
+from metrics import (
+    STT_LATENCY, TTS_LATENCY, SUPABASE_LATENCY, HTTP_LATENCY,
+    SESSIONS_STARTED, SESSIONS_ACTIVE, record_cache, render as render_metrics
+)
+from circuit_breaker import breakers, breaker_states, CircuitOpenError
+from deadline import (
+    Deadline, DeadlineExceeded, current_deadline, call_with_deadline, TTS_MIN_SECONDS, TURN_DEADLINE_SECONDS
+)
+from turn_trace import trace_turn, trace_store
+from frame_sender import FrameSender, SlowConsumer, WS_FLUSH_MS, WS_FLUSH_CHARS
+from streaming_stt import (
+    UtteranceSegmenter, StreamingTranscription, PCMStreamDecoder, SPEECH_START, SEGMENT, END
+)
+from history_queue import HistoryWriteQueue, HISTORY_QUEUE_PATH, content_idempotency_key
+from structured_log import get_logger
+from language_id import primary_language as detect_primary_language
+from groq_scheduler import groq_scheduler, Priority, GroqRateLimited, estimate_tokens
+from audio_preprocess import (
+    preprocess_audio, shift_segments, decode_to_pcm, encode_pcm,
+    pcm_duration, pcm_slice, split_at_silences, stitch_transcriptions
+)
+import asyncio
+import itertools
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+log = get_logger("api")
+
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize FastAPI app
-app = FastAPI(
-    title="Urdu STT API",
-    description="Urdu Speech-to-Text using Groq Whisper",
-    version="1.0.0"
-)
-
-# Add CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# All routes are registered on this router; create_app() mounts it
+router = APIRouter()
 
-# Initialize Groq client
+# Groq configuration (client is created lazily by get_groq_client)
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 if not GROQ_API_KEY:
     raise ValueError("GROQ_API_KEY environment variable not set")
 
-client = Groq(api_key=GROQ_API_KEY)
-
 # Initialize UpliftAI configuration
 UPLIFTAI_API_KEY = os.getenv("UPLIFTAI_API_KEY")
-UPLIFTAI_BASE_URL = "https://api.upliftai.org/v1"
+UPLIFTAI_BASE_URL = os.getenv("UPLIFTAI_BASE_URL", "https://api.upliftai.org/v1")
+
+# Upper bounds for single upstream calls (a turn's Deadline may cut them shorter)
+UPLIFTAI_TIMEOUT = float(os.getenv("UPLIFTAI_TIMEOUT", "15"))
+WHISPER_TIMEOUT = float(os.getenv("WHISPER_TIMEOUT", "30"))
 
 # Initialize Supabase configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
 
-if SUPABASE_URL and SUPABASE_KEY:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    print("Supabase client initialized successfully")
-else:
-    supabase = None
+if not (SUPABASE_URL and SUPABASE_KEY):
     print("Supabase configuration not found - medical history storage disabled")
 
+
+# ========== LAZY, ONCE-ONLY RESOURCES ==========
+# Nothing expensive happens at import time: clients and the compiled graph
+# are created on first use (or by the background warm-up on startup).
+
+_init_lock = threading.Lock()
+_groq_client = None
+_supabase_client = None
+_llm_system = None
+
+
+def get_groq_client():
+    """Shared Groq client (Whisper STT + translation)"""
+    global _groq_client
+    if _groq_client is None:
+        with _init_lock:
+            if _groq_client is None:
+                from groq import Groq
+                _groq_client = Groq(api_key=GROQ_API_KEY)
+    return _groq_client
+
+
+def get_supabase():
+    """Shared Supabase client, or None when storage is not configured"""
+    global _supabase_client
+    if _supabase_client is None and SUPABASE_URL and SUPABASE_KEY:
+        with _init_lock:
+            if _supabase_client is None:
+                from supabase import create_client
+                _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+                print("Supabase client initialized successfully")
+    return _supabase_client
+
+
+def get_llm_system():
+    """The single UrduMedicalHistorySystem for this process"""
+    global _llm_system
+    if _llm_system is None:
+        with _init_lock:
+            if _llm_system is None:
+                system = get_medical_system()
+                system.on_section_complete = speculate_next_question
+                _llm_system = system
+    return _llm_system
+
+
 print(f"UpliftAI API Key: {'Set' if UPLIFTAI_API_KEY else 'Not Set'}")
 # Supported audio formats
 SUPPORTED_FORMATS = {'flac', 'mp3', 'mp4', 'mpeg', 'mpga', 'm4a', 'ogg','opus', 'wav', 'webm'}
 
+# Local audio pre-processing before Whisper (needs ffmpeg on PATH)
+AUDIO_PREPROCESS = os.getenv("AUDIO_PREPROCESS", "false").lower() in ("1", "true", "yes")
 
-@app.get("/")
+# Long-audio mode: split at silences and transcribe chunks concurrently
+LONG_AUDIO_SECONDS = float(os.getenv("LONG_AUDIO_SECONDS", "45"))
+LONG_AUDIO_CHUNK_SECONDS = float(os.getenv("LONG_AUDIO_CHUNK_SECONDS", "30"))
+TRANSCRIBE_CONCURRENCY = int(os.getenv("TRANSCRIBE_CONCURRENCY", "4"))
+
+
+@router.get("/")
 async def root():
     """Health check"""
     return {"status": "running", "message": "Urdu STT API"}
 
 
-@app.post("/transcribe")
+def request_deadline(deadline_ms: Optional[int] = None) -> Deadline:
+    """Deadline for one request. A client may ask for a tighter budget, never a
+    looser one; missing or non-positive values get TURN_DEADLINE_SECONDS"""
+    if not deadline_ms or deadline_ms <= 0:
+        return Deadline()
+    return Deadline(min(deadline_ms / 1000, TURN_DEADLINE_SECONDS))
+
+
+def unavailable_error(e: CircuitOpenError) -> HTTPException:
+    """Fast-fail response while an upstream's circuit is open"""
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, int(e.retry_after)))}
+    )
+
+
+def rate_limited_error(e: GroqRateLimited) -> HTTPException:
+    """Surface an exhausted Groq rate limit as 429 (not a generic 500)"""
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(int(e.retry_after or 5))}
+    )
+
+
+def whisper_transcribe(audio_bytes: bytes, filename: str, model: str, prompt: Optional[str] = None):
+    """Send audio bytes to Groq Whisper (Urdu) and return the verbose_json transcription.
+    prompt: preceding transcript, for continuity when transcribing an answer in pieces"""
+    # Groq SDK reads from a file handle, so go through a temp file
+    with tempfile.NamedTemporaryFile(delete=False, suffix=Path(filename).suffix) as temp_file:
+        temp_file.write(audio_bytes)
+        temp_file_path = temp_file.name
+
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.check("transcription")
+
+    extra = {"prompt": prompt} if prompt else {}
+
+    try:
+        # With a deadline the scheduler passes the timeout left after queueing
+        def _create(timeout: float = WHISPER_TIMEOUT):
+            with open(temp_file_path, "rb") as audio_file:
+                return get_groq_client().audio.transcriptions.create(
+                    file=audio_file,
+                    model=model,
+                    language="ur",  # Urdu language code
+                    response_format="verbose_json",
+                    temperature=0.0,
+                    timeout=timeout,
+                    **extra
+                )
+
+        with STT_LATENCY.labels(model=model).time():
+            return breakers['groq_stt'].call(
+                groq_scheduler.call, model, _create, priority=Priority.INTERACTIVE,
+                deadline=deadline, timeout_cap=WHISPER_TIMEOUT
+            )
+    finally:
+        try:
+            os.unlink(temp_file_path)
+        except OSError:
+            pass
+
+
+async def transcribe_long_audio(pcm: bytes, model: str, offset: float = 0.0) -> dict:
+    """
+    Split 16 kHz mono PCM at silence boundaries and transcribe the chunks
+    concurrently (capped by TRANSCRIBE_CONCURRENCY), then stitch the segments
+    back together. offset is added to every timestamp (e.g. trimmed lead-in).
+    """
+    chunks = split_at_silences(pcm, max_chunk_seconds=LONG_AUDIO_CHUNK_SECONDS)
+    semaphore = asyncio.Semaphore(TRANSCRIBE_CONCURRENCY)
+
+    async def run_chunk(index: int, start: float, end: float):
+        async with semaphore:
+            audio, ext = await asyncio.to_thread(encode_pcm, pcm_slice(pcm, start, end))
+            transcription = await asyncio.to_thread(
+                whisper_transcribe, audio, f"chunk_{index}.{ext}", model
+            )
+            return offset + start, transcription
+
+    results = await asyncio.gather(
+        *(run_chunk(i, start, end) for i, (start, end) in enumerate(chunks))
+    )
+
+    stitched = stitch_transcriptions(list(results))
+    stitched["chunks"] = len(chunks)
+    return stitched
+
+
+@router.post("/transcribe")
 async def transcribe_urdu_audio(
     file: UploadFile = File(..., description="Audio file in Urdu"),
     model: Literal["whisper-large-v3-turbo", "whisper-large-v3"] = Form(
         default="whisper-large-v3-turbo",
         description="Whisper model (turbo is faster)"
+    ),
+    preprocess: Optional[bool] = Form(
+        default=None,
+        description="Downmix/resample/trim silence before upload (defaults to AUDIO_PREPROCESS env)"
+    ),
+    long_audio: Optional[bool] = Form(
+        default=None,
+        description="Chunk at silences and transcribe in parallel (auto when preprocessed audio is long)"
     )
 ):
     
-    print(f"Transcribing file: {file.filename}, size: {file.size}, model: {model}")
+    log.info("transcribe.request", filename=file.filename, size=file.size, model=model)
     # Validate file format
     file_ext = Path(file.filename).suffix.lower().lstrip('.')
     if file_ext not in SUPPORTED_FORMATS:
@@ -85,45 +254,132 @@ async def transcribe_urdu_audio(
         )
     
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file.filename).suffix) as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-        
+        content = await file.read()
+        upload_bytes, upload_name = content, file.filename
+
+        # Optional local pre-processing (mono 16 kHz, silence trimmed, compact codec)
+        preprocessing = None
+        prepared = None
+        if preprocess if preprocess is not None else AUDIO_PREPROCESS:
+            try:
+                prepared = await asyncio.to_thread(preprocess_audio, content, file.filename)
+                upload_bytes, upload_name = prepared.audio, prepared.filename
+                preprocessing = prepared.report()
+            except Exception as e:
+                # Fall back to the original upload
+                preprocessing = {"skipped": str(e)}
+
+        # Long recordings: chunked parallel transcription
+        pcm = None
+        long_audio_report = None
+        if long_audio or (long_audio is None and prepared and prepared.processed_duration > LONG_AUDIO_SECONDS):
+            if prepared:
+                pcm, offset = prepared.pcm, prepared.leading_trim
+            else:
+                try:
+                    pcm, offset = await asyncio.to_thread(decode_to_pcm, content), 0.0
+                except Exception as e:
+                    # No ffmpeg / undecodable: fall back to one Whisper call
+                    long_audio_report = {"skipped": str(e)}
+
+        if pcm is not None:
+            upstream_started = time.perf_counter()
+            stitched = await transcribe_long_audio(pcm, model, offset=offset)
+            upstream_ms = (time.perf_counter() - upstream_started) * 1000
+
+            if preprocessing is not None:
+                preprocessing["upstream_ms"] = round(upstream_ms, 1)
+
+            return {
+                "text": stitched["text"],
+                "language": stitched["language"],
+                "duration": prepared.original_duration if prepared else pcm_duration(pcm),
+                "segments": stitched["segments"],
+                "preprocessing": preprocessing,
+                "long_audio": {"chunks": stitched["chunks"], "upstream_ms": round(upstream_ms, 1)}
+            }
+
         # Transcribe with Groq Whisper (Urdu language)
-        with open(temp_file_path, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
-                file=audio_file,
-                model=model,
-                language="ur",  # Urdu language code
-                response_format="verbose_json",
-                temperature=0.0
-            )
-        
-        # Clean up temp file
-        os.unlink(temp_file_path)
+        upstream_started = time.perf_counter()
+        transcription = await asyncio.to_thread(whisper_transcribe, upload_bytes, upload_name, model)
+        upstream_ms = (time.perf_counter() - upstream_started) * 1000
+
+        segments = transcription.segments
+        if prepared and prepared.leading_trim:
+            # Report timestamps relative to the original recording
+            segments = shift_segments(segments, prepared.leading_trim)
+
+        if preprocessing is not None:
+            preprocessing["upstream_ms"] = round(upstream_ms, 1)
         
-        # Return response
+        # Return response (duration of the original recording, as in long-audio mode)
         return {
             "text": transcription.text,
             "language": transcription.language,
-            "duration": transcription.duration,
-            "segments": transcription.segments
+            "duration": prepared.original_duration if prepared else transcription.duration,
+            "segments": segments,
+            "preprocessing": preprocessing,
+            "long_audio": long_audio_report
         }
     
+    except GroqRateLimited as e:
+        raise rate_limited_error(e)
+    except CircuitOpenError as e:
+        raise unavailable_error(e)
     except Exception as e:
-        # Clean up on error
-        if 'temp_file_path' in locals():
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
-        
         raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
 
 
-@app.post("/text-to-speech")
+# Concurrent identical upstream requests share one call
+tts_flight = SingleFlight("tts")
+translation_flight = SingleFlight("translation")
+
+
+def synthesize_speech(text: str, voice_id: str = "v_meklc281", output_format: str = "MP3_22050_32") -> bytes:
+    """Call UpliftAI TTS and return the raw audio bytes (identical in-flight requests are coalesced)"""
+    return tts_flight.do(
+        (text, voice_id, output_format),
+        breakers['upliftai_tts'].call, _upliftai_tts, text, voice_id, output_format
+    )
+
+
+def _upliftai_tts(text: str, voice_id: str, output_format: str) -> bytes:
+    url = f"{UPLIFTAI_BASE_URL}/synthesis/text-to-speech"
+    headers = {
+        "Authorization": f"Bearer {UPLIFTAI_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "text": text,
+        "voiceId": voice_id,
+        "outputFormat": output_format
+    }
+
+    deadline = current_deadline()
+    timeout = deadline.timeout(cap=UPLIFTAI_TIMEOUT) if deadline else UPLIFTAI_TIMEOUT
+
+    with TTS_LATENCY.labels(voice=voice_id).time():
+        response = requests.post(url, json=payload, headers=headers, timeout=timeout)
+    content_type = response.headers.get("Content-Type", "")
+
+    if "application/json" in content_type:
+        result = response.json()
+        if "audioContent" in result:
+            # Base64 encoded audio
+            return base64.b64decode(result["audioContent"])
+        if "url" in result:
+            # Download from URL
+            return requests.get(result["url"], timeout=timeout).content
+        raise Exception("Unexpected JSON response format from UpliftAI")
+
+    if "audio" in content_type:
+        # Raw audio returned directly
+        return response.content
+
+    raise Exception(f"Unexpected response from UpliftAI: {response.text}")
+
+
+@router.post("/text-to-speech")
 async def text_to_speech(
     text: str = Form(..., description="Text to convert to speech"),
     voice_id: str = Form(
@@ -155,70 +411,7 @@ async def text_to_speech(
         )
     
     try:
-        # Prepare UpliftAI TTS request
-        url = f"{UPLIFTAI_BASE_URL}/synthesis/text-to-speech"
-        headers = {
-            "Authorization": f"Bearer {UPLIFTAI_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "text": text,
-            "voiceId": voice_id,
-            "outputFormat": output_format
-        }
-        
-        # Call UpliftAI TTS API
-        response = requests.post(url, json=payload, headers=headers)
-        
-        # if response.status_code != 200:
-        #     raise HTTPException(
-        #         status_code=response.status_code,
-        #         detail=f"UpliftAI TTS failed: {response.text}"
-        #     )
-        
-        # # Get audio data
-        # result = response.json()
-        
-        # # Audio is typically base64 encoded or URL
-        # if "audioContent" in result:
-        #     # Base64 encoded audio
-        #     audio_data = base64.b64decode(result["audioContent"])
-        # elif "url" in result:
-        #     # Download from URL
-        #     audio_response = requests.get(result["url"])
-        #     audio_data = audio_response.content
-        # else:
-        #     raise HTTPException(
-        #         status_code=500,
-        #         detail="Unexpected response format from UpliftAI"
-        #     )
-        content_type = response.headers.get("Content-Type", "")
-
-        if "application/json" in content_type:
-            result = response.json()
-
-            if "audioContent" in result:
-                # Base64 encoded audio
-                audio_data = base64.b64decode(result["audioContent"])
-            elif "url" in result:
-                # Download from URL
-                audio_response = requests.get(result["url"])
-                audio_data = audio_response.content
-            else:
-                raise HTTPException(
-                    status_code=500,
-                    detail="Unexpected JSON response format from UpliftAI"
-                )
-
-        elif "audio" in content_type:
-            # Raw audio returned directly
-            audio_data = response.content
-
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Unexpected response from UpliftAI: {response.text}"
-            )
+        audio_data = await asyncio.to_thread(synthesize_speech, text, voice_id=voice_id, output_format=output_format)
         
         # Save file mode (for testing)
         if save_file:
@@ -246,6 +439,8 @@ async def text_to_speech(
                 }
             )
     
+    except CircuitOpenError as e:
+        raise unavailable_error(e)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -254,27 +449,218 @@ async def text_to_speech(
 
 
 # ========== LLM SESSION ENDPOINTS ==========
-try:
-    from llm import UrduMedicalHistorySystem
-    from llm import medical_system as _unused  # if llm creates app instance, ignore
-except Exception:
-    # Import lazily if running as script
-    from importlib import import_module
-    llm_mod = import_module('llm')
-    UrduMedicalHistorySystem = getattr(llm_mod, 'UrduMedicalHistorySystem')
-
-# Single shared LLM system instance
-llm_system = UrduMedicalHistorySystem()
-llm_sessions = {}
-
-
-@app.post('/api/start-interview')
-async def api_start_interview():
+from llm import UrduPromptBuilder, get_medical_system
+
+# Latest state per live session. The source of truth is the graph
+# checkpointer; this is a read cache that is refilled from it on a miss, so
+# sessions survive a restart. Sessions idle for SESSION_IDLE_SECONDS, finished
+# interviews and the least recently used beyond SESSION_CACHE_MAX are dropped,
+# so its size is the number of sessions actually in progress.
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "1800"))
+SESSION_CACHE_MAX = int(os.getenv("SESSION_CACHE_MAX", "2048"))
+
+# session_id -> (last_used, state); least recently used first
+llm_sessions = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def cache_session(session_id: str, state: dict):
+    """Remember a session's latest state (finished interviews are not kept)"""
+    with _sessions_lock:
+        if state.get('all_sections_done'):
+            llm_sessions.pop(session_id, None)
+        else:
+            llm_sessions[session_id] = (time.monotonic(), state)
+            llm_sessions.move_to_end(session_id)
+        _evict_idle_sessions()
+
+
+def _evict_idle_sessions():
+    now = time.monotonic()
+    while llm_sessions and (len(llm_sessions) > SESSION_CACHE_MAX
+                            or now - next(iter(llm_sessions.values()))[0] > SESSION_IDLE_SECONDS):
+        llm_sessions.popitem(last=False)
+
+
+def active_session_count() -> int:
+    with _sessions_lock:
+        _evict_idle_sessions()
+        return len(llm_sessions)
+
+
+SESSIONS_ACTIVE.set_function(active_session_count)
+
+
+def get_session(session_id: str) -> Optional[dict]:
+    """Cached session state, else the last checkpoint; None for unknown sessions"""
+    with _sessions_lock:
+        entry = llm_sessions.get(session_id)
+    if entry is not None:
+        cache_session(session_id, entry[1])
+        return entry[1]
+    state = get_llm_system().get_session_state(session_id)
+    if state is not None:
+        cache_session(session_id, state)
+    return state
+
+# Speculative TTS: pre-synthesize the next section's question while the LLM runs
+tts_speculator = SpeculativeTTS(synthesize_speech)
+
+
+# Set for turns whose reply will be spoken; text-only turns don't speculate
+_voice_turn = ContextVar("voice_turn", default=False)
+
+
+def speculate_next_question(completed_section: str, next_section: str):
+    question = UrduPromptBuilder.SECTION_QUESTIONS.get(next_section)
+    if question and UPLIFTAI_API_KEY and _voice_turn.get():
+        tts_speculator.speculate(question)
+
+
+
+def synthesize_reply(text: str, voice_id: str = "v_meklc281") -> bytes:
+    """TTS for an LLM reply, reusing speculated audio when the reply matches"""
+    deadline = current_deadline()
+    wait_seconds = deadline.timeout(cap=tts_speculator.wait_seconds) if deadline else None
+    audio_data = tts_speculator.lookup(text, voice_id, wait_seconds=wait_seconds)
+    record_cache("tts_speculation", "hit" if audio_data is not None else "miss")
+    if audio_data is None:
+        audio_data = synthesize_speech(text, voice_id=voice_id)
+    return audio_data
+
+
+# Opening-turn audio cache: the first question is a fixed template, so its
+# audio only needs to be synthesized once per prompt version (kept on disk
+# so restarts don't pay for it again)
+OPENING_AUDIO_DIR = Path(os.getenv("OPENING_AUDIO_DIR", "audio_cache"))
+_opening_audio = {}
+
+
+def get_opening_audio(voice_id: str = "v_meklc281") -> bytes:
+    """Audio for UrduPromptBuilder.OPENING_MESSAGE (memory -> disk -> UpliftAI)"""
+    key = (UrduPromptBuilder.prompt_version(), voice_id)
+    if key in _opening_audio:
+        record_cache("opening_audio", "hit")
+        return _opening_audio[key]
+
+    cache_file = OPENING_AUDIO_DIR / f"opening_{key[0]}_{voice_id}.mp3"
+    if cache_file.exists():
+        record_cache("opening_audio", "disk_hit")
+        audio_data = cache_file.read_bytes()
+    else:
+        record_cache("opening_audio", "miss")
+        audio_data = synthesize_speech(UrduPromptBuilder.OPENING_MESSAGE, voice_id=voice_id)
+        try:
+            OPENING_AUDIO_DIR.mkdir(exist_ok=True)
+            cache_file.write_bytes(audio_data)
+        except OSError:
+            pass
+
+    _opening_audio[key] = audio_data
+    return audio_data
+
+
+# ========== WARM-UP & HEALTH ==========
+
+_warm_state = {"started": False, "ready": False, "error": None, "warm_ms": None, "attempts": 0}
+
+WARM_UP_MAX_BACKOFF = float(os.getenv("WARM_UP_MAX_BACKOFF", "60"))
+
+
+def warm_up(max_attempts: Optional[int] = None):
+    """Create every lazy resource now so the first patient doesn't pay for it.
+    A failure (e.g. Supabase or Groq briefly unreachable) is retried with
+    backoff, so readiness recovers without a restart."""
+    started = time.perf_counter()
+    backoff = 1.0
+    for attempt in itertools.count(1):
+        _warm_state["attempts"] += 1
+        try:
+            get_groq_client()
+            get_supabase()
+            get_llm_system().warm_up()
+            if UPLIFTAI_API_KEY:
+                try:
+                    get_opening_audio()
+                except Exception as e:
+                    log.warning("warm_up.opening_audio_failed", error=str(e))
+            _warm_state["ready"] = True
+            _warm_state["error"] = None
+            break
+        except Exception as e:
+            _warm_state["error"] = str(e)
+            if max_attempts is not None and attempt >= max_attempts:
+                break
+            log.warning("warm_up.failed", attempt=_warm_state["attempts"], retry_in_s=backoff, error=str(e))
+            time.sleep(backoff)
+            backoff = min(WARM_UP_MAX_BACKOFF, backoff * 2)
+    _warm_state["warm_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+async def start_warm_up():
+    """Startup hook: warm in a background thread so the port opens immediately"""
+    if not _warm_state["started"]:
+        _warm_state["started"] = True
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+        if SUPABASE_URL and SUPABASE_KEY:
+            # Resume storing histories queued before a restart
+            get_history_queue().start()
+
+
+@router.get("/health/live")
+async def health_live():
+    """Process is up and serving requests"""
+    return {"status": "live"}
+
+
+@router.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+@router.get("/health/upstreams")
+async def health_upstreams():
+    """Circuit breaker state per upstream (groq_chat, groq_stt, upliftai_tts, supabase)"""
+    return breaker_states()
+
+
+@router.get("/api/debug/trace/{session_id}")
+async def debug_trace(session_id: str, format: str = "timeline"):
+    """Recent turn timelines for a session; ?format=otel returns OTLP/JSON spans"""
+    if format == "otel":
+        return trace_store.export_otel(session_id)
+    turns = trace_store.get(session_id)
+    if not turns:
+        raise HTTPException(status_code=404, detail="no traces for session")
+    return {
+        'session_id': session_id,
+        'turns': [trace.summary() for trace in turns]
+    }
+
+
+@router.get("/health/ready")
+async def health_ready():
+    """503 until the LLM system, clients and graph are warmed"""
+    body = {
+        "status": "ready" if _warm_state["ready"] else "warming",
+        "warm_ms": _warm_state["warm_ms"],
+        "error": _warm_state["error"],
+        "attempts": _warm_state["attempts"],
+        "upstreams": {name: state["state"] for name, state in breaker_states().items()},
+    }
+    return JSONResponse(status_code=200 if _warm_state["ready"] else 503, content=body)
+
+
+@router.post('/api/start-interview')
+async def api_start_interview(authorization: Optional[str] = Header(default=None)):
     try:
-        result = llm_system.start_interview()
-        import uuid
         session_id = str(uuid.uuid4())
-        llm_sessions[session_id] = result['state']
+        owner_email = await resolve_session_owner(session_id, authorization)
+        result = await asyncio.to_thread(get_llm_system().start_session, session_id, owner_email)
+        SESSIONS_STARTED.inc()
+        cache_session(session_id, result['state'])
 
         # Extract clean message
         ai_message = result['ai_message']
@@ -286,15 +672,16 @@ async def api_start_interview():
         return {'error': 'start-interview failed', 'details': str(e)}
 
 
-@app.post('/api/start-interview-with-voice')
-async def api_start_interview_with_voice():
+@router.post('/api/start-interview-with-voice')
+async def api_start_interview_with_voice(authorization: Optional[str] = Header(default=None)):
     """Start interview and return both text + audio for the first question"""
     try:
         # Start the interview to get the first question
-        result = llm_system.start_interview()
-        import uuid
         session_id = str(uuid.uuid4())
-        llm_sessions[session_id] = result['state']
+        owner_email = await resolve_session_owner(session_id, authorization)
+        result = await asyncio.to_thread(get_llm_system().start_session, session_id, owner_email)
+        SESSIONS_STARTED.inc()
+        cache_session(session_id, result['state'])
 
         # Extract clean message
         ai_message = result['ai_message']
@@ -311,36 +698,8 @@ async def api_start_interview_with_voice():
             }
 
         try:
-            # Call UpliftAI TTS for the first question
-            url = f"{UPLIFTAI_BASE_URL}/synthesis/text-to-speech"
-            headers = {
-                "Authorization": f"Bearer {UPLIFTAI_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            payload = {
-                "text": ai_message,
-                "voiceId": "v_meklc281",  # Default Urdu voice
-                "outputFormat": "MP3_22050_32"
-            }
-            
-            response = requests.post(url, json=payload, headers=headers)
-            
-            # Handle the audio response
-            content_type = response.headers.get("Content-Type", "")
-            
-            if "application/json" in content_type:
-                result_tts = response.json()
-                if "audioContent" in result_tts:
-                    audio_data = base64.b64decode(result_tts["audioContent"])
-                elif "url" in result_tts:
-                    audio_response = requests.get(result_tts["url"])
-                    audio_data = audio_response.content
-                else:
-                    raise Exception("Unexpected JSON response from TTS")
-            elif "audio" in content_type:
-                audio_data = response.content
-            else:
-                raise Exception(f"Unexpected response: {response.text}")
+            # Opening question audio is synthesized once per prompt version
+            audio_data = get_opening_audio()
             
             # Return base64 encoded audio for frontend
             audio_base64 = base64.b64encode(audio_data).decode('utf-8')
@@ -365,60 +724,142 @@ async def api_start_interview_with_voice():
         return {'error': 'start-interview failed', 'details': str(e)}
 
 
+def traced_turn(session_id: str, turn_kind: str, message: str, on_token=None, voice: bool = False) -> dict:
+    """One checkpointed turn, recorded in the session's trace timeline.
+    Queues the history for storage on the turn that completes the interview.
+    on_token(text) receives the reply tokens as they are generated.
+    voice=True when the reply will be synthesized (enables TTS speculation)."""
+    token = _voice_turn.set(voice)
+    try:
+        with trace_turn(session_id, turn_kind):
+            result = get_llm_system().process_session_message(session_id, message, on_token=on_token)
+    finally:
+        _voice_turn.reset(token)
+    cache_session(session_id, result['state'])
+    if result['just_completed']:
+        result['persistence'] = auto_persist_history(session_id, result['state'])
+    return result
+
+
+# ========== SERVER-SIDE AUTO-PERSISTENCE ==========
+# When a session was started with a Supabase access token, the server knows
+# whose interview it is and stores the history itself the moment the last
+# section completes - no re-upload of collected_data by the client, and the
+# translation/insert overlap with the final TTS playback.
+
+AUTO_PERSIST_HISTORY = os.getenv("AUTO_PERSIST_HISTORY", "true").lower() in ("1", "true", "yes")
+
+def resolve_user_email(access_token: str) -> Optional[str]:
+    """Email of the Supabase user an access token belongs to"""
+    supabase = get_supabase()
+    if not supabase:
+        return None
+    with SUPABASE_LATENCY.labels(operation='get_user').time():
+        response = breakers['supabase'].call(supabase.auth.get_user, access_token)
+    user = getattr(response, 'user', None)
+    return getattr(user, 'email', None)
+
+
+async def resolve_session_owner(session_id: str, authorization: Optional[str]) -> Optional[str]:
+    """Who owns a new session (from 'Authorization: Bearer <supabase token>').
+    The email is stored in the session's checkpoint, so it survives restarts."""
+    if not (AUTO_PERSIST_HISTORY and authorization and authorization.lower().startswith('bearer ')):
+        return None
+    try:
+        return await asyncio.to_thread(resolve_user_email, authorization[7:].strip())
+    except Exception as e:
+        log.warning("auto_persist.auth_failed", session_id=session_id, error=str(e))
+        return None
+
+
+def auto_persist_history(session_id: str, state: dict) -> Optional[dict]:
+    """Queue a finished interview for storage under its owner's email"""
+    email = state.get('owner_email')
+    if not email:
+        return None
+    collected_data = state.get('collected_data', {})
+    # Same key a client store of this data would derive, so a late client POST dedupes
+    key = content_idempotency_key(email, collected_data, session_id)
+    try:
+        queue = get_history_queue()
+        handle, _ = queue.enqueue(email, collected_data, key)
+        queue.start()
+    except Exception as e:
+        log.error("auto_persist.enqueue_failed", session_id=session_id, error=str(e))
+        return None
+    log.info("auto_persist.queued", session_id=session_id, handle=handle)
+    return {
+        'handle': handle,
+        'idempotency_key': key,
+        'status_url': f'/api/medical-history-status/{handle}'
+    }
+
+
 from pydantic import BaseModel
 
 class SendMessageRequest(BaseModel):
     session_id: str
     message: str
+    deadline_ms: Optional[int] = None  # per-turn budget (at most, and by default, TURN_DEADLINE_SECONDS)
 
 class StoreMedicalHistoryRequest(BaseModel):
     user_email: str
     medical_data: dict
+    idempotency_key: Optional[str] = None  # or the Idempotency-Key header
+    session_id: Optional[str] = None       # derives the key when none is given
 
-@app.post('/api/send-message')
+@router.post('/api/send-message')
 async def api_send_message(req: SendMessageRequest):
     try:
-        if req.session_id not in llm_sessions:
+        if await asyncio.to_thread(get_session, req.session_id) is None:
             return {'error': 'session not found'}
 
-        state = llm_sessions[req.session_id]
-        result = llm_system.process_user_message(state, req.message)
-        llm_sessions[req.session_id] = result['state']
-        print('Send Message')      
-        print(result)
+        deadline = request_deadline(req.deadline_ms)
+        result = await asyncio.to_thread(
+            call_with_deadline, deadline, traced_turn, req.session_id, 'message', req.message
+        )
         ai_message = result['ai_message']
         if hasattr(ai_message, "choices") and ai_message.choices:
-            print('im here 1')
             ai_message = ai_message.choices[0].message.content
         elif hasattr(ai_message, "content"):
-            print('im here 2')
             ai_message = ai_message.content
         else:
-            print('im here 3')
             ai_message = str(ai_message)
+        log.info("send_message.done", session_id=req.session_id,
+                 section=result['state']['current_section'], is_complete=result['is_complete'],
+                 message_count=len(result['state']['messages']), elapsed_ms=deadline.report()['elapsed_ms'])
         return {
             'message': ai_message,
             'collected_data': result['collected_data'],
-            'is_complete': result['is_complete']
+            'is_complete': result['is_complete'],
+            'persistence': result.get('persistence'),
+            'deadline': deadline.report()
         }
+    except GroqRateLimited as e:
+        raise rate_limited_error(e)
+    except CircuitOpenError as e:
+        raise unavailable_error(e)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         return {'error': 'send-message failed', 'details': str(e)}
 
 
-@app.post('/api/send-message-with-voice')
+@router.post('/api/send-message-with-voice')
 async def api_send_message_with_voice(req: SendMessageRequest):
     """Send message and return both text + audio response"""
     try:
-        if req.session_id not in llm_sessions:
+        state = await asyncio.to_thread(get_session, req.session_id)
+        if state is None:
             return {'error': 'session not found'}
 
-        state = llm_sessions[req.session_id]
-        print(f"State before processing: {state.get('current_section')}")
-        result = llm_system.process_user_message(state, req.message)
-        llm_sessions[req.session_id] = result['state']
-        print(f"Result keys: {result.keys()}")
-        print(f"AI message raw: {result.get('ai_message')}")
-        print(f"AI message type: {type(result.get('ai_message'))}")
+        log.debug("send_message_with_voice.start", session_id=req.session_id, section=state.get('current_section'))
+        deadline = request_deadline(req.deadline_ms)
+        result = await asyncio.to_thread(
+            call_with_deadline, deadline, traced_turn, req.session_id, 'message', req.message, voice=True
+        )
+        log.debug("send_message_with_voice.reply", session_id=req.session_id,
+                  reply_type=type(result.get('ai_message')).__name__, ai_message=result.get('ai_message'))
         # Extract AI message
         ai_message = result['ai_message']
         if hasattr(ai_message, "choices") and ai_message.choices:
@@ -433,54 +874,186 @@ async def api_send_message_with_voice(req: SendMessageRequest):
         tts_error = None
         
         if UPLIFTAI_API_KEY and ai_message:
-            try:
-                url = f"{UPLIFTAI_BASE_URL}/synthesis/text-to-speech"
-                headers = {
-                    "Authorization": f"Bearer {UPLIFTAI_API_KEY}",
-                    "Content-Type": "application/json"
-                }
-                payload = {
-                    "text": ai_message,
-                    "voiceId": "v_meklc281",
-                    "outputFormat": "MP3_22050_32"
-                }
-                
-                response = requests.post(url, json=payload, headers=headers)
-                content_type = response.headers.get("Content-Type", "")
-                
-                if "application/json" in content_type:
-                    result_tts = response.json()
-                    if "audioContent" in result_tts:
-                        audio_data = base64.b64decode(result_tts["audioContent"])
-                    elif "url" in result_tts:
-                        audio_response = requests.get(result_tts["url"])
-                        audio_data = audio_response.content
-                    else:
-                        raise Exception("Unexpected JSON response")
-                elif "audio" in content_type:
-                    audio_data = response.content
-                else:
-                    raise Exception(f"Unexpected response: {response.text}")
-                
-                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-                
-            except Exception as e:
-                tts_error = str(e)
+            if deadline.remaining() < TTS_MIN_SECONDS:
+                # Not enough budget left: return text only
+                deadline.degrade('skipped_tts')
+                tts_error = 'skipped: turn deadline'
+            else:
+                try:
+                    audio_data = await asyncio.to_thread(
+                        call_with_deadline, deadline, synthesize_reply, ai_message
+                    )
+                    audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+                    
+                except Exception as e:
+                    tts_error = str(e)
 
         return {
             'message': ai_message,
             'collected_data': result['collected_data'],
             'is_complete': result['is_complete'],
+            'persistence': result.get('persistence'),
             'audio_base64': audio_base64,
             'audio_format': 'mp3',
-            'tts_error': tts_error
+            'tts_error': tts_error,
+            'deadline': deadline.report()
         }
         
+    except GroqRateLimited as e:
+        raise rate_limited_error(e)
+    except CircuitOpenError as e:
+        raise unavailable_error(e)
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         return {'error': 'send-message failed', 'details': str(e)}
 
 
-@app.post('/api/text-to-audio')
+# ========== SERVER-SENT EVENTS TURN ==========
+# The send-message turn as text/event-stream: plain HTTP, so it passes through
+# the Next.js ai-proxy routes (which can't proxy websockets) and clients still
+# render the reply progressively. Events, in order:
+#   token           {"content"}                      coalesced reply text
+#   reply           {"message"}                      the final reply
+#   collected_data  {"collected_data", "is_complete", "section", "persistence"}
+#   audio_ready     {"handle", "format"}             (voice=true) sent as synthesis starts;
+#                                                    GET reply-audio/{handle} waits for the mp3
+#   done            {"deadline"}
+#   error           {"message", "status"}
+
+REPLY_AUDIO_TTL_SECONDS = float(os.getenv("REPLY_AUDIO_TTL_SECONDS", "300"))
+REPLY_AUDIO_MAX = int(os.getenv("REPLY_AUDIO_MAX", "256"))
+
+# handle -> (created_at, task resolving to mp3 bytes); oldest first
+reply_audio = OrderedDict()
+
+
+class SendMessageStreamRequest(SendMessageRequest):
+    voice: bool = False          # synthesize the reply and send an audio_ready event
+    voice_id: str = "v_meklc281"
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def start_reply_audio(text: str, voice_id: str, deadline: Deadline) -> tuple:
+    """Synthesize in the background; returns (handle, task) for /api/reply-audio"""
+    now = time.monotonic()
+    while reply_audio and (len(reply_audio) >= REPLY_AUDIO_MAX
+                           or now - next(iter(reply_audio.values()))[0] > REPLY_AUDIO_TTL_SECONDS):
+        reply_audio.popitem(last=False)
+    handle = uuid.uuid4().hex
+    task = asyncio.ensure_future(asyncio.to_thread(call_with_deadline, deadline, synthesize_reply, text, voice_id))
+    # Nobody may fetch the audio; its failure is reported by /api/reply-audio if they do
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    reply_audio[handle] = (now, task)
+    return handle, task
+
+
+def sse_error(e: Exception) -> str:
+    if isinstance(e, GroqRateLimited):
+        status = 429
+    elif isinstance(e, CircuitOpenError):
+        status = 503
+    elif isinstance(e, DeadlineExceeded):
+        status = 504
+    else:
+        status = 500
+    return sse_event('error', {'message': str(e), 'status': status})
+
+
+@router.post('/api/send-message-stream')
+async def api_send_message_stream(req: SendMessageStreamRequest):
+    """send-message as Server-Sent Events: tokens, then collected data, then audio handles"""
+    if await asyncio.to_thread(get_session, req.session_id) is None:
+        return {'error': 'session not found'}
+
+    deadline = request_deadline(req.deadline_ms)
+    loop = asyncio.get_running_loop()
+    tokens = asyncio.Queue()
+    done = object()
+
+    def on_token(text: str):
+        loop.call_soon_threadsafe(tokens.put_nowait, text)
+
+    turn = asyncio.ensure_future(asyncio.to_thread(
+        call_with_deadline, deadline, traced_turn, req.session_id, 'sse', req.message, on_token, req.voice
+    ))
+    # Queued after every token the turn produced
+    turn.add_done_callback(lambda _: tokens.put_nowait(done))
+
+    async def events():
+        # A comment first, so proxies pass the headers through right away
+        yield ": stream open\n\n"
+
+        # Same coalescing as the websocket: one event per WS_FLUSH_MS / WS_FLUSH_CHARS
+        pending, pending_chars, flush_at = [], 0, None
+        while True:
+            timeout = max(0.0, flush_at - time.monotonic()) if pending else None
+            try:
+                item = await asyncio.wait_for(tokens.get(), timeout)
+            except asyncio.TimeoutError:
+                item = None
+            if isinstance(item, str):
+                if not pending:
+                    flush_at = time.monotonic() + WS_FLUSH_MS / 1000
+                pending.append(item)
+                pending_chars += len(item)
+                if pending_chars < WS_FLUSH_CHARS and time.monotonic() < flush_at:
+                    continue
+            if pending:
+                yield sse_event('token', {'content': ''.join(pending)})
+                pending, pending_chars = [], 0
+            if item is done:
+                break
+
+        try:
+            result = turn.result()
+        except Exception as e:
+            yield sse_error(e)
+            return
+
+        ai_message = extract_ai_message(result['ai_message'])
+        yield sse_event('reply', {'message': ai_message})
+        yield sse_event('collected_data', {
+            'collected_data': result['collected_data'],
+            'is_complete': result['is_complete'],
+            'section': result['state']['current_section'],
+            'persistence': result.get('persistence')
+        })
+
+        if req.voice and UPLIFTAI_API_KEY and ai_message:
+            if deadline.remaining() < TTS_MIN_SECONDS:
+                deadline.degrade('skipped_tts')
+            else:
+                # Handle only: the browser fetches through the ai-proxy route, in
+                # parallel with synthesis (the audio endpoint waits for it)
+                handle, _ = start_reply_audio(ai_message, req.voice_id, deadline)
+                yield sse_event('audio_ready', {'handle': handle, 'format': 'mp3'})
+
+        yield sse_event('done', {'deadline': deadline.report()})
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get('/api/reply-audio/{handle}')
+async def api_reply_audio(handle: str):
+    """mp3 of an SSE turn's reply (waits if synthesis is still running)"""
+    entry = reply_audio.get(handle)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="unknown or expired audio handle")
+    try:
+        audio = await asyncio.wait_for(asyncio.shield(entry[1]), UPLIFTAI_TIMEOUT)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Text-to-speech failed: {str(e)}")
+    return Response(content=audio, media_type="audio/mpeg")
+
+
+@router.post('/api/text-to-audio')
 async def api_text_to_audio(
     text: str = Form(...),
     voice_id: str = Form(default="v_meklc281")
@@ -490,33 +1063,7 @@ async def api_text_to_audio(
         raise HTTPException(status_code=500, detail="TTS not configured")
     
     try:
-        url = f"{UPLIFTAI_BASE_URL}/synthesis/text-to-speech"
-        headers = {
-            "Authorization": f"Bearer {UPLIFTAI_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "text": text,
-            "voiceId": voice_id,
-            "outputFormat": "MP3_22050_32"
-        }
-        
-        response = requests.post(url, json=payload, headers=headers)
-        content_type = response.headers.get("Content-Type", "")
-        
-        if "application/json" in content_type:
-            result = response.json()
-            if "audioContent" in result:
-                audio_data = base64.b64decode(result["audioContent"])
-            elif "url" in result:
-                audio_response = requests.get(result["url"])
-                audio_data = audio_response.content
-            else:
-                raise HTTPException(status_code=500, detail="Unexpected response format")
-        elif "audio" in content_type:
-            audio_data = response.content
-        else:
-            raise HTTPException(status_code=500, detail=f"Unexpected response: {response.text}")
+        audio_data = await asyncio.to_thread(synthesize_speech, text, voice_id=voice_id)
         
         audio_base64 = base64.b64encode(audio_data).decode('utf-8')
         
@@ -526,179 +1073,612 @@ async def api_text_to_audio(
             'text': text
         }
         
+    except CircuitOpenError as e:
+        raise unavailable_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"TTS failed: {str(e)}")
 
 
-@app.get('/api/get-history')
+@router.get('/api/groq-scheduler-stats')
+async def api_groq_scheduler_stats():
+    """Queueing delay, queue depth and 429/retry counts per Groq model"""
+    return groq_scheduler.stats()
+
+
+@router.get('/api/single-flight-stats')
+async def api_single_flight_stats():
+    """How many upstream TTS/translation calls were shared by concurrent callers"""
+    return {
+        "tts": tts_flight.stats(),
+        "translation": translation_flight.stats(),
+        "llm_translation": get_llm_system().translation_flight.stats()
+    }
+
+
+@router.get('/api/model-routing-stats')
+async def api_model_routing_stats():
+    """Per-tier latency and small->large escalation rate of the interview agent"""
+    return get_llm_system().routing_report()
+
+
+@router.get('/api/speculation-stats')
+async def api_speculation_stats():
+    """Hit rate and wasted synthesis for speculative next-question TTS"""
+    return tts_speculator.stats()
+
+
+@router.get('/api/get-history')
 async def api_get_history(session_id: str, view: str = 'patient'):
     """Return formatted history for a session. view='patient'|'doctor'"""
-    if session_id not in llm_sessions:
+    state = await asyncio.to_thread(get_session, session_id)
+    if state is None:
         return { 'error': 'session not found' }
 
-    state = llm_sessions[session_id]
-
     try:
-        history = llm_system.get_history_view(state, view=view)
+        history = get_llm_system().get_history_view(state, view=view)
     except Exception as e:
         return { 'error': 'failed to build history', 'details': str(e) }
 
     return { 'session_id': session_id, 'view': view, 'history': history }
 
 
-@app.websocket("/ws/interview/{session_id}")
+@router.websocket("/ws/interview/{session_id}")
 async def websocket_interview(websocket: WebSocket, session_id: str):
     """WebSocket for streaming responses (exposes same behavior as llm.py websocket)
     """
     await websocket.accept()
 
-    # Initialize or get session
-    if session_id not in llm_sessions:
-        result = llm_system.start_interview()
-        llm_sessions[session_id] = result['state']
+    # Resume the session from its checkpoint, or start it
+    state = await asyncio.to_thread(get_session, session_id)
+    if state is None:
+        result = await asyncio.to_thread(get_llm_system().start_session, session_id)
+        SESSIONS_STARTED.inc()
+        cache_session(session_id, result['state'])
         await websocket.send_json({
             "type": "message",
             "content": result['ai_message']
         })
+        state = result['state']
+
+    # Tokens are coalesced into fewer frames and sent through a bounded queue
+    sender = FrameSender(websocket).start()
+    try:
+        while True:
+            try:
+                data = await websocket.receive_json()
+            except Exception:
+                break
+            user_message = data.get('message')
+            was_complete = state.get('all_sections_done', False)
+            sender.begin_turn()
+
+            # Stream response tokens
+            try:
+                with trace_turn(session_id, "stream"):
+                    async for chunk in get_llm_system().process_session_message_streaming(session_id, user_message):
+                        if isinstance(chunk, dict) and 'content' in chunk:
+                            await sender.token(chunk['content'])
+            except SlowConsumer:
+                break
+            except Exception as e:
+                # send an error and continue
+                try:
+                    await sender.send({"type": "error", "message": str(e)})
+                except SlowConsumer:
+                    break
+
+            # The graph ran against the checkpoint; reload what it saved
+            state = await asyncio.to_thread(get_llm_system().get_session_state, session_id) or state
+            cache_session(session_id, state)
+
+            persistence = None
+            if state.get('all_sections_done') and not was_complete:
+                persistence = await asyncio.to_thread(auto_persist_history, session_id, state)
+
+            # Send completion
+            complete = {
+                "type": "complete",
+                "collected_data": state.get('collected_data', {}),
+                "is_complete": state.get('all_sections_done', False),
+                "persistence": persistence
+            }
+            if not sender.streaming_tokens:
+                # Slow client: token streaming was cut short, send the whole reply instead
+                complete["message"] = state['messages'][-1]['content'] if state.get('messages') else ''
+            try:
+                await sender.send(complete)
+                stats = await sender.finish_turn()
+            except SlowConsumer:
+                break
+            log.info("ws.turn_frames", session_id=session_id, **stats)
+    finally:
+        await sender.close()
+
+
+# ========== SINGLE ROUND-TRIP VOICE TURN ==========
+
+def extract_ai_message(ai_message) -> str:
+    """Normalize the LLM reply to plain text"""
+    if hasattr(ai_message, "choices") and ai_message.choices:
+        return ai_message.choices[0].message.content
+    if hasattr(ai_message, "content"):
+        return ai_message.content
+    return str(ai_message)
+
+
+async def run_voice_turn(
+    session_id: str,
+    audio_bytes: bytes,
+    filename: str,
+    model: str = "whisper-large-v3-turbo",
+    preprocess: Optional[bool] = None,
+    voice_id: str = "v_meklc281",
+    deadline: Optional[Deadline] = None
+):
+    """
+    Run STT -> process_user_message -> TTS server-side for one patient turn.
+    Yields an event dict as soon as each stage is ready:
+    transcript, reply, audio, then done (with per-stage timings).
+    All stages share one Deadline; TTS is skipped if too little budget is left.
+    """
+    deadline = deadline or request_deadline()
+    timings = {}
+    turn_started = time.perf_counter()
+
+    # ---- STT ----
+    stage_started = time.perf_counter()
+    try:
+        upload_bytes, upload_name = audio_bytes, filename
+        if preprocess if preprocess is not None else AUDIO_PREPROCESS:
+            try:
+                prepared = await asyncio.to_thread(preprocess_audio, audio_bytes, filename)
+                upload_bytes, upload_name = prepared.audio, prepared.filename
+                timings['preprocess_ms'] = round(prepared.elapsed_ms, 1)
+            except Exception:
+                pass
+        transcription = await asyncio.to_thread(
+            call_with_deadline, deadline, whisper_transcribe, upload_bytes, upload_name, model
+        )
+        transcript = (transcription.text or "").strip()
+    except Exception as e:
+        yield {'type': 'error', 'stage': 'stt', 'message': str(e)}
+        return
+    timings['stt_ms'] = round((time.perf_counter() - stage_started) * 1000, 1)
+
+    yield {'type': 'transcript', 'text': transcript, 'stt_ms': timings['stt_ms']}
+
+    async for event in run_reply_stages(session_id, transcript, voice_id, deadline, timings, turn_started):
+        yield event
+
+
+async def run_reply_stages(
+    session_id: str,
+    transcript: str,
+    voice_id: str,
+    deadline: Deadline,
+    timings: dict,
+    turn_started: float
+):
+    """The part of a voice turn after STT: process_user_message, then TTS, then done"""
+    if not transcript:
+        yield {'type': 'error', 'stage': 'stt', 'message': 'empty transcript'}
+        return
+
+    # ---- LLM turn ----
+    stage_started = time.perf_counter()
+    try:
+        result = await asyncio.to_thread(
+            call_with_deadline, deadline, traced_turn, session_id, 'voice', transcript, voice=True
+        )
+        ai_message = extract_ai_message(result['ai_message'])
+    except Exception as e:
+        yield {'type': 'error', 'stage': 'llm', 'message': str(e)}
+        return
+    timings['llm_ms'] = round((time.perf_counter() - stage_started) * 1000, 1)
+
+    yield {
+        'type': 'reply',
+        'message': ai_message,
+        'collected_data': result['collected_data'],
+        'is_complete': result['is_complete'],
+        'persistence': result.get('persistence'),
+        'llm_ms': timings['llm_ms']
+    }
+
+    # ---- TTS ----
+    if UPLIFTAI_API_KEY and ai_message and deadline.remaining() < TTS_MIN_SECONDS:
+        deadline.degrade('skipped_tts')
+    elif UPLIFTAI_API_KEY and ai_message:
+        stage_started = time.perf_counter()
+        try:
+            audio_data = await asyncio.to_thread(
+                call_with_deadline, deadline, synthesize_reply, ai_message, voice_id
+            )
+            timings['tts_ms'] = round((time.perf_counter() - stage_started) * 1000, 1)
+            yield {
+                'type': 'audio',
+                'audio_base64': base64.b64encode(audio_data).decode('utf-8'),
+                'audio_format': 'mp3',
+                'tts_ms': timings['tts_ms']
+            }
+        except Exception as e:
+            yield {'type': 'error', 'stage': 'tts', 'message': str(e)}
+
+    timings['total_ms'] = round((time.perf_counter() - turn_started) * 1000, 1)
+    yield {'type': 'done', 'timings': timings, 'deadline': deadline.report()}
+
+
+@router.post('/api/voice-turn')
+async def api_voice_turn(
+    session_id: str = Form(...),
+    file: UploadFile = File(..., description="Patient's recorded answer"),
+    model: Literal["whisper-large-v3-turbo", "whisper-large-v3"] = Form(default="whisper-large-v3-turbo"),
+    preprocess: Optional[bool] = Form(default=None),
+    deadline_ms: Optional[int] = Form(default=None)
+):
+    """
+    One request per voice turn: audio in, transcript + reply text + reply audio out.
+    Streams newline-delimited JSON events as each stage completes.
+    """
+    if await asyncio.to_thread(get_session, session_id) is None:
+        return {'error': 'session not found'}
+
+    file_ext = Path(file.filename).suffix.lower().lstrip('.')
+    if file_ext not in SUPPORTED_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported format. Use: {', '.join(SUPPORTED_FORMATS)}"
+        )
+
+    audio_bytes = await file.read()
 
-    state = llm_sessions[session_id]
+    async def event_stream():
+        async for event in run_voice_turn(
+            session_id, audio_bytes, file.filename, model, preprocess,
+            deadline=request_deadline(deadline_ms)
+        ):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+
+@router.websocket("/ws/voice-turn/{session_id}")
+async def websocket_voice_turn(websocket: WebSocket, session_id: str):
+    """
+    WebSocket variant of /api/voice-turn.
+    - Text frame (optional): {"filename": "answer.webm", "model": "...", "preprocess": true}
+      sets options for the following utterances
+    - Binary frame: one complete recorded answer; events are sent back as JSON
+    """
+    await websocket.accept()
+
+    if await asyncio.to_thread(get_session, session_id) is None:
+        await websocket.send_json({"type": "error", "message": "session not found"})
+        await websocket.close()
+        return
+
+    options = {"filename": "audio.webm", "model": "whisper-large-v3-turbo", "preprocess": None}
 
     while True:
         try:
-            data = await websocket.receive_json()
+            frame = await websocket.receive()
         except Exception:
             break
-        user_message = data.get('message')
+        if frame.get("type") == "websocket.disconnect":
+            break
+
+        if frame.get("text"):
+            try:
+                options.update(json.loads(frame["text"]))
+            except ValueError:
+                await websocket.send_json({"type": "error", "message": "invalid options frame"})
+            continue
+
+        audio_bytes = frame.get("bytes")
+        if not audio_bytes:
+            continue
+
+        async for event in run_voice_turn(
+            session_id, audio_bytes, options["filename"], options["model"], options["preprocess"]
+        ):
+            await websocket.send_json(event)
+
+
+# ========== STREAMING MICROPHONE INPUT ==========
+
+@router.websocket("/ws/voice-stream/{session_id}")
+async def websocket_voice_stream(websocket: WebSocket, session_id: str):
+    """
+    Live microphone input: audio is transcribed while the patient is still
+    speaking, and the answer goes to the LLM as soon as they stop.
+    - Text frame {"format": "pcm16"|"webm"|"ogg", "model": "...", "voice_id": "..."}
+      sets options; pcm16 (default) is raw 16-bit mono PCM at 16 kHz,
+      containers are decoded on the fly with ffmpeg
+    - Text frame {"type": "end"}: recording stopped, finish the utterance now
+      (otherwise the end is detected from STREAM_END_SILENCE_MS of silence)
+    - Binary frames: audio as it is recorded
+    Events: speech_start, partial (transcript so far), transcript (final),
+    then reply / audio / done as in /api/voice-turn. Audio received while a
+    reply is being produced is ignored.
+    """
+    await websocket.accept()
+
+    if await asyncio.to_thread(get_session, session_id) is None:
+        await websocket.send_json({"type": "error", "message": "session not found"})
+        await websocket.close()
+        return
+
+    options = {"format": "pcm16", "model": "whisper-large-v3-turbo", "voice_id": "v_meklc281"}
+    sender = FrameSender(websocket).start()
+    segmenter = UtteranceSegmenter()
+    utterance = None    # StreamingTranscription of the answer being spoken
+    turn_task = None    # reply to the last finished answer
+    decoder = None
+
+    def transcribe_segment(wav: bytes, filename: str, prompt: Optional[str]):
+        return whisper_transcribe(wav, filename, options["model"], prompt)
 
-        # Stream response tokens
-        collected_text = ""
+    async def on_partial(text: str, segments_done: int):
+        await sender.send({"type": "partial", "text": text, "segments": segments_done})
+
+    async def finish_utterance(transcription: StreamingTranscription):
         try:
-            async for chunk in llm_system.process_user_message_streaming(state, user_message):
-                if isinstance(chunk, dict) and 'content' in chunk:
-                    token = chunk['content']
-                    collected_text += token
-                    await websocket.send_json({"type": "token", "content": token})
+            stitched = await transcription.finish()
         except Exception as e:
-            # send an error and continue
-            await websocket.send_json({"type": "error", "message": str(e)})
-
-        # Send completion
-        await websocket.send_json({
-            "type": "complete",
-            "collected_data": state.get('collected_data', {}),
-            "is_complete": state.get('all_sections_done', False)
+            await sender.send({'type': 'error', 'stage': 'stt', 'message': str(e)})
+            return
+        # Only the tail of the answer is transcribed after the patient stops
+        timings = {'stt_ms': stitched['finalize_ms']}
+        transcript = stitched['text'].strip()
+        await sender.send({
+            'type': 'transcript', 'text': transcript, 'stt_ms': timings['stt_ms'],
+            'segments': stitched['segments_transcribed']
         })
+        async for event in run_reply_stages(
+            session_id, transcript, options['voice_id'], request_deadline(), timings,
+            transcription.speech_ended_at
+        ):
+            await sender.send(event)
+
+    async def handle(events: list):
+        nonlocal utterance, turn_task
+        for kind, segment in events:
+            if kind == SPEECH_START:
+                utterance = StreamingTranscription(transcribe_segment, on_partial)
+                await sender.send({"type": "speech_start"})
+            elif kind == SEGMENT:
+                if utterance is None:
+                    utterance = StreamingTranscription(transcribe_segment, on_partial)
+                utterance.add(segment)
+            elif kind == END and utterance is not None:
+                turn_task = asyncio.create_task(finish_utterance(utterance))
+                utterance = None
+
+    async def handle_pcm(pcm: bytes):
+        if turn_task is not None and not turn_task.done():
+            return
+        await handle(segmenter.feed(pcm))
+
+    try:
+        while True:
+            try:
+                frame = await websocket.receive()
+            except Exception:
+                break
+            if frame.get("type") == "websocket.disconnect":
+                break
+
+            if frame.get("text"):
+                try:
+                    message = json.loads(frame["text"])
+                except ValueError:
+                    await sender.send({"type": "error", "message": "invalid control frame"})
+                    continue
+                if message.get("type") != "end":
+                    options.update({k: v for k, v in message.items() if k in options})
+                    continue
+                if decoder is not None:
+                    await decoder.close()
+                    decoder = None
+                if turn_task is None or turn_task.done():
+                    await handle(segmenter.flush())
+                continue
+
+            audio = frame.get("bytes")
+            if not audio:
+                continue
+            if options["format"] == "pcm16":
+                await handle_pcm(audio)
+                continue
+            if decoder is None:
+                if not PCMStreamDecoder.available():
+                    await sender.send({"type": "error", "message": "ffmpeg not installed; send pcm16 audio"})
+                    continue
+                decoder = await PCMStreamDecoder(handle_pcm).start()
+            await decoder.write(audio)
+    except SlowConsumer:
+        pass
+    finally:
+        if decoder is not None:
+            decoder.kill()
+        if utterance is not None:
+            utterance.cancel()
+        if turn_task is not None:
+            turn_task.cancel()
+        await sender.close()
+
+
+# ========== WRITE-BEHIND HISTORY STORAGE ==========
+# The endpoint only queues the history (SQLite, survives restarts); the
+# worker translates it and batch-inserts into Supabase with retry.
+
+_history_queue = None
+
+
+def get_history_queue() -> HistoryWriteQueue:
+    """Process-wide write-behind queue, created once on first use"""
+    global _history_queue
+    if _history_queue is None:
+        with _init_lock:
+            if _history_queue is None:
+                _history_queue = HistoryWriteQueue(
+                    HISTORY_QUEUE_PATH, translate=translate_medical_data, insert_rows=insert_history_rows
+                )
+    return _history_queue
+
+
+def translate_medical_data(urdu_version: dict, strict: bool = False) -> dict:
+    """English copy of collected data: every non-empty string field is translated.
+    strict=True raises on a failed translation (so the queue retries later)."""
+    english_version = {}
+    for section, section_data in urdu_version.items():
+        if isinstance(section_data, dict):
+            english_version[section] = {}
+            for field, urdu_value in section_data.items():
+                if isinstance(urdu_value, str) and urdu_value.strip():
+                    english_version[section][field] = translate_urdu_to_english(urdu_value, strict)
+                else:
+                    # Non-string or empty values remain as-is
+                    english_version[section][field] = urdu_value
+        else:
+            # Non-dict values remain as-is
+            english_version[section] = section_data
+    return english_version
+
+
+def insert_history_rows(rows: list) -> list:
+    """Insert several medical_history rows in one Supabase call.
+    Upserts on idempotency_key, so re-sending a batch never duplicates rows."""
+    supabase = get_supabase()
+    if not supabase:
+        raise RuntimeError("Supabase not configured")
+    with SUPABASE_LATENCY.labels(operation='insert_batch').time():
+        result = breakers['supabase'].call(
+            supabase.table('medical_history').upsert(rows, on_conflict='idempotency_key').execute
+        )
+    return result.data or []
+
 
-        # Update session
-        llm_sessions[session_id] = state
-@app.post('/api/store-medical-history')
-async def api_store_medical_history(req: StoreMedicalHistoryRequest):
+IDEMPOTENT_REPLAY_WAIT_SECONDS = float(os.getenv("IDEMPOTENT_REPLAY_WAIT_SECONDS", "10"))
+
+
+@router.post('/api/store-medical-history', status_code=202)
+async def api_store_medical_history(
+    req: StoreMedicalHistoryRequest,
+    idempotency_key_header: Optional[str] = Header(default=None, alias="Idempotency-Key")
+):
     """
-    Store medical interview results in Supabase after translation
-    Takes Urdu medical data, translates to English, and stores both versions
+    Accept medical interview results for storage in Supabase
+    The Urdu data is queued locally and returned as a handle right away;
+    translation to English and the insert happen in the background.
+    Poll /api/medical-history-status/{handle} for the record id.
+    
+    Idempotent: a retry with the same key (Idempotency-Key header, body
+    idempotency_key, or derived from session_id + content) returns the
+    original handle. It waits briefly for the original to finish so the
+    replay can report its record_id; nothing is translated or inserted twice.
     """
-    if not supabase:
+    if not get_supabase():
         raise HTTPException(
             status_code=500, 
             detail="Supabase not configured. Please set SUPABASE_URL and SUPABASE_ANON_KEY environment variables."
         )
     
-    if not GROQ_API_KEY:
-        raise HTTPException(
-            status_code=500,
-            detail="GROQ_API_KEY not configured for translation"
-        )
-    
     try:
-        # Prepare the original Urdu data
-        urdu_version = req.medical_data
-        
-        # Translate each field to English using Groq
-        english_version = {}
-        
-        # Iterate through each section and field in the medical data
-        for section, section_data in urdu_version.items():
-            if isinstance(section_data, dict):
-                english_version[section] = {}
-                for field, urdu_value in section_data.items():
-                    if isinstance(urdu_value, str) and urdu_value.strip():
-                        # Translate this Urdu text to English
-                        english_value = await translate_urdu_to_english(urdu_value)
-                        english_version[section][field] = english_value
-                    else:
-                        # Non-string or empty values remain as-is
-                        english_version[section][field] = urdu_value
-            else:
-                # Non-dict values remain as-is
-                english_version[section] = section_data
-        
-        # Store both versions in Supabase
-        result = supabase.table('medical_history').insert({
-            'email': req.user_email,
-            'urdu_version': urdu_version,
-            'english_version': english_version
-        }).execute()
+        key = (idempotency_key_header or req.idempotency_key
+               or content_idempotency_key(req.user_email, req.medical_data, req.session_id))
+        queue = get_history_queue()
+        handle, created = await asyncio.to_thread(queue.enqueue, req.user_email, req.medical_data, key)
+        queue.start()
         
-        if result.data:
+        if created:
             return {
                 'success': True,
-                'message': 'Medical history stored successfully',
-                'record_id': result.data[0]['id'],
-                'urdu_version': urdu_version,
-                'english_version': english_version
+                'message': 'Medical history accepted for storage',
+                'handle': handle,
+                'idempotency_key': key,
+                'status': 'queued',
+                'status_url': f'/api/medical-history-status/{handle}'
             }
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to store medical history in database"
-            )
-            
+        
+        # Replay: report the original request's outcome
+        status = await asyncio.to_thread(queue.wait, handle, IDEMPOTENT_REPLAY_WAIT_SECONDS)
+        return {
+            'success': status['status'] != 'failed',
+            'message': 'Duplicate request - returning the original record',
+            'replayed': True,
+            'handle': handle,
+            'idempotency_key': key,
+            'status': status['status'],
+            'record_id': status['record_id'],
+            'status_url': f'/api/medical-history-status/{handle}'
+        }
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Failed to store medical history: {str(e)}"
+            detail=f"Failed to queue medical history: {str(e)}"
         )
 
 
-async def translate_urdu_to_english(urdu_text: str) -> str:
+@router.get('/api/medical-history-status/{handle}')
+async def api_medical_history_status(handle: str):
+    """Storage progress of a queued history: queued, translated, stored (with record_id) or failed"""
+    status = await asyncio.to_thread(get_history_queue().status, handle)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown medical history handle")
+    return status
+
+
+def translate_urdu_to_english(urdu_text: str, strict: bool = False) -> str:
     """
     Translate Urdu text to English using Groq LLM
+    Identical concurrent translations share one upstream call. On failure the
+    original text is returned with an error note, unless strict=True.
     """
     try:
-        translation_prompt = f"""
+        return translation_flight.do(urdu_text, _groq_translate_urdu, urdu_text)
+    except Exception as e:
+        if strict:
+            raise
+        return f"[Translation Error: {str(e)}] {urdu_text}"
+
+
+def _groq_translate_urdu(urdu_text: str) -> str:
+    translation_prompt = f"""
 Translate the following Urdu text to English. Provide only the direct translation without any additional commentary or explanation.
 
 Urdu Text: {urdu_text}
 
 English Translation:"""
 
-        # Use Groq for translation
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "user",
-                    "content": translation_prompt
-                }
-            ],
-            model="llama-3.1-8b-instant",  # Fast model for translation
-            temperature=0.1,  # Low temperature for consistent translation
-            max_tokens=512
-        )
-        
-        english_translation = chat_completion.choices[0].message.content.strip()
-        
-        # Clean up the response (remove any prefix like "English Translation:" if present)
-        if english_translation.startswith("English Translation:"):
-            english_translation = english_translation.replace("English Translation:", "").strip()
-        
-        return english_translation
-        
-    except Exception as e:
-        # If translation fails, return the original text with error note
-        return f"[Translation Error: {str(e)}] {urdu_text}"
+    # Use Groq for translation (background priority: never delays live turns)
+    chat_completion = breakers['groq_chat'].call(
+        groq_scheduler.call,
+        "llama-3.1-8b-instant",
+        get_groq_client().chat.completions.create,
+        priority=Priority.BACKGROUND,
+        est_tokens=estimate_tokens(translation_prompt, 512),
+        messages=[
+            {
+                "role": "user",
+                "content": translation_prompt
+            }
+        ],
+        model="llama-3.1-8b-instant",  # Fast model for translation
+        temperature=0.1,  # Low temperature for consistent translation
+        max_tokens=512
+    )
+    
+    english_translation = chat_completion.choices[0].message.content.strip()
+    
+    # Clean up the response (remove any prefix like "English Translation:" if present)
+    if english_translation.startswith("English Translation:"):
+        english_translation = english_translation.replace("English Translation:", "").strip()
+    
+    return english_translation
 
 
-@app.get('/api/example-store-usage')
+@router.get('/api/example-store-usage')
 async def api_example_store_usage():
     """
     Example showing how to use the store-medical-history endpoint
@@ -746,7 +1726,59 @@ async def api_example_store_usage():
         "note": "Call this endpoint when interview is complete (is_complete=true) with the collected_data from the session"
     }
 
-@app.get('/api/get-all-histories')
+
+def summarize_history_record(record: dict) -> dict:
+    """List-view summary of one medical_history row (stats, preview, language)"""
+    # Create a summary of each record
+    urdu_data = record['urdu_version']
+    english_data = record['english_version']
+
+    # Calculate completion stats
+    total_sections = len(urdu_data) if isinstance(urdu_data, dict) else 0
+    total_fields = 0
+    if isinstance(urdu_data, dict):
+        for section_data in urdu_data.values():
+            if isinstance(section_data, dict):
+                total_fields += len([v for v in section_data.values() if v and str(v).strip()])
+
+    # Get chief complaint for preview
+    chief_complaint = ""
+    if isinstance(urdu_data, dict):
+        for section_key, section_data in urdu_data.items():
+            if isinstance(section_data, dict):
+                for field_key, field_value in section_data.items():
+                    if 'complaint' in field_key.lower() or 'chief' in field_key.lower():
+                        chief_complaint = str(field_value)[:100] + "..." if len(str(field_value)) > 100 else str(field_value)
+                        break
+            if chief_complaint:
+                break
+
+    # Determine primary language from the first non-empty answer
+    primary_language = "urdu"
+    if isinstance(urdu_data, dict):
+        sample_text = next(
+            (value for section_data in urdu_data.values() if isinstance(section_data, dict)
+             for value in section_data.values() if isinstance(value, str) and value.strip()),
+            ""
+        )
+        primary_language = detect_primary_language(sample_text)
+
+    return {
+        'id': record['id'],
+        'created_at': record['created_at'],
+        'primary_language': primary_language,
+        'chief_complaint_preview': chief_complaint,
+        'stats': {
+            'total_sections': total_sections,
+            'total_fields': total_fields,
+            'completion_status': 'Complete' if total_sections >= 5 else 'Partial'
+        },
+        'urdu_version': urdu_data,
+        'english_version': english_data
+    }
+
+
+@router.get('/api/get-all-histories')
 async def api_get_all_histories(email: str):
     """
     Get all medical histories for a specific email address
@@ -755,6 +1787,7 @@ async def api_get_all_histories(email: str):
     Query Parameters:
     - email: The email address to fetch histories for
     """
+    supabase = get_supabase()
     if not supabase:
         raise HTTPException(
             status_code=500, 
@@ -763,89 +1796,89 @@ async def api_get_all_histories(email: str):
     
     try:
         # Get all medical history records for this email
-        print(email)
-        result = supabase.table('medical_history').select("*").eq('email', email).order('created_at', desc=True).execute()
-        print(result)
-        histories = []
-        for record in result.data:
-            # Create a summary of each record
-            urdu_data = record['urdu_version']
-            english_data = record['english_version']
-            
-            # Calculate completion stats
-            total_sections = len(urdu_data) if isinstance(urdu_data, dict) else 0
-            total_fields = 0
-            if isinstance(urdu_data, dict):
-                for section_data in urdu_data.values():
-                    if isinstance(section_data, dict):
-                        total_fields += len([v for v in section_data.values() if v and str(v).strip()])
-            
-            # Get chief complaint for preview
-            chief_complaint = ""
-            if isinstance(urdu_data, dict):
-                for section_key, section_data in urdu_data.items():
-                    if isinstance(section_data, dict):
-                        for field_key, field_value in section_data.items():
-                            if 'complaint' in field_key.lower() or 'chief' in field_key.lower():
-                                chief_complaint = str(field_value)[:100] + "..." if len(str(field_value)) > 100 else str(field_value)
-                                break
-                    if chief_complaint:
-                        break
-            
-            # Determine primary language based on content
-            primary_language = "urdu"
-            if isinstance(urdu_data, dict):
-                sample_text = ""
-                for section_data in urdu_data.values():
-                    if isinstance(section_data, dict):
-                        for value in section_data.values():
-                            if isinstance(value, str) and value.strip():
-                                sample_text = value
-                                break
-                        if sample_text:
-                            break
-                
-                # Simple heuristic: if contains English alphabet more than Urdu, consider it English
-                english_chars = sum(1 for c in sample_text if c.isalpha() and ord(c) < 128)
-                total_chars = len([c for c in sample_text if c.isalpha()])
-                if total_chars > 0 and english_chars / total_chars > 0.7:
-                    primary_language = "english"
-            
-            histories.append({
-                'id': record['id'],
-                'created_at': record['created_at'],
-                'primary_language': primary_language,
-                'chief_complaint_preview': chief_complaint,
-                'stats': {
-                    'total_sections': total_sections,
-                    'total_fields': total_fields,
-                    'completion_status': 'Complete' if total_sections >= 5 else 'Partial'
-                },
-                'urdu_version': urdu_data,
-                'english_version': english_data
-            })
-        
+        started = time.perf_counter()
+        with SUPABASE_LATENCY.labels(operation='select_histories').time():
+            result = breakers['supabase'].call(
+                supabase.table('medical_history').select("*").eq('email', email).order('created_at', desc=True).execute
+            )
+        histories = [summarize_history_record(record) for record in result.data]
+
+        log.info("get_all_histories.done", email=email, records=len(histories),
+                 elapsed_ms=round((time.perf_counter() - started) * 1000, 1))
         return {
             'email': email,
             'total_records': len(histories),
             'histories': histories
         }
         
+    except CircuitOpenError as e:
+        raise unavailable_error(e)
     except Exception as e:
-        print(e)
+        log.error("get_all_histories.failed", email=email, error=str(e))
         raise HTTPException(
             status_code=500,
             detail=f"Failed to retrieve medical histories: {str(e)}"
         )
 
 
-app.mount("/static", StaticFiles(directory="."), name="static")
+STATIC_DIR = Path(os.getenv("STATIC_DIR", "static"))
+
 
-@app.get("/index")
+@router.get("/index")
 async def serve_index():
     return FileResponse("index.html")
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_warm_up()
+    yield
+
+
+def create_app() -> FastAPI:
+    """Build the FastAPI app (cheap: heavy resources are created lazily)"""
+    app = FastAPI(
+        title="Urdu STT API",
+        description="Urdu Speech-to-Text using Groq Whisper",
+        version="1.0.0",
+        lifespan=lifespan
+    )
+
+    # Add CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    @app.middleware("http")
+    async def record_request_latency(request: Request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # Route template keeps the label low-cardinality (no session ids)
+            route = request.scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            HTTP_LATENCY.labels(endpoint=endpoint, method=request.method, status=str(status)).observe(
+                time.perf_counter() - started
+            )
+
+    app.include_router(router)
+    # Only a dedicated directory: the working directory holds .env and SEHAT_DATA_DIR
+    if STATIC_DIR.is_dir():
+        app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+    return app
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
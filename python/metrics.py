@@ -0,0 +1,85 @@
+"""
+PROMETHEUS METRICS
+
+Histograms and counters for every stage of a turn, served at /metrics.
+prometheus_client metrics are lock-protected counters/buckets in memory,
+so observing them costs microseconds and is safe to leave on in production.
+
+Label values are kept low-cardinality: section names, model names, route
+templates (not raw URLs) and status codes.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+
+# Buckets sized for upstream calls (100 ms .. 60 s)
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+# Buckets for in-process work (0.1 ms .. 1 s)
+LOCAL_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+
+
+STT_LATENCY = Histogram(
+    "sehat_stt_seconds", "Whisper transcription latency", ["model"], buckets=UPSTREAM_BUCKETS
+)
+LLM_CALL_LATENCY = Histogram(
+    "sehat_llm_call_seconds", "agent_node LLM call latency", ["section", "model"], buckets=UPSTREAM_BUCKETS
+)
+TOOL_NODE_LATENCY = Histogram(
+    "sehat_tool_node_seconds", "tool_node execution time", ["section"], buckets=LOCAL_BUCKETS
+)
+GRAPH_TURN_LATENCY = Histogram(
+    "sehat_graph_turn_seconds", "Full graph turn (blocking and streamed)", ["section"], buckets=UPSTREAM_BUCKETS
+)
+TTS_LATENCY = Histogram(
+    "sehat_tts_seconds", "UpliftAI text-to-speech latency", ["voice"], buckets=UPSTREAM_BUCKETS
+)
+SUPABASE_LATENCY = Histogram(
+    "sehat_supabase_seconds", "Supabase query time", ["operation"], buckets=UPSTREAM_BUCKETS
+)
+HTTP_LATENCY = Histogram(
+    "sehat_http_request_seconds", "HTTP request latency", ["endpoint", "method", "status"], buckets=UPSTREAM_BUCKETS
+)
+
+SESSIONS_STARTED = Counter("sehat_sessions_started_total", "Interview sessions created")
+SESSIONS_ACTIVE = Gauge(
+    "sehat_sessions_active", "Unfinished interview sessions used within SESSION_IDLE_SECONDS"
+)
+
+WS_TURN_FRAMES = Histogram(
+    "sehat_ws_turn_frames", "WebSocket frames sent per streamed turn", buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+WS_TURN_BYTES = Histogram(
+    "sehat_ws_turn_bytes", "WebSocket payload bytes sent per streamed turn",
+    buckets=(256, 1024, 4096, 16384, 65536, 262144)
+)
+WS_SLOW_CONSUMERS = Counter(
+    "sehat_ws_slow_consumers_total", "WebSocket clients that fell behind (degraded, disconnected)", ["action"]
+)
+
+CACHE_EVENTS = Counter(
+    "sehat_cache_events_total", "Cache/coalescing outcomes (hit, miss, shared, executed)", ["cache", "result"]
+)
+UPSTREAM_ERRORS = Counter(
+    "sehat_upstream_errors_total", "Errors from upstream dependencies", ["upstream", "code"]
+)
+
+
+def error_code(error: Exception) -> str:
+    """HTTP status of an upstream error if it has one, else the exception type"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return str(status) if status is not None else type(error).__name__
+
+
+def record_upstream_error(upstream: str, error: Exception):
+    UPSTREAM_ERRORS.labels(upstream=upstream, code=error_code(error)).inc()
+
+
+def record_cache(cache: str, result: str):
+    CACHE_EVENTS.labels(cache=cache, result=result).inc()
+
+
+def render() -> tuple:
+    """(body, content_type) for the /metrics endpoint"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,84 @@
+"""
+SINGLE-FLIGHT REQUEST COALESCING
+
+When many patients reach the same section at once, identical TTS and
+translation requests are in flight simultaneously. SingleFlight lets the
+first caller for a key do the upstream call while concurrent callers with
+the same key wait and receive the same result (or the same exception).
+
+Only in-flight calls are shared; once a call finishes its key is released,
+so this is not a cache.
+"""
+
+import threading
+from typing import Callable, Hashable
+
+from deadline import DeadlineExceeded, current_deadline
+from metrics import record_cache
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "waiters")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls (thread-safe)"""
+
+    def __init__(self, name: str = "single_flight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0   # upstream calls actually made
+        self.shared = 0     # callers served by someone else's call
+
+    def do(self, key: Hashable, fn: Callable, /, *args, **kwargs):
+        """Return fn(*args, **kwargs), sharing the call with concurrent callers of `key`"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+                leader = True
+
+        record_cache(self.name, "executed" if leader else "shared")
+
+        if not leader:
+            # A follower gives up at its own turn deadline; the leader carries on
+            deadline = current_deadline()
+            if not call.event.wait(deadline.remaining() if deadline is not None else None):
+                raise DeadlineExceeded(f"Turn deadline exceeded waiting for a shared {self.name} call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.executed + self.shared
+            return {
+                "executed": self.executed,
+                "shared": self.shared,
+                "in_flight": len(self._calls),
+                "dedupe_rate": round(self.shared / total, 3) if total else 0.0,
+            }
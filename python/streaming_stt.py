@@ -0,0 +1,282 @@
+"""
+STREAMING MICROPHONE INPUT: VAD-SEGMENTED INCREMENTAL TRANSCRIPTION
+
+With /transcribe the patient records a whole answer, uploads it and then
+waits for Whisper. Here the audio arrives as it is spoken, and:
+
+1. UtteranceSegmenter runs the same energy VAD as audio_preprocess, one
+   30 ms frame at a time. A pause of STREAM_SEGMENT_SILENCE_MS inside speech
+   closes a segment. STREAM_END_SILENCE_MS of silence ends the utterance.
+2. StreamingTranscription sends each closed segment to Whisper right away,
+   while the patient keeps talking, and reports the partial transcript as
+   segments come back.
+3. When the utterance ends only the last segment is still in flight, so the
+   final transcript is ready shortly after the patient stops speaking.
+
+Input is 16-bit mono PCM at 16 kHz. Containers (webm/ogg from MediaRecorder)
+can be decoded on the fly with PCMStreamDecoder (needs ffmpeg).
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from audio_preprocess import (
+    SAMPLE_RATE, FRAME_MS, SILENCE_THRESHOLD_DB, SPEECH_PADDING_MS,
+    frame_energies_db, pcm_to_wav, stitch_transcriptions, ffmpeg_available
+)
+from structured_log import get_logger
+
+log = get_logger("streaming_stt")
+
+
+STREAM_SEGMENT_SILENCE_MS = int(os.getenv("STREAM_SEGMENT_SILENCE_MS", "400"))
+STREAM_END_SILENCE_MS = int(os.getenv("STREAM_END_SILENCE_MS", "1200"))
+STREAM_MAX_SEGMENT_SECONDS = float(os.getenv("STREAM_MAX_SEGMENT_SECONDS", "15"))
+STREAM_MIN_SPEECH_MS = int(os.getenv("STREAM_MIN_SPEECH_MS", "250"))
+STREAM_TRANSCRIBE_CONCURRENCY = int(os.getenv("STREAM_TRANSCRIBE_CONCURRENCY", "3"))
+
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000 * 2
+
+SPEECH_START = "speech_start"
+SEGMENT = "segment"
+END = "end"
+
+
+@dataclass
+class Segment:
+    """One stretch of speech between pauses; start is seconds into the utterance"""
+    index: int
+    start: float
+    pcm: bytes = field(repr=False)
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / 2 / SAMPLE_RATE
+
+
+# ========== VAD SEGMENTATION ==========
+
+class UtteranceSegmenter:
+    """Incremental energy VAD: feed PCM as it arrives, get segment/end events"""
+
+    def __init__(
+        self,
+        threshold_db: float = SILENCE_THRESHOLD_DB,
+        segment_silence_ms: int = STREAM_SEGMENT_SILENCE_MS,
+        end_silence_ms: int = STREAM_END_SILENCE_MS,
+        max_segment_seconds: float = STREAM_MAX_SEGMENT_SECONDS,
+        min_speech_ms: int = STREAM_MIN_SPEECH_MS,
+        padding_ms: int = SPEECH_PADDING_MS,
+    ):
+        self.threshold_db = threshold_db
+        self.segment_silence_frames = max(1, segment_silence_ms // FRAME_MS)
+        self.end_silence_frames = max(self.segment_silence_frames, end_silence_ms // FRAME_MS)
+        self.max_segment_frames = max(1, int(max_segment_seconds * 1000) // FRAME_MS)
+        self.min_speech_frames = max(1, min_speech_ms // FRAME_MS)
+        self.padding_frames = max(0, padding_ms // FRAME_MS)
+        self.reset()
+
+    def reset(self):
+        """Start a new utterance"""
+        self._remainder = b""
+        self._preroll = deque(maxlen=self.padding_frames or 1)
+        self._segment: Optional[list] = None   # frames of the open segment
+        self._segment_start = 0
+        self._voiced_frames = 0
+        self._silence_run = 0
+        self._frame_index = 0                  # frames seen this utterance
+        self._next_index = 0
+        self.in_speech = False                 # speech seen this utterance
+
+    def feed(self, pcm: bytes) -> List[Tuple[str, Optional[Segment]]]:
+        data = self._remainder + pcm
+        usable = len(data) - len(data) % FRAME_BYTES
+        self._remainder = data[usable:]
+        events = []
+        for offset in range(0, usable, FRAME_BYTES):
+            events.extend(self._frame(data[offset:offset + FRAME_BYTES]))
+        return events
+
+    def flush(self) -> List[Tuple[str, Optional[Segment]]]:
+        """End the utterance now (client stopped recording)"""
+        events = []
+        segment = self._close_segment()
+        if segment:
+            events.append((SEGMENT, segment))
+        if self.in_speech:
+            events.append((END, None))
+        self.reset()
+        return events
+
+    def _frame(self, frame: bytes) -> list:
+        voiced = frame_energies_db(frame)[0] > self.threshold_db
+        events = []
+
+        if self._segment is None:
+            if voiced:
+                if not self.in_speech:
+                    self.in_speech = True
+                    events.append((SPEECH_START, None))
+                self._segment = list(self._preroll)
+                self._segment_start = self._frame_index - len(self._segment)
+                self._preroll.clear()
+                self._voiced_frames = 0
+                self._silence_run = 0
+            else:
+                self._preroll.append(frame)
+                self._frame_index += 1
+                if self.in_speech:
+                    self._silence_run += 1
+                    if self._silence_run >= self.end_silence_frames:
+                        events.append((END, None))
+                        self.reset()
+                return events
+
+        self._segment.append(frame)
+        self._frame_index += 1
+        if voiced:
+            self._voiced_frames += 1
+            self._silence_run = 0
+        else:
+            self._silence_run += 1
+
+        if self._silence_run >= self.segment_silence_frames or len(self._segment) >= self.max_segment_frames:
+            segment = self._close_segment()
+            if segment:
+                events.append((SEGMENT, segment))
+        return events
+
+    def _close_segment(self) -> Optional[Segment]:
+        if self._segment is None:
+            return None
+        frames = self._segment
+        # Keep `padding` of the trailing silence, the rest carries over as pre-roll
+        keep = len(frames) - max(0, self._silence_run - self.padding_frames)
+        for frame in frames[keep:]:
+            self._preroll.append(frame)
+        frames = frames[:keep]
+        voiced = self._voiced_frames
+        self._segment = None
+        if voiced < self.min_speech_frames:
+            return None
+        segment = Segment(self._next_index, self._segment_start * FRAME_MS / 1000, b"".join(frames))
+        self._next_index += 1
+        return segment
+
+
+# ========== INCREMENTAL TRANSCRIPTION ==========
+
+class StreamingTranscription:
+    """
+    Transcribes the segments of one utterance concurrently as they close.
+    transcribe(wav_bytes, filename, prompt) -> Whisper transcription (blocking);
+    on_partial(text, segments_done) is awaited whenever a segment comes back.
+    """
+
+    def __init__(
+        self,
+        transcribe: Callable[[bytes, str, Optional[str]], object],
+        on_partial: Optional[Callable[[str, int], Awaitable[None]]] = None,
+        concurrency: int = STREAM_TRANSCRIBE_CONCURRENCY,
+    ):
+        self.transcribe = transcribe
+        self.on_partial = on_partial
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks = []
+        self._results = {}   # index -> (offset, transcription)
+        self.speech_ended_at = None
+
+    @property
+    def partial_text(self) -> str:
+        texts = (getattr(t, "text", "") or "" for _, (_, t) in sorted(self._results.items()))
+        return " ".join(text.strip() for text in texts if text.strip())
+
+    def add(self, segment: Segment):
+        self._tasks.append(asyncio.create_task(self._run(segment)))
+
+    async def _run(self, segment: Segment):
+        async with self._semaphore:
+            # Earlier text as the Whisper prompt keeps spelling consistent across segments
+            prompt = self.partial_text or None
+            transcription = await asyncio.to_thread(
+                self.transcribe, pcm_to_wav(segment.pcm), f"segment_{segment.index}.wav", prompt
+            )
+        self._results[segment.index] = (segment.start, transcription)
+        if self.on_partial:
+            await self.on_partial(self.partial_text, len(self._results))
+
+    async def finish(self) -> dict:
+        """Wait for the segments still in flight and stitch the utterance"""
+        self.speech_ended_at = time.perf_counter()
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+        stitched = stitch_transcriptions(list(self._results.values()))
+        stitched["segments_transcribed"] = len(self._results)
+        stitched["finalize_ms"] = round((time.perf_counter() - self.speech_ended_at) * 1000, 1)
+        return stitched
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+
+# ========== CONTAINER DECODING ==========
+
+class PCMStreamDecoder:
+    """
+    Long-running ffmpeg that turns a webm/ogg byte stream into 16 kHz mono PCM
+    as it arrives. on_pcm(pcm) is awaited for every decoded chunk.
+    """
+
+    def __init__(self, on_pcm: Callable[[bytes], Awaitable[None]]):
+        self.on_pcm = on_pcm
+        self._proc = None
+        self._reader = None
+
+    @staticmethod
+    def available() -> bool:
+        return ffmpeg_available()
+
+    async def start(self):
+        self._proc = await asyncio.create_subprocess_exec(
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-i", "pipe:0", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        )
+        self._reader = asyncio.create_task(self._read())
+        return self
+
+    async def _read(self):
+        while True:
+            chunk = await self._proc.stdout.read(FRAME_BYTES * 10)
+            if not chunk:
+                return
+            await self.on_pcm(chunk)
+
+    async def write(self, data: bytes):
+        self._proc.stdin.write(data)
+        await self._proc.stdin.drain()
+
+    async def close(self):
+        """End of input: wait until everything written has been decoded"""
+        if self._proc is None:
+            return
+        try:
+            self._proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            await self._reader
+        finally:
+            await self._proc.wait()
+            self._proc = None
+
+    def kill(self):
+        if self._proc is not None and self._proc.returncode is None:
+            self._proc.kill()
+        if self._reader is not None:
+            self._reader.cancel()
@@ -0,0 +1,162 @@
+"""
+NON-BLOCKING STRUCTURED LOGGING
+
+Hot paths (graph nodes, send-message, history listing) log small events
+instead of print()-ing whole states. Each call costs the same no matter how
+long the interview is:
+
+- the level check and sampling happen before anything is formatted
+- patient fields are redacted to "<redacted:N chars>" in the calling thread,
+  so no reference to mutable session state is kept
+- records go onto an in-memory queue; a QueueListener thread formats them as
+  JSON lines and writes to stdout, so a slow stdout never stalls the event loop
+
+    log = get_logger("llm")
+    log.info("tool.recorded", section=section, field=field, value=value)
+
+Config (env):
+    LOG_LEVEL          DEBUG / INFO / WARNING / ERROR (default INFO)
+    LOG_SAMPLE_RATES   per-event sampling, e.g. "router.next_section=0.1,tool.recorded=0.5"
+    LOG_QUEUE_SIZE     records buffered before new ones are dropped (default 10000)
+    LOG_REDACT         set to 0 to log patient fields in clear (local debugging only)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_REDACT = os.getenv("LOG_REDACT", "1") != "0"
+
+# Fields that may carry patient information
+PHI_FIELDS = frozenset({
+    "value", "current_value", "content", "message", "ai_message", "transcript", "text",
+    "name", "address", "contact", "email", "user_email", "collected_data", "medical_data", "state",
+})
+
+
+def _parse_sample_rates(raw: str) -> dict:
+    rates = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        event, _, rate = item.partition("=")
+        try:
+            rates[event.strip()] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+SAMPLE_RATES = _parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+
+def redact(fields: dict) -> dict:
+    """Replace patient fields by their size; other values are kept as-is"""
+    if not LOG_REDACT:
+        return fields
+    clean = {}
+    for key, value in fields.items():
+        if key in PHI_FIELDS and value is not None:
+            size = len(value) if hasattr(value, "__len__") else 1
+            clean[key] = f"<redacted:{size} {'chars' if isinstance(value, str) else 'items'}>"
+        else:
+            clean[key] = value
+    return clean
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line (runs on the listener thread)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when full"""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+    def prepare(self, record):
+        # Fields are already redacted scalars; skip the default copy/format work
+        return record
+
+
+_listener = None
+
+
+def _configure():
+    global _listener
+    root = logging.getLogger("sehat")
+    if _listener is not None:
+        return root
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root.addHandler(_DroppingQueueHandler(log_queue))
+    root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    root.propagate = False
+    return root
+
+
+class EventLogger:
+    """Thin wrapper: log.info("event.name", key=value, ...)"""
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+
+    def _log(self, level: int, event: str, fields: dict, exc_info=None):
+        if not self._logger.isEnabledFor(level):
+            return
+        rate = SAMPLE_RATES.get(event)
+        if rate is not None and level < logging.WARNING and random.random() >= rate:
+            return
+        if rate is not None:
+            fields["sample_rate"] = rate
+        self._logger.log(level, event, extra={"fields": redact(fields)}, exc_info=exc_info)
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, exc_info=None, **fields):
+        self._log(logging.ERROR, event, fields, exc_info=exc_info)
+
+
+def get_logger(name: str) -> EventLogger:
+    _configure()
+    return EventLogger(logging.getLogger(f"sehat.{name}"))
+
+
+def dropped_records() -> int:
+    return _DroppingQueueHandler.dropped
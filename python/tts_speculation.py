@@ -0,0 +1,158 @@
+"""
+SPECULATIVE TTS FOR THE NEXT SECTION'S QUESTION
+
+When tool_node marks a section complete, next_section_node moves on
+deterministically, so the next section's opening question is known before
+the LLM has even produced it. We synthesize that question in the background
+while the LLM call runs, and reuse the audio if the reply matches.
+
+The canonical questions are the same for every patient, so a finished
+synthesis is shared across sessions and kept in a small LRU.
+"""
+
+import difflib
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+_PUNCTUATION = re.compile(r"[\s\.\،\,\?\؟\!\۔]+")
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace/punctuation so trivial differences still match"""
+    return _PUNCTUATION.sub(" ", text or "").strip().lower()
+
+
+class SpeculativeTTS:
+    """Background pre-synthesis of predicted replies with hit/waste accounting"""
+
+    def __init__(
+        self,
+        synthesize: Callable[[str, str], bytes],
+        max_entries: int = 64,
+        similarity: float = 0.9,
+        wait_seconds: float = 5.0,
+        workers: int = 2,
+    ):
+        self.synthesize = synthesize
+        self.max_entries = max_entries
+        self.similarity = similarity
+        self.wait_seconds = wait_seconds
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts-spec")
+        self._lock = threading.Lock()
+        # (voice_id, normalized_text) -> {"future": Future, "used": bool}
+        self._entries: "OrderedDict[tuple, dict]" = OrderedDict()
+
+        self.speculated = 0       # syntheses started
+        self.lookups = 0
+        self.hits = 0
+        self.near_hits = 0        # hits that matched by similarity, not exactly
+        self.wasted = 0           # syntheses evicted without ever being used
+        self.failed = 0
+
+    # ----- speculation -----
+
+    def speculate(self, text: str, voice_id: str = "v_meklc281") -> None:
+        """Start synthesizing text in the background (no-op if already cached)"""
+        if not text:
+            return
+        key = (voice_id, normalize_text(text))
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            future = self._executor.submit(self.synthesize, text, voice_id)
+            self._entries[key] = {"future": future, "used": False}
+            self.speculated += 1
+            self._evict()
+        # Outside the lock: the callback runs right here if the call already finished
+        future.add_done_callback(lambda f: self._discard_failed(key, f))
+
+    def _discard_failed(self, key: tuple, future: Future) -> None:
+        """A failed synthesis leaves the cache at once, so the question can be speculated again"""
+        if future.cancelled() or future.exception() is None:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["future"] is future:
+                del self._entries[key]
+                self.failed += 1
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            _, entry = self._entries.popitem(last=False)
+            if not entry["used"]:
+                self.wasted += 1
+
+    # ----- lookup -----
+
+    def _match(self, voice_id: str, normalized: str) -> Optional[tuple]:
+        key = (voice_id, normalized)
+        if key in self._entries:
+            return key, False
+
+        best_key, best_ratio = None, 0.0
+        for candidate in self._entries:
+            if candidate[0] != voice_id:
+                continue
+            ratio = difflib.SequenceMatcher(None, normalized, candidate[1]).ratio()
+            if ratio > best_ratio:
+                best_key, best_ratio = candidate, ratio
+
+        if best_key and best_ratio >= self.similarity:
+            return best_key, True
+        return None
+
+    def lookup(self, text: str, voice_id: str = "v_meklc281",
+               wait_seconds: Optional[float] = None) -> Optional[bytes]:
+        """Return pre-made audio if text (nearly) matches a speculated reply.
+        Waits up to wait_seconds (default self.wait_seconds) for a synthesis still running."""
+        normalized = normalize_text(text)
+
+        with self._lock:
+            self.lookups += 1
+            match = self._match(voice_id, normalized)
+            if not match:
+                return None
+            key, near = match
+            entry = self._entries[key]
+            self._entries.move_to_end(key)
+            future: Future = entry["future"]
+
+        try:
+            audio = future.result(timeout=wait_seconds if wait_seconds is not None else self.wait_seconds)
+        except Exception:
+            # Failed or too slow - caller synthesizes normally
+            with self._lock:
+                # Unless the failure callback already dropped it
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                    self.failed += 1
+            return None
+
+        with self._lock:
+            entry["used"] = True
+            self.hits += 1
+            if near:
+                self.near_hits += 1
+        return audio
+
+    def stats(self) -> dict:
+        with self._lock:
+            unused = sum(1 for e in self._entries.values() if not e["used"] and e["future"].done())
+            return {
+                "speculated": self.speculated,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else 0.0,
+                "wasted": self.wasted,
+                "failed": self.failed,
+                "cached": len(self._entries),
+                "cached_unused": unused,
+            }
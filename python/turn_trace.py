@@ -0,0 +1,203 @@
+"""
+PER-SESSION TURN TRACES
+
+Records what happened inside one graph turn: which nodes ran and in what
+order, how long each took, every LLM call with its token counts, tool calls
+and section transitions. Traces are kept per session in a bounded ring
+buffer and can be exported as OpenTelemetry (OTLP/JSON) spans.
+
+    with trace_turn(session_id):            # main.py, around process_user_message
+        with span("agent", section=...):    # llm.py, inside graph nodes
+            ...
+        add_event("section_transition", from_section=..., to_section=...)
+
+Outside a trace_turn() block span()/add_event() are no-ops. Only names,
+sections, models, field names and counts are recorded - never patient text.
+"""
+
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+
+TRACE_TURNS_PER_SESSION = int(os.getenv("TRACE_TURNS_PER_SESSION", "20"))
+TRACE_MAX_SESSIONS = int(os.getenv("TRACE_MAX_SESSIONS", "500"))
+
+_current_trace: ContextVar = ContextVar("turn_trace", default=None)
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "start_ns", "end_ns", "attributes")
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: dict):
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+
+    def to_dict(self, turn_start_ns: int) -> dict:
+        end_ns = self.end_ns or self.start_ns
+        return {
+            "name": self.name,
+            "offset_ms": round((self.start_ns - turn_start_ns) / 1e6, 2),
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 2),
+            "attributes": self.attributes,
+        }
+
+
+class TurnTrace:
+    """Spans for one turn; the root span covers the whole turn"""
+
+    def __init__(self, session_id: str, turn_kind: str):
+        self.trace_id = secrets.token_hex(16)
+        self.session_id = session_id
+        self.root = Span(f"turn.{turn_kind}", None, {"session_id": session_id})
+        self.spans = []
+        self._stack = [self.root]
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, attributes: dict) -> Span:
+        with self._lock:
+            new_span = Span(name, self._stack[-1].span_id, attributes)
+            self.spans.append(new_span)
+            self._stack.append(new_span)
+            return new_span
+
+    def end_span(self, finished: Span):
+        with self._lock:
+            finished.end_ns = time.time_ns()
+            if finished in self._stack:
+                self._stack.remove(finished)
+
+    def summary(self) -> dict:
+        llm_calls = [s for s in self.spans if s.name == "llm.call"]
+        return {
+            "trace_id": self.trace_id,
+            "started_at": self.root.start_ns / 1e9,
+            "duration_ms": round(((self.root.end_ns or time.time_ns()) - self.root.start_ns) / 1e6, 2),
+            "node_order": [s.name.split(".", 1)[1] for s in self.spans if s.name.startswith("node.")],
+            "llm_calls": len(llm_calls),
+            "prompt_tokens": sum(s.attributes.get("prompt_tokens", 0) for s in llm_calls),
+            "completion_tokens": sum(s.attributes.get("completion_tokens", 0) for s in llm_calls),
+            "attributes": self.root.attributes,
+            "timeline": [s.to_dict(self.root.start_ns) for s in self.spans],
+        }
+
+    def to_otel_spans(self) -> list:
+        """Spans in OTLP/JSON shape"""
+        def _value(value):
+            if isinstance(value, bool):
+                return {"boolValue": value}
+            if isinstance(value, int):
+                return {"intValue": str(value)}
+            if isinstance(value, float):
+                return {"doubleValue": value}
+            return {"stringValue": str(value)}
+
+        exported = []
+        for item in [self.root] + self.spans:
+            exported.append({
+                "traceId": self.trace_id,
+                "spanId": item.span_id,
+                "parentSpanId": item.parent_id or "",
+                "name": item.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(item.start_ns),
+                "endTimeUnixNano": str(item.end_ns or item.start_ns),
+                "attributes": [{"key": k, "value": _value(v)} for k, v in item.attributes.items()],
+            })
+        return exported
+
+
+class TraceStore:
+    """Last N turns per session, for at most M sessions (least recently traced evicted)"""
+
+    def __init__(self, turns_per_session: int = TRACE_TURNS_PER_SESSION, max_sessions: int = TRACE_MAX_SESSIONS):
+        self.turns_per_session = turns_per_session
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, deque]" = OrderedDict()
+
+    def add(self, trace: TurnTrace):
+        with self._lock:
+            turns = self._sessions.get(trace.session_id)
+            if turns is None:
+                turns = deque(maxlen=self.turns_per_session)
+                self._sessions[trace.session_id] = turns
+            self._sessions.move_to_end(trace.session_id)
+            turns.append(trace)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def get(self, session_id: str) -> list:
+        with self._lock:
+            return list(self._sessions.get(session_id, ()))
+
+    def export_otel(self, session_id: str) -> dict:
+        """OTLP/JSON ExportTraceServiceRequest for every stored turn of a session"""
+        spans = [s for trace in self.get(session_id) for s in trace.to_otel_spans()]
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "sehat-nama-api"}}]},
+                "scopeSpans": [{"scope": {"name": "turn_trace"}, "spans": spans}],
+            }]
+        }
+
+
+trace_store = TraceStore()
+
+
+# ========== INSTRUMENTATION API ==========
+
+def current_trace() -> Optional[TurnTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_turn(session_id: str, turn_kind: str = "message", store: TraceStore = trace_store):
+    """Record everything inside the block as one turn of `session_id`"""
+    trace = TurnTrace(session_id, turn_kind)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except Exception as e:
+        trace.root.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        trace.root.end_ns = time.time_ns()
+        _current_trace.reset(token)
+        store.add(trace)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Child span of the current turn (no-op when not tracing). Yields the attribute dict."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield attributes
+        return
+    new_span = trace.start_span(name, attributes)
+    try:
+        yield new_span.attributes
+    finally:
+        trace.end_span(new_span)
+
+
+def add_event(name: str, **attributes):
+    """Zero-duration span (tool call, section transition)"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.end_span(trace.start_span(name, attributes))
+
+
+def set_turn_attributes(**attributes):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.root.attributes.update(attributes)
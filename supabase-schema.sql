@@ -85,6 +85,16 @@ CREATE POLICY "Users can view own medical history" ON public.medical_history
 CREATE POLICY "Users can insert own medical history" ON public.medical_history
   FOR INSERT WITH CHECK (email = auth.jwt()->>'email');
 
+-- Idempotency key used to dedupe retried stores (also upgrades existing deployments)
+ALTER TABLE public.medical_history ADD COLUMN IF NOT EXISTS idempotency_key TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS medical_history_idempotency_key_idx
+  ON public.medical_history (idempotency_key);
+
+-- Policy to allow the idempotent upsert to touch the user's own rows
+DROP POLICY IF EXISTS "Users can update own medical history" ON public.medical_history;
+CREATE POLICY "Users can update own medical history" ON public.medical_history
+  FOR UPDATE USING (email = auth.jwt()->>'email');
+
 -- Create trigger to update updated_at on medical_history updates
 CREATE TRIGGER update_medical_history_updated_at
   BEFORE UPDATE ON public.medical_history